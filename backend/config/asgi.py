@@ -7,10 +7,62 @@ For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
 
+import asyncio
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Lets settings.py know it runs under ASGI (disables CONN_MAX_AGE, see DATABASES)
+os.environ['DJANGO_ASGI'] = '1'
 
-application = get_asgi_application()
+
+class BoundedConnectionPool:
+    """
+    Under ASGI each request gets its own thread and therefore its own DB
+    connection. This caps how many requests do that work at once per worker
+    (settings.DB_POOL_SIZE), which caps the open MySQL connections too.
+    A slot is taken only once the request body has arrived and given back
+    as the last chunk of the response goes out, so clients that are slow to
+    upload or to read don't hold one; any number of them can be in flight.
+    """
+    def __init__(self, app, size):
+        self.app = app
+        self.size = size
+        self._semaphore = None  # Created lazily inside the running event loop
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+        held = False
+
+        async def receive_body():
+            nonlocal held
+            message = await receive()
+            # Django reads the whole body before it runs the view
+            if not held and message['type'] == 'http.request' and not message.get('more_body', False):
+                await self._semaphore.acquire()
+                held = True
+            return message
+
+        async def send_response(message):
+            nonlocal held
+            if held and message['type'] == 'http.response.body' and not message.get('more_body', False):
+                held = False
+                self._semaphore.release()
+            await send(message)
+
+        try:
+            return await self.app(scope, receive_body, send_response)
+        finally:
+            if held:
+                self._semaphore.release()
+
+
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402  (after setup)
+
+application = BoundedConnectionPool(django_application, settings.DB_POOL_SIZE)
@@ -1,6 +1,7 @@
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 load_dotenv() # <--- loads the .env file
 
@@ -14,7 +15,8 @@ try:
     # 2. Disable the 'RETURNING' SQL feature (Fixes the 1064 error)
     from django.db.backends.mysql.features import DatabaseFeatures
     DatabaseFeatures.can_return_columns_from_insert = False
-except ImportError:
+except (ImportError, ImproperlyConfigured):
+    # mysqlclient isn't installed (e.g. DB_ENGINE=sqlite for local benchmarks)
     pass
 # --------------------------------------------------------------------------
 
@@ -61,6 +63,8 @@ INSTALLED_APPS = [
 SITE_ID = 1  # Required by allauth
 
 MIDDLEWARE = [
+    'core.instrumentation.RequestMetricsMiddleware',  # First, so its timing covers the whole stack
+    'core.middleware.RequestIdMiddleware',      # request_id on every log record
     'corsheaders.middleware.CorsMiddleware',        #Added for CORS
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -70,7 +74,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    
+    'core.middleware.ReadReplicaMiddleware',    # GET/HEAD reads may use the replica
+    'core.middleware.TenantShardMiddleware',    # Tenant tables on the caller's shard
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -104,15 +109,143 @@ AUTHENTICATION_BACKENDS = [
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'edusphere_db',      
-        'USER': 'root',              
-        'PASSWORD': '',             
-        'HOST': 'localhost',         
-        'PORT': '3306',              
+# Every knob comes from the environment (.env) so prod, CI and laptops share this file.
+#   DB_ENGINE            mysql (default) | sqlite
+#   DB_CONN_MAX_AGE      seconds to keep a connection open between requests (WSGI)
+#   DB_POOL_SIZE         max requests per ASGI worker running their view at once (config/asgi.py)
+#   DB_REPLICA_HOST      optional read replica for GET/HEAD requests (core/routers.py)
+#   DB_SHARDS            extra tenant databases, e.g. "shard1,shard2" (core/sharding.py); each takes
+#                        DB_<ALIAS>_NAME/_HOST/_PORT/_USER/_PASSWORD, defaulting to the 'default' ones
+#                        (NAME gets an _<alias> suffix). Create each with 'migrate --database <alias>'.
+#   NEW_ORG_SHARD        put new organizations on this alias instead of the least loaded shard
+
+RUNNING_UNDER_ASGI = os.getenv('DJANGO_ASGI') == '1'   # Set by config/asgi.py
+
+if os.getenv('DB_ENGINE', 'mysql') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.getenv('DB_NAME', 'edusphere_db'),
+            'USER': os.getenv('DB_USER', 'root'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '3306'),
+            # Reuse connections across requests instead of a TCP + auth handshake each time.
+            # Under ASGI every request runs in its own thread, so a persistent connection
+            # would never be reused; there the bounded pool in config/asgi.py applies instead.
+            'CONN_MAX_AGE': 0 if RUNNING_UNDER_ASGI else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            # Ping a reused connection before the first query of a request
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+            },
+        }
     }
+
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# 'default' is also the directory: auth, sessions, the mail outbox and the shard map live only there
+TENANT_SHARDS = ['default']
+for _alias in filter(None, (a.strip() for a in os.getenv('DB_SHARDS', '').split(','))):
+    _env = f'DB_{_alias.upper()}_'
+    _shard = {**DATABASES['default']}
+    if _shard['ENGINE'].endswith('sqlite3'):
+        _base = Path(DATABASES['default']['NAME'])
+        _shard['NAME'] = os.getenv(_env + 'NAME', str(_base.with_name(f"{_base.stem}_{_alias}{_base.suffix}")))
+    else:
+        _shard['NAME'] = os.getenv(_env + 'NAME', f"{DATABASES['default']['NAME']}_{_alias}")
+        for _key in ('HOST', 'PORT', 'USER', 'PASSWORD'):
+            _shard[_key] = os.getenv(_env + _key, _shard[_key])
+    DATABASES[_alias] = _shard
+    TENANT_SHARDS.append(_alias)
+
+NEW_ORG_SHARD = os.getenv('NEW_ORG_SHARD') or None
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '20'))
+
+DATABASE_ROUTERS = ['core.routers.TenantShardRouter', 'core.routers.PrimaryReplicaRouter']
+
+
+# Cache
+# Local memory by default (per process). Set REDIS_URL to share one cache
+# between workers so signal-driven invalidation reaches all of them.
+# Both backends count hits and misses per request (core/instrumentation.py).
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.instrumentation.InstrumentedRedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.instrumentation.InstrumentedLocMemCache',
+            'LOCATION': 'edusphere',
+        }
+    }
+
+# Per-user authz versions and per-organization department config versions
+# decide whether a token or a cached map is still good, and /api/user/me/
+# payloads are cached whole. A change deletes the cached entry, which only
+# reaches other workers through a shared cache; with local memory each
+# worker keeps its copy only this long.
+VERSION_CACHE_TIMEOUT = int(os.getenv('VERSION_CACHE_TIMEOUT', '600' if os.getenv('REDIS_URL') else '5'))
+
+
+# Request metrics (core/instrumentation.py)
+# /api/metrics/ answers only to "Authorization: Bearer <METRICS_TOKEN>"; unset, it is a 404.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', '1') == '1'
+
+
+# Logging (core/logconfig.py)
+# Request threads only put records on a bounded queue; a background thread
+# writes them to stdout as JSON lines. When the queue is full, records are
+# dropped and counted rather than making the request wait.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        # Fraction of INFO records kept, by event (extra={'event': ...}) or logger name
+        'sample': {
+            '()': 'core.logconfig.SampleFilter',
+            'rates': {
+                'invite_queued': float(os.getenv('LOG_SAMPLE_INVITES', '0.1')),
+                'welcome_email_queued': float(os.getenv('LOG_SAMPLE_INVITES', '0.1')),
+            },
+        },
+        'request_id': {'()': 'core.logconfig.RequestIdFilter'},
+    },
+    'handlers': {
+        'queue': {
+            '()': 'core.logconfig.BackgroundQueueHandler',
+            'maxsize': int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+            'filters': ['sample', 'request_id'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': LOG_LEVEL},
+    'loggers': {
+        # Replace Django's own console handlers, so its records take the queue too
+        'django': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+        'django.server': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+    },
 }
 
 
@@ -135,6 +268,44 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# PBKDF2 runs in a process pool (core/hashing.py) so a login spike can't take
+# every web worker's CPU. At most PASSWORD_HASH_MAX_PENDING hashes may be running
+# or queued per process; further logins wait up to PASSWORD_HASH_QUEUE_TIMEOUT
+# seconds for a slot, then get a 503. PASSWORD_HASH_WORKERS=0 hashes inline.
+
+PASSWORD_HASHERS = [
+    'core.hashing.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', str(max(PASSWORD_HASH_WORKERS, 1) * 4)))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', '5'))
+
+# Token buckets for login / registration / password reset (core/ratelimit.py):
+# (burst, refill in tokens per second), kept per process in memory.
+AUTH_RATE_LIMITS = {
+    'ip': (20, 20 / 60),       # 20 attempts, then one every 3 seconds
+    'account': (5, 5 / 300),   # Per account and IP: 5 attempts, then one per minute
+    'account_global': (50, 50 / 3600),  # Per account from all IPs: 50 attempts, then about one a minute
+}
+
+
+# Location autocomplete for the setup wizard (core/gazetteer.py)
+# Answered from the local gazetteer file; 'import_gazetteer' builds a bigger
+# one from GeoNames. Only when nothing matches locally does a query go to
+# LOCATION_SEARCH_UPSTREAM, e.g. 'core.gazetteer.NominatimProvider' (unset: never).
+GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', str(BASE_DIR / 'core' / 'data' / 'gazetteer.tsv'))
+LOCATION_SEARCH_UPSTREAM = os.getenv('LOCATION_SEARCH_UPSTREAM', '')
+LOCATION_SEARCH_UPSTREAM_URL = os.getenv('LOCATION_SEARCH_UPSTREAM_URL', '')
+LOCATION_SEARCH_UPSTREAM_TIMEOUT = float(os.getenv('LOCATION_SEARCH_UPSTREAM_TIMEOUT', '2'))
+LOCATION_SEARCH_USER_AGENT = os.getenv('LOCATION_SEARCH_USER_AGENT', 'EduSphere location search')
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
 
@@ -162,8 +333,15 @@ CORS_ALLOWED_ORIGINS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        # SimpleJWT + one joined query for user/profile/organization (request.tenant)
+        'core.authentication.TenantJWTAuthentication',
+    ),
+    # No-ops except on the password endpoints (see core/ratelimit.py)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.ratelimit.AuthIPThrottle',
+        'core.ratelimit.AuthAccountThrottle',
+        'core.ratelimit.AuthAccountGlobalThrottle',
+    ),
 }
 
 
@@ -175,6 +353,11 @@ REST_AUTH = {
     'USE_JWT': True,
     'JWT_AUTH_COOKIE': None,
     'JWT_AUTH_REFRESH_COOKIE': None,
+    # No cookies are used, so return the refresh token in the body; the
+    # frontend needs it to recover from a 'token_stale' 401
+    'JWT_AUTH_HTTPONLY': False,
+    # Access tokens carry role / org_id / authz_ver claims
+    'JWT_TOKEN_CLAIMS_SERIALIZER': 'core.serializers.TenantTokenObtainPairSerializer',
     'USER_DETAILS_SERIALIZER': 'core.serializers.CustomUserDetailsSerializer',
     'REGISTER_SERIALIZER': 'core.serializers.CustomRegisterSerializer',
 # Sending the email
@@ -223,7 +406,14 @@ SOCIALACCOUNT_QUERY_EMAIL = True
 
 # --- EMAIL CONFIGURATION ---
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Requests only write to the OutboundEmail table; run
+# 'python manage.py process_mail_queue --loop' to deliver with the backend below.
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+MAIL_QUEUE_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+MAIL_QUEUE_MAX_ATTEMPTS = 5
+MAIL_QUEUE_BACKOFF_SECONDS = 60
+# A claimed batch is left alone by other workers this long; a worker that dies mid-batch loses it only that long
+MAIL_QUEUE_CLAIM_SECONDS = 300
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
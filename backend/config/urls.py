@@ -6,6 +6,10 @@ from core.views import GoogleLogin
 from core.views import GoogleLogin, SetupOrganizationView
 from core.views import GoogleLogin, SetupOrganizationView, StaffManagementView
 from core.views import GoogleLogin, SetupOrganizationView, StaffManagementView, CurrentUserView
+from core.views import BulkInviteView, StaffBulkRemoveView, StaffBulkUpdateView, StaffChangesView, TenantTokenRefreshView
+from core.views import OrganizationStatsView, DepartmentListView, DepartmentDetailView, DepartmentDefaultsView
+from core.views import StaffExportView, StaffSearchView, MetricsView, LocationSearchView
+from core.async_views import AsyncSetupOrganizationView, AsyncStaffManagementView, AsyncCurrentUserView
 
 def password_reset_redirect(request, uidb64, token):
     # This takes the tokens from the email link and sends the user to React (port 5173)
@@ -14,6 +18,9 @@ def password_reset_redirect(request, uidb64, token):
 urlpatterns = [
     path('admin/', admin.site.urls),
     
+    # Must come before dj_rest_auth.urls, which has its own token/refresh/
+    path('api/auth/token/refresh/', TenantTokenRefreshView.as_view(), name='token_refresh'),
+
     # Standard Auth (Login/Logout/Password Reset)
     path('api/auth/', include('dj_rest_auth.urls')),
     
@@ -25,12 +32,37 @@ urlpatterns = [
 
     # Setup Organization Endpoint
     path('api/setup-organization/', SetupOrganizationView.as_view()),
+
+    # Location autocomplete for the setup wizard (local gazetteer)
+    path('api/locations/search/', LocationSearchView.as_view()),
  
     # Staff Management Endpoint
     path('api/staff/', StaffManagementView.as_view()),
+    path('api/staff/bulk-invite/', BulkInviteView.as_view()),
+    path('api/staff/bulk-update/', StaffBulkUpdateView.as_view()),
+    path('api/staff/bulk-remove/', StaffBulkRemoveView.as_view()),
+    path('api/staff/changes/', StaffChangesView.as_view()),
+    path('api/staff/search/', StaffSearchView.as_view()),
+    path('api/staff/export/', StaffExportView.as_view()),
 
     path('api/user/me/', CurrentUserView.as_view()),
 
+    # Dashboard headcounts
+    path('api/org/stats/', OrganizationStatsView.as_view()),
+
+    # Departments and their config
+    path('api/departments/', DepartmentListView.as_view()),
+    path('api/departments/defaults/', DepartmentDefaultsView.as_view()),
+    path('api/departments/<int:department_id>/', DepartmentDetailView.as_view()),
+
+    # Request metrics for Prometheus (needs METRICS_TOKEN)
+    path('api/metrics/', MetricsView.as_view()),
+
+    # ASGI-native variants of the endpoints above (run under uvicorn/daphne)
+    path('api/async/setup-organization/', AsyncSetupOrganizationView.as_view()),
+    path('api/async/staff/', AsyncStaffManagementView.as_view()),
+    path('api/async/user/me/', AsyncCurrentUserView.as_view()),
+
     path(
         'password-reset/confirm/<uidb64>/<token>/', 
         password_reset_redirect, 
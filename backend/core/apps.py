@@ -6,4 +6,11 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         
-        import core.signals
\ No newline at end of file
+        import core.signals
+        # Its connection_created receiver times every query
+        import core.instrumentation
+
+        # Build the validators now, so CommonPasswordValidator unpacks its
+        # 20k-word list into a set at startup rather than inside a request
+        from django.contrib.auth.password_validation import get_default_password_validators
+        get_default_password_validators()
\ No newline at end of file
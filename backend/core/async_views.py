@@ -0,0 +1,236 @@
+# backend/core/async_views.py
+#
+# ASGI-native versions of the setup, staff and current-user endpoints.
+# They use the async ORM end to end, so under uvicorn a request waiting on
+# MySQL doesn't hold a thread; one worker can multiplex many slow clients.
+# The sync DRF views in core/views.py remain the ones the frontend uses.
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.http import JsonResponse, HttpResponse
+from django.utils import timezone
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from core.authentication import TenantJWTAuthentication, bump_authz_version
+from core.cache import aget_cached_me, aset_cached_me
+from core.departments import department_map
+from core.mail import aqueue_messages, build_invite_email
+from core.models import Organization, UserProfile
+from core.permissions import validate_permissions
+from core.search import reindex_members
+from core.serializers import StaffMemberSerializer, current_user_payload
+from core.sharding import DIRECTORY, place_organization, register_members, relocate_profile, use_shard
+from core.staff import INVITABLE_ROLES, staff_queryset, apply_staff_filters, attach_email_status
+from core.stats import apply_deltas, count_members
+
+ASYNC_PAGE_SIZE = 50
+ASYNC_MAX_PAGE_SIZE = 200
+
+
+class AsyncAPIView(View):
+    """
+    Small async stand-in for DRF's APIView: JWT auth, JSON in and out.
+    Handlers receive the request with `request.tenant` already resolved.
+    """
+    authenticator = TenantJWTAuthentication()
+    admin_only = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token-authenticated API, same as DRF's APIView
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            tenant = await self.authenticator.aauthenticate(request)
+        except (AuthenticationFailed, InvalidToken) as e:
+            # Same body DRF would render for these exceptions
+            detail = e.detail if isinstance(e.detail, dict) else {"detail": e.detail}
+            return JsonResponse(detail, status=401)
+        if tenant is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        request.tenant = tenant
+        if self.admin_only and not tenant.is_admin:
+            return JsonResponse({"error": "Permission denied"}, status=403)
+
+        if request.content_type == 'application/json' and request.body:
+            try:
+                request.json = json.loads(request.body)
+            except ValueError:
+                return JsonResponse({"error": "Invalid JSON body"}, status=400)
+            if not isinstance(request.json, dict):
+                return JsonResponse({"error": "JSON body must be an object"}, status=400)
+        else:
+            request.json = {}
+
+        return await super().dispatch(request, *args, **kwargs)
+
+
+# 1. Setup Organization
+class AsyncSetupOrganizationView(AsyncAPIView):
+
+    async def post(self, request):
+        tenant, data = request.tenant, request.json
+        if tenant.profile is None:
+            return JsonResponse({"error": "Profile not found"}, status=404)
+        if tenant.organization:
+            return JsonResponse({"error": "Organization already exists."}, status=400)
+
+        org_name = data.get('name')
+        if not org_name:
+            return JsonResponse({"error": "Organization name is required"}, status=400)
+
+        shard = await sync_to_async(place_organization)()
+        with use_shard(shard):
+            org = await Organization.objects.acreate(
+                name=org_name,
+                type=data.get('type', 'School'),
+                address=data.get('address', '')
+            )
+
+            profile = tenant.profile
+            profile.organization = org
+            profile.role = 'ORG_ADMIN'
+            profile.designation = data.get('designation', '')
+            profile.is_setup_complete = True
+            await sync_to_async(relocate_profile)(
+                profile, shard, ['organization', 'role', 'designation', 'is_setup_complete', 'updated_at']
+            )
+            await sync_to_async(bump_authz_version)(profile.user_id)
+
+        return JsonResponse({"message": "Setup Complete", "org_id": org.id, "redirect": "/"})
+
+
+# 2. Staff Management
+class AsyncStaffManagementView(AsyncAPIView):
+
+    admin_only = True
+
+    async def get(self, request):
+        """ Keyset-paginated roster: ?after=<last id>&page_size=&role=&status=&department=&q= """
+        params = request.GET
+        members = staff_queryset(request.tenant.organization_id)
+        try:
+            members = apply_staff_filters(members, params, request.tenant.organization_id)
+            after = int(params.get('after', 0))
+            page_size = min(int(params.get('page_size', ASYNC_PAGE_SIZE)), ASYNC_MAX_PAGE_SIZE)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        # Fetch one extra row to know whether another page exists
+        page = [m async for m in members.filter(id__gt=after).order_by('id')[:page_size + 1]]
+        has_more = len(page) > page_size
+        page = await sync_to_async(attach_email_status)(page[:page_size])
+
+        next_url = None
+        if has_more:
+            query = params.copy()
+            query['after'] = page[-1].id
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+        departments = await sync_to_async(department_map)(request.tenant.organization_id)
+        return JsonResponse({
+            "next": next_url,
+            "results": StaffMemberSerializer(page, many=True, context={'departments': departments}).data,
+        })
+
+    async def post(self, request):
+        """ Invite one member; the email is handed to the outbox asynchronously. """
+        email = request.json.get('email')
+        role = request.json.get('role') or 'STAFF'
+        if not isinstance(email, str) or not email.strip():
+            return JsonResponse({"error": "Email is required"}, status=400)
+        email = email.strip().lower()
+        role = str(role).strip().upper()
+        if role not in INVITABLE_ROLES:
+            return JsonResponse({"error": f"Unknown role: {role}"}, status=400)
+
+        admin_org = request.tenant.organization
+        if not admin_org:
+            return JsonResponse({"error": "You are not part of an organization!"}, status=400)
+
+        if await User.objects.using(DIRECTORY).filter(email=email).aexists():
+            return JsonResponse({"error": "User with this email already exists!"}, status=400)
+
+        # The post_save signal provisions the profile
+        new_user = await User.objects.acreate(username=email, email=email, password=make_password(None))
+        await UserProfile.objects.filter(user=new_user).aupdate(
+            organization=admin_org, role=role, is_setup_complete=True, updated_at=timezone.now()
+        )
+        # aupdate() skips the profile signals that keep the dashboard counters, the shard directory and search
+        await sync_to_async(apply_deltas)(count_members([(admin_org.id, role, None, 'invited')]))
+        await sync_to_async(register_members)(admin_org.id, [new_user.id])
+        await sync_to_async(reindex_members)([new_user.id])
+
+        sender_name = request.tenant.user.get_full_name() or "The Administrator"
+        await aqueue_messages([build_invite_email(email, role, admin_org.name, sender_name)])
+
+        return JsonResponse({
+            "message": f"Invite sent to {email}",
+            "user": {"id": new_user.id, "email": new_user.email, "status": "Invited"}
+        })
+
+    async def patch(self, request):
+        """ Replace one member's permissions """
+        try:
+            user_id = int(request.json.get('user_id'))
+        except (TypeError, ValueError):
+            return JsonResponse({"error": "A numeric 'user_id' is required"}, status=400)
+        try:
+            permissions = validate_permissions(request.json.get('permissions'))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        updated = await UserProfile.objects.filter(
+            user_id=user_id,
+            organization_id=request.tenant.organization_id,
+        ).aupdate(permissions=permissions, updated_at=timezone.now())
+        if not updated:
+            return JsonResponse({"error": "User not found"}, status=404)
+        await sync_to_async(bump_authz_version)(user_id)
+        return JsonResponse({"message": "Permissions updated"})
+
+    async def delete(self, request):
+        """ Remove one member of the admin's organization """
+        try:
+            user_id = int(request.GET.get('id') or request.json.get('id'))
+        except (TypeError, ValueError):
+            return JsonResponse({"error": "A numeric 'id' is required"}, status=400)
+        if user_id == request.tenant.user.id:
+            return JsonResponse({"error": "You cannot delete yourself."}, status=400)
+
+        try:
+            target = await User.objects.select_related('profile').aget(id=user_id)
+        except User.DoesNotExist:
+            return JsonResponse({"error": "User not found"}, status=404)
+
+        profile = getattr(target, 'profile', None)
+        if profile and profile.organization_id and profile.organization_id != request.tenant.organization_id:
+            return JsonResponse({"error": "User belongs to another organization"}, status=403)
+
+        await target.adelete()
+        return JsonResponse({"message": "User removed successfully"})
+
+
+# 3. Current User
+class AsyncCurrentUserView(AsyncAPIView):
+
+    async def get(self, request):
+        tenant = request.tenant
+        entry = await aget_cached_me(tenant.user.id)
+        if entry is None:
+            if tenant.profile is None:
+                return JsonResponse({"error": "Profile not found"}, status=404)
+            entry = await aset_cached_me(
+                tenant.user.id, current_user_payload(tenant.user, tenant.profile, tenant.organization)
+            )
+
+        headers = {"ETag": entry['etag'], "Cache-Control": "private, no-cache"}
+        if request.headers.get('If-None-Match') == entry['etag']:
+            return HttpResponse(status=304, headers=headers)
+        return JsonResponse(entry['payload'], headers=headers)
@@ -0,0 +1,303 @@
+# backend/core/authentication.py
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.departments import department_map
+from core.models import UserProfile
+from core.permissions import PERMISSION_BITS, effective_mask, mask_for, profile_permission_mask
+from core.routers import use_primary
+from core.sharding import member_context
+
+
+class TenantContext:
+    """
+    Who is calling and which organization they act for.
+    Built once per request; views read this instead of walking
+    request.user.profile.organization (and paying a query per hop).
+    """
+    __slots__ = ('user', 'profile', 'organization', '_permission_mask')
+
+    def __init__(self, user):
+        self.user = user
+        # getattr() swallows RelatedObjectDoesNotExist for profile-less users
+        self.profile = getattr(user, 'profile', None)
+        self.organization = self.profile.organization if self.profile else None
+        self._permission_mask = None
+
+    @property
+    def user_id(self):
+        return self.user.pk
+
+    @property
+    def organization_id(self):
+        return self.profile.organization_id if self.profile else None
+
+    @property
+    def role(self):
+        return self.profile.role if self.profile else None
+
+    @property
+    def is_admin(self):
+        return self.role in ('SUPER_ADMIN', 'ORG_ADMIN')
+
+    @property
+    def department(self):
+        """ The caller's DepartmentInfo (name, resolved config) from the in-process map, or None. """
+        if self.profile is None or self.profile.department_id is None:
+            return None
+        return department_map(self.organization_id).get(self.profile.department_id)
+
+    @property
+    def permission_mask(self):
+        # Resolved once per request; later checks are a single AND
+        if self._permission_mask is None:
+            self._permission_mask = profile_permission_mask(self.profile)
+        return self._permission_mask
+
+    def has_perm(self, *names):
+        """ True if the caller holds every one of `names` (see core/permissions.py). """
+        required = PERMISSION_BITS[names[0]] if len(names) == 1 else mask_for(*names)
+        mask = self._permission_mask
+        if mask is None:
+            mask = self.permission_mask
+        return mask & required == required
+
+
+def get_tenant(request):
+    """
+    Returns the TenantContext for a DRF request.
+    TenantJWTAuthentication attaches it for free; for other auth paths
+    (session, force_authenticate in tests) it is built on first use.
+    """
+    user = request.user  # Runs authentication first
+    tenant = getattr(request, 'tenant', None)
+    if tenant is None or tenant.user_id != user.pk:
+        tenant = TenantContext(user)
+        request.tenant = tenant
+    return tenant
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    SimpleJWT authentication that loads User, UserProfile and Organization
+    in one joined query and attaches them to the request as `request.tenant`.
+    """
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            request.tenant = TenantContext(result[0])
+        return result
+
+    def get_user(self, validated_token):
+        try:
+            with use_primary():
+                user = self._user_queryset().get(**self._user_lookup(validated_token))
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self._check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of authenticate() for plain Django async views
+        (core/async_views.py). Token checks are pure CPU; the user is fetched
+        with the async ORM. Returns a TenantContext or None.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        try:
+            with use_primary():
+                user = await self._user_queryset().aget(**self._user_lookup(validated_token))
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return TenantContext(self._check_user(user, validated_token))
+
+    # Same checks as JWTAuthentication.get_user, split so both paths share them
+
+    def _user_queryset(self):
+        return self.user_model.objects.select_related('profile__organization')
+
+    def _user_lookup(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+        return {api_settings.USER_ID_FIELD: user_id}
+
+    def _check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+# --- Stateless (claims-based) authentication ---
+#
+# Access tokens carry the caller's role, organization id and the profile's
+# authz_version. Read-only views that opt into StatelessTenantJWTAuthentication
+# authorize from those claims; the only lookup per request is the current
+# authz_version, served from the cache for settings.VERSION_CACHE_TIMEOUT.
+
+TENANT_CLAIMS = ('role', 'org_id', 'authz_ver', 'perms')
+
+
+def authz_cache_key(user_id):
+    return f"authz-ver:{user_id}"
+
+
+def stamp_tenant_claims(token, user_id):
+    """ Writes role / org_id / authz_ver for the user into `token`, read fresh from the DB. """
+    # Token endpoints aren't served on a shard; find the member's
+    with member_context(user_id):
+        row = (
+            UserProfile.objects
+            .filter(user_id=user_id)
+            .values('role', 'organization_id', 'authz_version', 'permissions')
+            .first()
+        )
+    # Profile-less users get no claims and always take the DB-backed path
+    if row is not None:
+        token['role'] = row['role']
+        token['org_id'] = row['organization_id']
+        token['authz_ver'] = row['authz_version']
+        token['perms'] = effective_mask(row['role'], row['permissions'])
+    return token
+
+
+class TenantRefreshToken(RefreshToken):
+    """ Refresh token whose access tokens are stamped with current tenant claims. """
+
+    @property
+    def access_token(self):
+        return stamp_tenant_claims(super().access_token, self[api_settings.USER_ID_CLAIM])
+
+
+def current_authz_version(user_id):
+    """
+    The authz_version a token must carry to be accepted, or 0 when the user
+    is gone or inactive (tokens always carry >= 1, so those are rejected).
+    """
+    key = authz_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # A replica behind a bump would put the old version back for the whole timeout
+        with member_context(user_id), use_primary():
+            version = (
+                UserProfile.objects
+                .filter(user_id=user_id, user__is_active=True)
+                .values_list('authz_version', flat=True)
+                .first()
+            ) or 0
+        cache.set(key, version, settings.VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def bump_authz_version(*user_ids):
+    """
+    Call after changing a member's role, organization or permissions.
+    Their outstanding access tokens stop working for stateless reads;
+    the client's 401 -> refresh cycle picks up the new claims.
+    """
+    if not user_ids:
+        return
+    UserProfile.objects.filter(user_id__in=user_ids).update(
+        authz_version=F('authz_version') + 1, updated_at=timezone.now()
+    )
+    forget_authz_version(*user_ids)
+
+
+def forget_authz_version(*user_ids):
+    if user_ids:
+        cache.delete_many([authz_cache_key(uid) for uid in user_ids])
+
+
+class ClaimsTenantContext:
+    """
+    TenantContext read from token claims. organization_id, role, is_admin and
+    has_perm() cost nothing; user / profile / organization are loaded with one
+    joined query the first time a view asks for them.
+    """
+    __slots__ = ('user_id', 'organization_id', 'role', '_permission_mask', '_tenant')
+
+    is_admin = TenantContext.is_admin
+    has_perm = TenantContext.has_perm
+
+    def __init__(self, validated_token):
+        self.user_id = validated_token[api_settings.USER_ID_CLAIM]
+        self.organization_id = validated_token.get('org_id')
+        self.role = validated_token.get('role')
+        self._permission_mask = validated_token['perms']
+        self._tenant = None
+
+    @property
+    def permission_mask(self):
+        return self._permission_mask
+
+    def _load(self):
+        if self._tenant is None:
+            # Views cache what they build from this (e.g. /api/user/me/)
+            with use_primary():
+                user = get_user_model().objects.select_related('profile__organization').get(pk=self.user_id)
+            self._tenant = TenantContext(user)
+        return self._tenant
+
+    @property
+    def user(self):
+        return self._load().user
+
+    @property
+    def profile(self):
+        return self._load().profile
+
+    @property
+    def organization(self):
+        return self._load().organization
+
+
+class StatelessTenantJWTAuthentication(TenantJWTAuthentication):
+    """
+    For GET/HEAD/OPTIONS: trusts the tenant claims in the access token instead
+    of loading the User row. request.user is a simplejwt TokenUser.
+    Writes, and tokens issued without the claims, fall through to the next
+    authentication class, so list it before TenantJWTAuthentication.
+    """
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return None
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if any(claim not in validated_token for claim in TENANT_CLAIMS):
+            return None
+
+        user_id = self._user_lookup(validated_token)[api_settings.USER_ID_FIELD]
+        if validated_token['authz_ver'] != current_authz_version(user_id):
+            raise AuthenticationFailed(_("Token claims are out of date"), code="token_stale")
+
+        request.tenant = ClaimsTenantContext(validated_token)
+        return api_settings.TOKEN_USER_CLASS(validated_token), validated_token
@@ -0,0 +1,185 @@
+# backend/core/benchmark.py
+#
+# Shared pieces of 'seed_synthetic_data' and 'bench_api': how synthetic
+# tenants are named (so the benchmark finds what the seeder made), latency
+# statistics, and an HTTP load generator that drives the real application
+# on a loopback port from client threads: the WSGI application served in
+# process, or config.asgi under uvicorn in a child process.
+
+import http.client
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+
+DEFAULT_PREFIX = 'bench'
+DEFAULT_PASSWORD = 'bench-password-1'
+
+
+def org_name(prefix, number):
+    return f"{prefix} org {number}"
+
+
+def org_domain(prefix, number):
+    return f"org{number}.{prefix}.example"
+
+
+def admin_email(prefix, number):
+    """ Every synthetic organization has exactly one ORG_ADMIN, who can log in with the seeding password. """
+    return f"admin@{org_domain(prefix, number)}"
+
+
+# --- Statistics ---
+
+def percentile(ordered, p):
+    """ Nearest-rank percentile of an already sorted list. """
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies, errors=0, queries=(), elapsed=None):
+    """
+    One scenario's figures, latencies in ms. `elapsed` is the wall time the
+    requests took together; sequential runs leave it out and use their sum.
+    """
+    ordered = sorted(latencies)
+    total = elapsed if elapsed is not None else sum(ordered)
+    queries = [n for n in queries if n is not None]
+
+    def ms(seconds):
+        return round(seconds * 1000, 3) if seconds is not None else None
+
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else None,
+        "max_ms": ms(ordered[-1]) if ordered else None,
+        "throughput_rps": round(len(ordered) / total, 1) if total else None,
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "max_queries": max(queries) if queries else None,
+    }
+
+
+_SERVER_TIMING_QUERIES = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+
+
+def server_timing_queries(header):
+    """ The query count RequestMetricsMiddleware put in a Server-Timing header, or None. """
+    match = _SERVER_TIMING_QUERIES.search(header or '')
+    return int(match.group(1)) if match else None
+
+
+# --- In-process HTTP load ---
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def live_server():
+    """ Serves the WSGI application on 127.0.0.1 (a free port) for the duration of the block. """
+    server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler, allow_reuse_address=False)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    try:
+        yield server.server_address[:2]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@contextmanager
+def asgi_server(startup_timeout=30):
+    """
+    Serves config.asgi:application (the deployed stack, connection pool
+    included) with uvicorn on 127.0.0.1 for the duration of the block. It
+    runs in its own process so settings see DJANGO_ASGI, as they do in
+    production. Raises RuntimeError if the server doesn't come up.
+    """
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'config.asgi:application',
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning', '--no-access-log'],
+        cwd=settings.BASE_DIR, env=os.environ.copy(), stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"uvicorn did not start listening within {startup_timeout}s")
+                time.sleep(0.1)
+        yield '127.0.0.1', port
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_http_load(address, requests, concurrency):
+    """
+    Sends `requests` ((label, method, path, headers) tuples) from
+    `concurrency` threads, each over its own keep-alive connection.
+    Returns ([(label, seconds, status, queries)], wall seconds).
+    """
+    host, port = address
+    lock = threading.Lock()
+    pending = iter(requests)
+    results = []
+
+    def worker():
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        try:
+            while True:
+                with lock:
+                    item = next(pending, None)
+                if item is None:
+                    return
+                label, method, path, headers = item
+                start = time.perf_counter()
+                try:
+                    connection.request(method, path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    status, queries = response.status, server_timing_queries(response.getheader('Server-Timing'))
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    status, queries = None, None
+                elapsed = time.perf_counter() - start
+                with lock:
+                    results.append((label, elapsed, status, queries))
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return results, time.perf_counter() - start
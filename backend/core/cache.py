@@ -0,0 +1,53 @@
+# backend/core/cache.py
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Bump when the /api/user/me/ payload changes shape so old entries are ignored
+ME_CACHE_VERSION = 1
+ME_CACHE_TIMEOUT = 60 * 10
+
+
+def me_cache_timeout():
+    # invalidate_me() only reaches other workers through a shared cache; without one, trust an entry only briefly
+    return min(ME_CACHE_TIMEOUT, settings.VERSION_CACHE_TIMEOUT)
+
+
+def me_cache_key(user_id):
+    return f"user-me:v{ME_CACHE_VERSION}:{user_id}"
+
+
+def get_cached_me(user_id):
+    """ Returns {'etag': ..., 'payload': ...} or None. """
+    return cache.get(me_cache_key(user_id))
+
+
+def set_cached_me(user_id, payload):
+    """ Stores the payload with a content hash ETag and returns the entry. """
+    entry = _make_entry(payload)
+    cache.set(me_cache_key(user_id), entry, me_cache_timeout())
+    return entry
+
+
+def _make_entry(payload):
+    raw = json.dumps(payload, sort_keys=True, cls=DjangoJSONEncoder).encode()
+    return {'etag': f'"{hashlib.md5(raw).hexdigest()}"', 'payload': payload}
+
+
+async def aget_cached_me(user_id):
+    return await cache.aget(me_cache_key(user_id))
+
+
+async def aset_cached_me(user_id, payload):
+    entry = _make_entry(payload)
+    await cache.aset(me_cache_key(user_id), entry, me_cache_timeout())
+    return entry
+
+
+def invalidate_me(*user_ids):
+    if user_ids:
+        cache.delete_many([me_cache_key(uid) for uid in user_ids])
@@ -0,0 +1,133 @@
+# backend/core/departments.py
+#
+# A department's effective config is its organization's department_defaults
+# with the department's own config merged on top. Both the names and the
+# resolved configs of an organization's departments are kept in an
+# in-process map, rebuilt only when Organization.config_version moves on.
+# Checking the version is one cache read (kept for
+# settings.VERSION_CACHE_TIMEOUT); the map itself never hits the DB while it
+# is current. Both are read from the primary: a map built from a lagging
+# replica would carry the new version with the old contents until the next bump.
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from core.models import Department, Organization
+from core.routers import use_primary
+
+DEPARTMENT_MAP_SIZE = 1000
+
+DepartmentInfo = namedtuple('DepartmentInfo', ('id', 'name', 'config', 'effective_config'))
+
+
+class DepartmentMap(dict):
+    """ {department_id: DepartmentInfo} for one organization, plus its defaults. """
+
+    def __init__(self, version, defaults, departments):
+        super().__init__((d.id, d) for d in departments)
+        self.version = version
+        self.defaults = defaults
+
+    def name(self, department_id, default="-"):
+        department = self.get(department_id)
+        return department.name if department else default
+
+    def effective_config(self, department_id):
+        """ Resolved config for a department; the defaults for none/unknown. """
+        department = self.get(department_id)
+        return department.effective_config if department else self.defaults
+
+
+def validate_config(data):
+    """ A department config (or set of defaults) is any JSON object. Raises ValueError. """
+    if not isinstance(data, dict):
+        raise ValueError("Config must be an object")
+    return data
+
+
+def merge_config(target, patch):
+    """
+    JSON merge patch (RFC 7396): nested objects merge key by key, null
+    removes a key, anything else replaces. Used both to resolve overrides
+    on top of the defaults and to apply PATCH bodies. Never mutates inputs.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    merged = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = merge_config(merged.get(key), value)
+    return merged
+
+
+def config_cache_key(organization_id):
+    return f"dept-config-ver:{organization_id}"
+
+
+def current_config_version(organization_id):
+    key = config_cache_key(organization_id)
+    version = cache.get(key)
+    if version is None:
+        with use_primary():
+            version = (
+                Organization.objects.filter(pk=organization_id)
+                .values_list('config_version', flat=True)
+                .first()
+            ) or 0
+        cache.set(key, version, settings.VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def bump_config_version(organization_id, **fields):
+    """
+    Call after changing any department of an organization; `fields` (e.g.
+    department_defaults=...) are written in the same UPDATE.
+    """
+    Organization.objects.filter(pk=organization_id).update(config_version=F('config_version') + 1, **fields)
+    # Forget after commit too, or a reader could re-cache the old version in between
+    cache.delete(config_cache_key(organization_id))
+    transaction.on_commit(lambda: cache.delete(config_cache_key(organization_id)))
+
+
+# Resolved maps keyed by organization id, tagged with the version they were built from
+_maps = {}
+
+
+def department_map(organization_id):
+    """
+    The organization's DepartmentMap, rebuilt only when its config_version
+    changed. It is shared by every request in the process: treat it as read-only.
+    """
+    if organization_id is None:
+        return DepartmentMap(0, {}, [])
+    version = current_config_version(organization_id)
+    cached = _maps.get(organization_id)
+    if cached is not None and cached.version == version:
+        return cached
+
+    with use_primary():
+        defaults = (
+            Organization.objects.filter(pk=organization_id)
+            .values_list('department_defaults', flat=True)
+            .first()
+        ) or {}
+        departments = [
+            DepartmentInfo(dept_id, name, config or {}, merge_config(defaults, config or {}))
+            for dept_id, name, config in Department.objects.filter(
+                organization_id=organization_id
+            ).order_by('name').values_list('id', 'name', 'config')
+        ]
+    if len(_maps) >= DEPARTMENT_MAP_SIZE:
+        _maps.clear()
+    _maps[organization_id] = resolved = DepartmentMap(version, defaults, departments)
+    return resolved
+
+
+def effective_config(organization_id, department_id):
+    return department_map(organization_id).effective_config(department_id)
@@ -0,0 +1,69 @@
+# backend/core/explain.py
+
+import json
+import re
+
+from django.contrib.auth.models import User
+from django.db import connections
+
+from core.models import StaffSearchTerm, UserProfile
+
+# SQLite: "SCAN core_userprofile" without an index is a full table scan
+_SQLITE_SCAN = re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)(?!.*USING (?:COVERING )?INDEX)')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def full_scans(queryset):
+    """
+    Runs EXPLAIN for a queryset and returns the tables it reads with a full scan.
+    Works on SQLite, MySQL/MariaDB and PostgreSQL.
+
+    Note: on tiny tables MySQL may legitimately prefer a scan;
+    run this against realistic data (e.g. after seeding) and ANALYZE TABLE.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'mysql':
+        plan = json.loads(queryset.explain(format='json'))
+        return sorted(set(_mysql_full_scans(plan)))
+    plan = queryset.explain()
+    if vendor == 'postgresql':
+        return sorted(set(_POSTGRES_SCAN.findall(plan)))
+    return sorted({
+        table for line in plan.splitlines() for table in _SQLITE_SCAN.findall(line)
+        if 'CONSTANT ROW' not in line
+    })
+
+
+def _mysql_full_scans(node):
+    if isinstance(node, dict):
+        table = node.get('table')
+        if isinstance(table, dict) and table.get('access_type') == 'ALL':
+            yield table.get('table_name')
+        for value in node.values():
+            yield from _mysql_full_scans(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _mysql_full_scans(item)
+
+
+def assert_no_full_scan(queryset, allow=()):
+    """ Test helper: fails if the queryset's plan scans any table not listed in `allow`. """
+    scanned = [t for t in full_scans(queryset) if t not in allow]
+    if scanned:
+        raise AssertionError(
+            f"Full table scan on {', '.join(scanned)}:\n{queryset.query}\n\n{queryset.explain()}"
+        )
+
+
+def hot_queries(organization_id=1, user_id=1, email='someone@example.com'):
+    """ The tenant-scoped lookups every request depends on, by name. """
+    return {
+        'staff_by_org': UserProfile.objects.filter(organization_id=organization_id),
+        'staff_by_org_role': UserProfile.objects.filter(organization_id=organization_id, role='STAFF'),
+        'staff_by_org_department': UserProfile.objects.filter(organization_id=organization_id, department_id=1),
+        'profile_in_org': UserProfile.objects.filter(user_id=user_id, organization_id=organization_id),
+        'invite_email_exists': User.objects.filter(email=email),
+        'staff_search_prefix': StaffSearchTerm.objects.filter(
+            organization_id=organization_id, term__gte='jo', term__lt='jp', term__startswith='jo'
+        ),
+    }
@@ -0,0 +1,208 @@
+# backend/core/export.py
+#
+# Roster export for audits, streamed as CSV or XLSX. Rows are read in
+# keyset-paginated chunks (WHERE id > last ORDER BY id LIMIT n) and written
+# out as they arrive, so memory stays flat however large the organization.
+# Keyset chunks rather than one .iterator() query: the MySQL drivers buffer
+# a whole result set client side, and that is the backend we run on.
+
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from core.departments import department_map
+from core.permissions import PERMISSION_BITS, PERMISSIONS, effective_mask
+from core.stats import member_status
+
+EXPORT_CHUNK_SIZE = 2000
+# Rows per chunk handed to the response; small enough to start the download at once
+EXPORT_FLUSH_ROWS = 500
+
+EXPORT_COLUMNS = (
+    ['ID', 'First Name', 'Last Name', 'Email', 'Role', 'Designation', 'Department',
+     'Status', 'Joined', 'Last Login']
+    + [name.replace('_', ' ').title() for name in PERMISSIONS]
+)
+
+
+def roster_rows(members, organization_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields one list of cell values per member of `members` (an
+    organization-scoped UserProfile queryset), in id order.
+    """
+    departments = department_map(organization_id)
+    members = members.order_by('id').values_list(
+        'id', 'user_id', 'user__first_name', 'user__last_name', 'user__email', 'role',
+        'designation', 'department_id', 'user__is_active', 'user__date_joined', 'user__last_login',
+        'permissions',
+    )
+    last_id = 0
+    while True:
+        chunk = list(members.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        for (_, user_id, first_name, last_name, email, role, designation, department_id,
+             is_active, date_joined, last_login, permissions) in chunk:
+            mask = effective_mask(role, permissions)
+            yield [
+                user_id, first_name, last_name, email, role, designation or '',
+                departments.name(department_id, default=''),
+                member_status(is_active, last_login).title(),
+                date_joined, last_login,
+            ] + ['Yes' if mask & PERMISSION_BITS[name] else 'No' for name in PERMISSIONS]
+        last_id = chunk[-1][0]
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(timespec='seconds')
+    return str(value)
+
+
+# --- CSV ---
+
+class _Echo:
+    """ csv.writer target that hands each formatted line straight back. """
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    text = _text(value)
+    # Spreadsheet apps run cells starting with these as formulas (CSV injection)
+    if text[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + text
+    return text
+
+
+def csv_stream(rows, columns=EXPORT_COLUMNS):
+    """ Yields the CSV a few hundred lines at a time; BOM first so Excel reads it as UTF-8. """
+    writer = csv.writer(_Echo())
+    lines = ['\ufeff' + writer.writerow(columns)]
+    for row in rows:
+        lines.append(writer.writerow([_csv_cell(value) for value in row]))
+        if len(lines) >= EXPORT_FLUSH_ROWS:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+# --- XLSX ---
+#
+# An .xlsx file is a zip of a few XML parts. Only the worksheet grows with
+# the data; it is written row by row into a zip entry, and zipfile falls
+# back to data descriptors on a non-seekable target, so compressed bytes
+# can be handed on as soon as they exist. Strings are inline, so there is
+# no shared-string table to hold in memory.
+
+_XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Staff" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+# Characters XML 1.0 does not allow at all
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# Excel's hard limit, header included
+XLSX_MAX_ROWS = 1048576
+
+
+class _ChunkSink:
+    """ Write-only, non-seekable file object that collects what zipfile writes. """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _xlsx_cell(value):
+    if isinstance(value, bool) or value is None or not isinstance(value, (int, float)):
+        text = escape(_XML_ILLEGAL.sub('', _text(value)))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+    return f'<c><v>{value}</v></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def xlsx_stream(rows, columns=EXPORT_COLUMNS):
+    """ Yields a single-sheet .xlsx workbook as compressed bytes while `rows` is consumed. """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, xml in _XLSX_STATIC_PARTS.items():
+            workbook.writestr(name, xml)
+
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            buffered = [_xlsx_row(columns)]
+            written = 1
+            for row in rows:
+                if written == XLSX_MAX_ROWS - 1:
+                    # Can't fail mid-download; say so in the file instead of silently dropping rows
+                    buffered.append(_xlsx_row(["Truncated at Excel's row limit; export as CSV for every row"]))
+                    break
+                buffered.append(_xlsx_row(row))
+                written += 1
+                if len(buffered) >= EXPORT_FLUSH_ROWS:
+                    sheet.write(''.join(buffered).encode())
+                    buffered = []
+                    data = sink.drain()
+                    if data:
+                        yield data
+            sheet.write((''.join(buffered) + '</sheetData></worksheet>').encode())
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8', 'csv'),
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
@@ -0,0 +1,240 @@
+# backend/core/gazetteer.py
+#
+# Place-name autocomplete for the setup wizard, answered from memory. The
+# gazetteer (settings.GAZETTEER_PATH, a TSV file; see 'import_gazetteer' to
+# build one from a GeoNames dump) is loaded once per process into a sorted
+# list of normalized name keys. Every word start of every name and alternate
+# name is a key, so "delhi" finds "New Delhi". A query is a prefix: two
+# bisects give the range of matching keys, and the most populous places in
+# it win. Results are kept in an in-process LRU cache.
+#
+# When nothing matches locally and settings.LOCATION_SEARCH_UPSTREAM names a
+# provider (e.g. 'core.gazetteer.NominatimProvider'), the query falls through
+# to it; its answers are kept in the shared cache, since they cost a network
+# round trip.
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import unicodedata
+import urllib.parse
+import urllib.request
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from itertools import groupby
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+LOCATION_MIN_QUERY_LENGTH = 2
+LOCATION_DEFAULT_LIMIT = 8
+LOCATION_MAX_LIMIT = 20
+LOCATION_CACHE_SIZE = 4096
+UPSTREAM_CACHE_TIMEOUT = 60 * 60 * 24
+# Prefixes up to this long match too much of a big gazetteer to rank per query; their answers are precomputed
+PRECOMPUTED_PREFIX_LENGTH = 3
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+Place = namedtuple('Place', 'id name region country population alternate_names')
+
+
+def normalize(text):
+    """ Case- and accent-folded, with anything but letters and digits collapsed to single spaces. """
+    text = text or ''
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return _SEPARATORS.sub(' ', text.casefold()).strip()
+
+
+def place_payload(place):
+    return {
+        "id": place.id,
+        "name": place.name,
+        "region": place.region or None,
+        "country": place.country or None,
+        "label": ', '.join(part for part in (place.name, place.region, place.country) if part),
+    }
+
+
+# --- Index ---
+
+class Gazetteer:
+    """
+    Places, biggest first, plus a sorted list of (key, place index) pairs kept
+    as two parallel lists so lookups bisect plain strings. Since places are
+    ordered by population, ranking a range of keys is sorting its indexes.
+    """
+
+    def __init__(self, places):
+        self.places = sorted(places, key=lambda place: -place.population)
+        self.regions = [f" {normalize(place.region)} {normalize(place.country)}" for place in self.places]
+        entries = set()
+        for index, place in enumerate(self.places):
+            for name in (place.name, *place.alternate_names):
+                words = normalize(name).split()
+                for start in range(len(words)):
+                    entries.add((' '.join(words[start:]), index))
+        entries = sorted(entries)
+        self.keys = [key for key, _ in entries]
+        self.indexes = [index for _, index in entries]
+
+        # Longest prefixes first: each shorter group is a superset and overwrites what it covers
+        self.top = {}
+        for length in range(PRECOMPUTED_PREFIX_LENGTH, LOCATION_MIN_QUERY_LENGTH - 1, -1):
+            position = 0
+            for prefix, group in groupby(self.keys, key=lambda key: key[:length]):
+                size = sum(1 for _ in group)
+                self.top[prefix] = sorted(set(self.indexes[position:position + size]))[:LOCATION_MAX_LIMIT]
+                position += size
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads the TSV: name, region, country, population and comma-separated
+        alternate names per line; '#' lines are comments.
+        """
+        places = []
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip() or line.startswith('#'):
+                    continue
+                name, region, country, population, *alternates = line.rstrip('\n').split('\t')
+                alternates = tuple(filter(None, alternates[0].split(','))) if alternates else ()
+                places.append(Place(str(line_number), name, region, country, int(population or 0), alternates))
+        return cls(places)
+
+    def __len__(self):
+        return len(self.places)
+
+    def search(self, query, limit):
+        """
+        Places with a name word starting with the query, biggest first (exact
+        names ahead). Parts after a comma narrow by region or country:
+        "springfield, ill".
+        """
+        name, *qualifiers = [normalize(part) for part in query.split(',')]
+        qualifiers = [qualifier for qualifier in qualifiers if qualifier]
+        if len(name) < LOCATION_MIN_QUERY_LENGTH:
+            return []
+        start = bisect_left(self.keys, name)
+        # Keys hold only letters, digits and spaces, so this sorts after every key starting with `name`
+        end = bisect_left(self.keys, name + '\uffff', start)
+        exact_end = bisect_right(self.keys, name, start, end)
+
+        ranked = sorted(set(self.indexes[start:exact_end]))
+        if len(name) <= PRECOMPUTED_PREFIX_LENGTH and not qualifiers:
+            ranked += self.top.get(name, ())
+        else:
+            ranked += sorted(set(self.indexes[exact_end:end]))
+
+        results = []
+        for index in dict.fromkeys(ranked):
+            if all(f" {qualifier}" in self.regions[index] for qualifier in qualifiers):
+                results.append(self.places[index])
+                if len(results) == limit:
+                    break
+        return results
+
+
+_lock = threading.Lock()
+_gazetteer = None
+
+
+def gazetteer():
+    """ This process's index, loaded on first use. A missing file means an empty gazetteer. """
+    global _gazetteer
+    if _gazetteer is None:
+        with _lock:
+            if _gazetteer is None:
+                try:
+                    _gazetteer = Gazetteer.load(settings.GAZETTEER_PATH)
+                except FileNotFoundError:
+                    logger.warning("Gazetteer %s not found; location search is upstream-only", settings.GAZETTEER_PATH)
+                    _gazetteer = Gazetteer([])
+    return _gazetteer
+
+
+def reload_gazetteer():
+    global _gazetteer
+    with _lock:
+        _gazetteer = None
+        _local_search.cache_clear()
+
+
+@lru_cache(maxsize=LOCATION_CACHE_SIZE)
+def _local_search(query, limit):
+    return tuple(place_payload(place) for place in gazetteer().search(query, limit))
+
+
+# --- Upstream providers ---
+
+class NominatimProvider:
+    """
+    OpenStreetMap's Nominatim. Mind its usage policy (one request per second,
+    an identifying User-Agent); LOCATION_SEARCH_UPSTREAM_URL can point at a
+    self-hosted instance instead.
+    """
+
+    def __init__(self):
+        self.url = settings.LOCATION_SEARCH_UPSTREAM_URL or 'https://nominatim.openstreetmap.org/search'
+        self.timeout = settings.LOCATION_SEARCH_UPSTREAM_TIMEOUT
+
+    def __call__(self, query, limit):
+        url = f"{self.url}?" + urllib.parse.urlencode({
+            'q': query, 'format': 'jsonv2', 'addressdetails': 1, 'limit': limit,
+        })
+        request = urllib.request.Request(url, headers={'User-Agent': settings.LOCATION_SEARCH_USER_AGENT})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            rows = json.load(response)
+        results = []
+        for row in rows:
+            address = row.get('address') or {}
+            name = row.get('name') or address.get('city') or address.get('town') or address.get('village') or ''
+            region, country = address.get('state', ''), address.get('country', '')
+            results.append({
+                "id": f"osm:{row.get('osm_type', '')}:{row.get('osm_id', row.get('place_id'))}",
+                "name": name,
+                "region": region or None,
+                "country": country or None,
+                "label": ', '.join(part for part in (name, region, country) if part) or row.get('display_name', ''),
+            })
+        return results
+
+
+@lru_cache(maxsize=None)
+def upstream_provider():
+    path = settings.LOCATION_SEARCH_UPSTREAM
+    return import_string(path)() if path else None
+
+
+def _upstream_search(query, limit):
+    provider = upstream_provider()
+    key = f"location-upstream:{hashlib.md5(f'{limit}:{query}'.encode()).hexdigest()}"
+    results = cache.get(key)
+    if results is None:
+        try:
+            results = provider(query, limit)
+        except Exception:
+            # Autocomplete degrades to "no suggestions"; the field stays free text
+            logger.warning("Upstream location search failed for %r", query, exc_info=True)
+            return []
+        cache.set(key, results, UPSTREAM_CACHE_TIMEOUT)
+    return results
+
+
+def search_locations(query, limit=LOCATION_DEFAULT_LIMIT):
+    """ (results, source): the gazetteer's matches, else the upstream provider's, else nothing. """
+    query = ', '.join(filter(None, (normalize(part) for part in (query or '').split(','))))
+    if len(query) < LOCATION_MIN_QUERY_LENGTH:
+        return [], 'local'
+    results = list(_local_search(query, limit))
+    if results or upstream_provider() is None:
+        return results, 'local'
+    return _upstream_search(query, limit), 'upstream'
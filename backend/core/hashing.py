@@ -0,0 +1,78 @@
+# backend/core/hashing.py
+#
+# PBKDF2 runs a million SHA-256 rounds per password. At the morning login
+# spike every web worker was busy hashing at once and nothing else got CPU.
+# This hasher sends the work to a small process pool with a cap on how many
+# hashes may be running or waiting; beyond that, callers get a 503 instead
+# of piling onto the CPU.
+
+import base64
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.utils.encoding import force_bytes
+from rest_framework.exceptions import APIException
+
+
+class HashingBusy(APIException):
+    status_code = 503
+    default_detail = "The server is busy. Please try again in a moment."
+    default_code = "hashing_busy"
+
+
+def _pbkdf2(password, salt, iterations, digest_name):
+    # Runs in the pool's worker processes; only needs hashlib
+    return hashlib.pbkdf2_hmac(digest_name, password, salt, iterations)
+
+
+class _HashPool:
+    """ Lazily started process pool plus a semaphore bounding running + queued jobs. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                self._slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_PENDING)
+                # spawn, not fork: never copy the parent's DB connections or threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+        return self._executor
+
+    def run(self, *args):
+        executor = self._executor or self._start()
+        if not self._slots.acquire(timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT):
+            raise HashingBusy()
+        try:
+            return executor.submit(_pbkdf2, *args).result()
+        finally:
+            self._slots.release()
+
+
+hash_pool = _HashPool()
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Drop-in for Django's PBKDF2PasswordHasher (same algorithm name and output,
+    so existing hashes keep verifying). verify() goes through encode(), so
+    login checks use the pool as well. PASSWORD_HASH_WORKERS=0 hashes inline.
+    """
+    def encode(self, password, salt, iterations=None):
+        if not settings.PASSWORD_HASH_WORKERS:
+            return super().encode(password, salt, iterations)
+
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        raw = hash_pool.run(force_bytes(password), force_bytes(salt), iterations, self.digest().name)
+        hash = base64.b64encode(raw).decode("ascii").strip()
+        return "%s$%d$%s$%s" % (self.algorithm, iterations, salt, hash)
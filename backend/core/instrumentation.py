@@ -0,0 +1,330 @@
+# backend/core/instrumentation.py
+#
+# Per-request performance numbers: DB query count and time, cache hits and
+# misses, email enqueue time and total latency. RequestMetricsMiddleware
+# collects them into a RequestMetrics object held in a context variable,
+# returns them to the client as a Server-Timing header and adds them to the
+# in-process registry served by /api/metrics/ in Prometheus text format.
+# The registry is per worker process; scrape every worker.
+#
+# Views may declare `query_budget` (an int, or {method: int}); a request that
+# runs more queries than its view's budget is logged and counted, and
+# assert_within_query_budget() turns the same budget into a test failure.
+
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    """ What one request has spent so far; times in seconds. """
+    __slots__ = ('started', 'queries', 'db_time', 'cache_hits', 'cache_misses', 'mails', 'mail_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.mails = 0
+        self.mail_time = 0.0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+# The current request's metrics; None outside a request (commands, workers)
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+# --- 1. Collectors ---
+
+def _record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """ Times every query on every connection; the wrapper list outlives reconnects, hence the check. """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _record_cache(hits, misses):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+_MISSING = object()
+
+
+class CacheMetricsMixin:
+    """ Counts hits and misses of get() (and everything built on it, aget() and get_or_set() included). """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        if value is _MISSING:
+            _record_cache(0, 1)
+            return default
+        _record_cache(1, 0)
+        return value
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, LocMemCache):
+    """ LocMemCache.get_many() goes through get(), so it is counted already. """
+
+
+class InstrumentedRedisCache(CacheMetricsMixin, RedisCache):
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        _record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+@contextmanager
+def timed_mail_enqueue(count):
+    """ Wraps the outbox write of `count` messages (see core/mail.py). """
+    metrics = current_metrics.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.mails += count
+            metrics.mail_time += time.perf_counter() - start
+
+
+# --- 2. Registry ---
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    'http_requests_total': ('counter', "Requests served, by route, method and status."),
+    'http_request_duration_seconds': ('histogram', "Time to build the response, by route and method."),
+    'db_queries_total': ('counter', "Database queries run while serving requests."),
+    'db_query_duration_seconds_total': ('counter', "Time spent in database queries."),
+    'cache_hits_total': ('counter', "Cache reads that found a value."),
+    'cache_misses_total': ('counter', "Cache reads that found nothing."),
+    'mail_enqueued_total': ('counter', "Emails written to the outbox."),
+    'mail_enqueue_duration_seconds_total': ('counter', "Time spent writing emails to the outbox."),
+    'query_budget_exceeded_total': ('counter', "Requests that ran more queries than their view's budget."),
+    'log_records_dropped_total': ('counter', "Log records dropped because the log queue was full."),
+}
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """ Counters and histograms kept in process memory, rendered in Prometheus text format. """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = defaultdict(int)
+        # {(name, labels): [bucket counts..., sum, count]}
+        self._histograms = {}
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._counters[(name, tuple(labels))] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            series = self._histograms.setdefault((name, tuple(labels)), [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(series)) for key, series in self._histograms.items())
+
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, help_text = METRICS[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_label_text(labels)} {_number(value)}")
+        for (name, labels), series in histograms:
+            describe(name)
+            for bound, n in zip(LATENCY_BUCKETS, series):
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {n}")
+            lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{name}_sum{_label_text(labels)} {_number(series[-2])}")
+            lines.append(f"{name}_count{_label_text(labels)} {series[-1]}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+# --- 3. Query budgets ---
+
+def query_budget(view_class, method):
+    """ The declared budget of a view for an HTTP method, or None. """
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method.upper())
+    return budget
+
+
+@contextmanager
+def assert_within_query_budget(view_class, method):
+    """
+    Test helper: fails if the block runs more queries than `view_class`
+    allows for `method`, counted as the middleware counts them (transaction
+    statements aside). Yields the RequestMetrics being filled.
+    """
+    budget = query_budget(view_class, method)
+    if budget is None:
+        raise AssertionError(f"{view_class.__name__} declares no query budget for {method}")
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(sender=None, connection=connection)
+
+    metrics = RequestMetrics()
+    token = current_metrics.set(metrics)
+    try:
+        with CaptureQueriesContext(connections['default']) as captured:
+            yield metrics
+    finally:
+        current_metrics.reset(token)
+    if metrics.queries > budget:
+        statements = '\n'.join(query['sql'] for query in captured.captured_queries)
+        raise AssertionError(
+            f"{view_class.__name__}.{method.lower()} ran {metrics.queries} queries "
+            f"(budget {budget}):\n{statements}"
+        )
+
+
+# --- 4. Middleware ---
+
+def _route(request):
+    # The URL pattern, not the path, so ids don't make a new series per object
+    match = getattr(request, 'resolver_match', None)
+    return ('/' + match.route) if match is not None else 'unmatched'
+
+
+def server_timing(metrics, total):
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+        f'mail;dur={metrics.mail_time * 1000:.1f};desc="{metrics.mails} queued"',
+        f'total;dur={total * 1000:.1f}',
+    ])
+
+
+class RequestMetricsMiddleware:
+    """
+    Goes first in MIDDLEWARE so the total covers the whole stack. For a
+    streaming response (roster export) it covers the time to the first byte.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        # Kept on the request for in-process callers (the test client's response.wsgi_request)
+        request.metrics = metrics
+        total = metrics.elapsed
+        route = _route(request)
+        labels = (('route', route),)
+
+        registry.inc('http_requests_total', labels + (('method', request.method), ('status', response.status_code)))
+        registry.observe('http_request_duration_seconds', labels + (('method', request.method),), total)
+        registry.inc('db_queries_total', labels, metrics.queries)
+        registry.inc('db_query_duration_seconds_total', labels, metrics.db_time)
+        registry.inc('cache_hits_total', labels, metrics.cache_hits)
+        registry.inc('cache_misses_total', labels, metrics.cache_misses)
+        if metrics.mails:
+            registry.inc('mail_enqueued_total', labels, metrics.mails)
+            registry.inc('mail_enqueue_duration_seconds_total', labels, metrics.mail_time)
+
+        match = getattr(request, 'resolver_match', None)
+        view_class = getattr(match.func, 'view_class', None) if match is not None else None
+        budget = query_budget(view_class, request.method) if view_class is not None else None
+        if budget is not None and metrics.queries > budget:
+            registry.inc('query_budget_exceeded_total', labels + (('method', request.method),))
+            logger.warning(
+                "%s %s ran %d queries (%s budget: %d)",
+                request.method, route, metrics.queries, view_class.__name__, budget,
+            )
+
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = server_timing(metrics, total)
+        return response
@@ -0,0 +1,185 @@
+# backend/core/logconfig.py
+#
+# Logging that never blocks a request. Request threads only filter a record
+# (sampling, request id), flatten it and put it on a bounded in-memory queue;
+# one background thread per process formats records as JSON lines and writes
+# them to stdout. If the writer falls behind and the queue fills up, new
+# records are dropped and counted instead of making the request wait: the
+# count shows up as a warning record once there is room again, and as
+# log_records_dropped_total on /api/metrics/.
+#
+# Wired up through settings.LOGGING; see the 'queue' handler there.
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Set for the duration of each request by core.middleware.RequestIdMiddleware
+request_id = ContextVar('request_id', default=None)
+
+_REQUEST_ID = re.compile(r'[\w.:-]{1,64}')
+
+# LogRecord's own attributes; anything else on a record came in through `extra`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'event'}
+
+
+def new_request_id(supplied=None):
+    """ The caller's id when it looks like one (so ids follow a request across services), else a fresh one. """
+    if supplied and _REQUEST_ID.fullmatch(supplied):
+        return supplied
+    return uuid.uuid4().hex
+
+
+# --- Filters (run on the calling thread, before the queue) ---
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        # django.request logs a 4xx/5xx after the middleware has returned, but passes the request along
+        record.request_id = request_id.get() or getattr(getattr(record, 'request', None), 'request_id', None)
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """
+    Keeps only a fraction of high-volume records: `rates` maps an event
+    (extra={'event': ...}) or a logger name to the fraction kept. Warnings
+    and errors always pass. Kept records carry their rate so counts
+    can be scaled back up.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(getattr(record, 'event', None), self.rates.get(record.name))
+        if rate is None or rate >= 1:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+# --- Formatting (runs on the listener thread) ---
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per line: time, level, logger, message, request_id, event, extras, exception. """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry["request_id"] = record.request_id
+        if getattr(record, 'event', None):
+            entry["event"] = record.event
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+# --- Queue handler ---
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue without ever waiting; a QueueListener
+    thread, started on first use in each process (so it survives forking
+    servers), writes them to `stream` as JSON.
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        super().__init__(queue.Queue(maxsize))
+        self.stream = stream
+        self.dropped = 0
+        self._unreported = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._pid = None
+
+    def prepare(self, record):
+        """ Flattens the record on the calling thread: message merged, traceback rendered, nothing unpicklable kept. """
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._count_drop()
+            return
+        if self._unreported:
+            self._report_drops()
+
+    def _count_drop(self):
+        with self._lock:
+            self.dropped += 1
+            self._unreported += 1
+        # Imported here: settings.LOGGING loads this module before the apps are ready
+        from core.instrumentation import registry
+        registry.inc('log_records_dropped_total')
+
+    def _report_drops(self):
+        with self._lock:
+            count, self._unreported = self._unreported, 0
+        if not count:
+            return
+        record = logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': f"Dropped {count} log records: the log queue was full",
+            'event': 'log_records_dropped', 'dropped': count, 'request_id': request_id.get(),
+        })
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._unreported += count
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # Forked: the parent's listener thread doesn't exist here, and its queue may be mid-use
+                self.queue = queue.Queue(self.queue.maxsize)
+            writer = logging.StreamHandler(self.stream or sys.stdout)
+            writer.setFormatter(JsonFormatter())
+            self._listener = QueueListener(self.queue, writer)
+            self._listener.start()
+            self._pid = pid
+            atexit.register(self._stop, self._listener)
+
+    @staticmethod
+    def _stop(listener):
+        """ Writes out what is still queued at exit. """
+        try:
+            listener.stop()
+        except queue.Full:
+            pass
@@ -0,0 +1,229 @@
+# backend/core/mail.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection as db_connection, transaction
+from django.db.models import F
+from django.template.loader import get_template
+from django.utils import timezone
+
+from core.instrumentation import timed_mail_enqueue
+from core.models import OutboundEmail
+
+# --- 1. Enqueue side (runs inside the request) ---
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    EMAIL_BACKEND used by the web process.
+    Instead of talking SMTP it writes each message into the OutboundEmail table,
+    so send_mail(), msg.send() and AllAuth's reset mails all return immediately.
+    """
+    def send_messages(self, email_messages):
+        rows = []
+        for message in email_messages:
+            rows.extend(_rows_for_message(message))
+        if rows:
+            with timed_mail_enqueue(len(rows)):
+                OutboundEmail.objects.bulk_create(rows)
+        return len(email_messages)
+
+
+async def aqueue_messages(email_messages):
+    """
+    Async hand-off for async views: the same outbox rows as
+    QueuedEmailBackend, written with the async ORM.
+    """
+    rows = [row for message in email_messages for row in _rows_for_message(message)]
+    if rows:
+        with timed_mail_enqueue(len(rows)):
+            await OutboundEmail.objects.abulk_create(rows)
+    return len(email_messages)
+
+
+def _rows_for_message(message):
+    """
+    Flattens an EmailMessage into one outbox row per recipient.
+    Attachments are not queued (none of our mails carry any).
+    """
+    body, html_body = message.body, ''
+    if getattr(message, 'content_subtype', 'plain') == 'html':
+        html_body = message.body
+    for content, mimetype in getattr(message, 'alternatives', []):
+        if mimetype == 'text/html':
+            html_body = content
+
+    return [
+        OutboundEmail(
+            to_email=recipient,
+            from_email=message.from_email or '',
+            subject=message.subject,
+            body=body,
+            html_body=html_body,
+            headers=dict(message.extra_headers or {}),
+        )
+        for recipient in message.recipients()
+    ]
+
+
+# --- 2. Delivery side (runs in the 'process_mail_queue' worker) ---
+
+def get_delivery_connection():
+    """ The real backend (SMTP in production, locmem/file in tests). """
+    backend = getattr(
+        settings, 'MAIL_QUEUE_DELIVERY_BACKEND',
+        'django.core.mail.backends.smtp.EmailBackend'
+    )
+    return get_connection(backend)
+
+
+def _build_message(row, connection):
+    msg = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email or None,
+        to=[row.to_email],
+        headers=row.headers or None,
+        connection=connection,
+    )
+    if row.html_body:
+        msg.attach_alternative(row.html_body, "text/html")
+    return msg
+
+
+def retry_delay(attempts):
+    """ Retry policy: attempt n waits BACKOFF * 2^(n-1) seconds (60s, 2m, 4m, 8m ...). """
+    return timedelta(seconds=getattr(settings, 'MAIL_QUEUE_BACKOFF_SECONDS', 60) * 2 ** (attempts - 1))
+
+
+def claim_queued_mail(batch_size):
+    """
+    Takes up to `batch_size` due rows for this worker: in one short
+    transaction they are locked (SKIP LOCKED where supported, so workers
+    don't wait on each other), counted as attempted and pushed out of the
+    due window for MAIL_QUEUE_CLAIM_SECONDS. No lock is held while sending.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(
+            status__in=['PENDING', 'RETRYING'], next_attempt_at__lte=now
+        ).order_by('next_attempt_at')
+        if db_connection.features.has_select_for_update:
+            due = due.select_for_update(
+                skip_locked=db_connection.features.has_select_for_update_skip_locked
+            )
+        batch = list(due[:batch_size])
+        if batch:
+            OutboundEmail.objects.filter(pk__in=[row.pk for row in batch]).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=getattr(settings, 'MAIL_QUEUE_CLAIM_SECONDS', 300)),
+            )
+    for row in batch:
+        row.attempts += 1
+    return batch
+
+
+def send_queued_mail(connection, batch_size=50):
+    """
+    Delivers one batch of due messages over an already-open connection.
+    Each row is marked as soon as its own send returns, so a crash mid-batch
+    resends at most the message in flight once the claim runs out.
+    Returns (sent, failed).
+    """
+    batch = claim_queued_mail(batch_size)
+    if not batch:
+        return 0, 0
+
+    try:
+        connection.open()
+    except Exception:
+        # Nothing was tried: hand the batch straight back
+        OutboundEmail.objects.filter(pk__in=[row.pk for row in batch]).update(
+            attempts=F('attempts') - 1, next_attempt_at=timezone.now()
+        )
+        raise
+
+    max_attempts = getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 5)
+    sent = failed = 0
+    for row in batch:
+        try:
+            connection.send_messages([_build_message(row, connection)])
+        except Exception as e:
+            failed += 1
+            if row.attempts >= max_attempts:
+                outcome = {'status': 'DEAD'}
+            else:
+                outcome = {'status': 'RETRYING', 'next_attempt_at': timezone.now() + retry_delay(row.attempts)}
+            OutboundEmail.objects.filter(pk=row.pk).update(last_error=str(e)[:1000], **outcome)
+            # A dropped SMTP session poisons the rest of the batch, so reconnect.
+            # If that fails too, each remaining send fails and is retried later.
+            connection.close()
+            try:
+                connection.open()
+            except Exception:
+                pass
+        else:
+            sent += 1
+            OutboundEmail.objects.filter(pk=row.pk).update(status='SENT', sent_at=timezone.now(), last_error='')
+
+    return sent, failed
+
+
+# --- 3. Message builders ---
+#
+# Bodies live in core/templates/emails/. Templates are fetched through
+# get_template(), i.e. Django's cached loader: each file is read and compiled
+# once per process, and a render is just a walk over the compiled nodes.
+
+INVITE_LOGIN_URL = "http://localhost:5173/login"
+
+
+def render_email(template_prefix, context):
+    """ Renders <prefix>.txt and <prefix>.html; returns (plain_text, html). """
+    return (
+        get_template(f"{template_prefix}.txt").render(context),
+        get_template(f"{template_prefix}.html").render(context),
+    )
+
+
+def build_invite_email(to_email, role, org_name, sender_name):
+    """
+    The styled staff invitation. Returned unsent so callers can either
+    .send() it or hand a whole list to one send_messages() call.
+    """
+    return build_invite_emails([(to_email, role)], org_name, sender_name)[0]
+
+
+def build_invite_emails(recipients, org_name, sender_name):
+    """
+    One invitation per (email, role) pair, built in a single pass.
+    The body only depends on the role, so each distinct role is rendered
+    once and shared: 10k invites cost a handful of renders.
+    """
+    subject = f"You're invited to join {org_name} on EduSphere"
+    bodies = {}
+    messages = []
+    for to_email, role in recipients:
+        if role not in bodies:
+            bodies[role] = render_email('emails/staff_invite', {
+                'sender_name': sender_name,
+                'org_name': org_name,
+                'role': role,
+                'login_url': INVITE_LOGIN_URL,
+            })
+        plain_message, html_message = bodies[role]
+        msg = EmailMultiAlternatives(subject, plain_message, settings.EMAIL_HOST_USER, [to_email])
+        msg.attach_alternative(html_message, "text/html")
+        messages.append(msg)
+    return messages
+
+
+def build_welcome_email(user):
+    """ Sent after signup (see core/signals.py). """
+    msg = EmailMultiAlternatives(
+        "Welcome to EduSphere! 🚀", "Welcome to EduSphere!", settings.EMAIL_HOST_USER, [user.email]
+    )
+    msg.attach_alternative(get_template('emails/welcome_email.html').render({'user': user}), "text/html")
+    return msg
@@ -0,0 +1,300 @@
+import importlib.util
+import json
+import platform
+import random
+import subprocess
+import time
+from collections import defaultdict
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.authentication import TenantRefreshToken
+from core.benchmark import (
+    DEFAULT_PASSWORD, DEFAULT_PREFIX, admin_email, asgi_server, live_server, run_http_load, summarize,
+)
+from core.models import Organization, UserProfile
+from core.ratelimit import buckets
+from core.search import search_words
+
+# Read-only endpoints: run by both the test client and the HTTP load generator
+READ_SCENARIOS = {
+    'staff_list': lambda t: "/api/staff/?page_size=25",
+    'staff_list_filtered': lambda t: "/api/staff/?role=STAFF&status=active&page_size=25",
+    'staff_list_department': lambda t: f"/api/staff/?department={t['department']}&page_size=25",
+    'staff_search': lambda t: f"/api/staff/search/?q={t['search']}",
+    'org_stats': lambda t: "/api/org/stats/",
+    'departments': lambda t: "/api/departments/",
+    'current_user': lambda t: "/api/user/me/",
+}
+# The async views' counterparts of the above; HTTP load only, against both servers
+ASYNC_READ_SCENARIOS = {
+    'async_staff_list': lambda t: "/api/async/staff/?page_size=25",
+    'async_current_user': lambda t: "/api/async/user/me/",
+}
+HTTP_SCENARIOS = {**READ_SCENARIOS, **ASYNC_READ_SCENARIOS}
+# Writes (and the password flow) run through the test client only, each rolled back
+WRITE_SCENARIOS = ('login', 'token_refresh', 'staff_invite')
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the API against data from 'seed_synthetic_data': every scenario through "
+        "DRF's test client, then the read scenarios (sync and async views) under concurrent load "
+        "over HTTP, served by WSGI, ASGI (uvicorn) or both side by side. "
+        "Reports p50/p95/p99 latency, throughput and queries per request, optionally as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default=DEFAULT_PREFIX)
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--tenants', type=int, default=20, help="Organizations sampled as request senders")
+        parser.add_argument('--iterations', type=int, default=200, help="Test-client requests per scenario")
+        parser.add_argument('--login-iterations', type=int, default=20, help="Logins are slow on purpose (PBKDF2)")
+        parser.add_argument('--http-requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--mode', choices=('client', 'http', 'both'), default='both')
+        parser.add_argument('--server', choices=('wsgi', 'asgi', 'both'), default='wsgi',
+                            help="What serves the HTTP load; 'asgi' and 'both' need uvicorn installed")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Write the results to this JSON file")
+        parser.add_argument('--compare', help="A previous --output file to compare against")
+
+    def handle(self, *args, **options):
+        servers = ['wsgi', 'asgi'] if options['server'] == 'both' else [options['server']]
+        if options['mode'] != 'client' and 'asgi' in servers and importlib.util.find_spec('uvicorn') is None:
+            raise CommandError("The ASGI server needs uvicorn: pip install uvicorn")
+        rng = random.Random(options['seed'])
+        self.password = options['password']
+        tenants = self.load_tenants(rng, options)
+        results = {"meta": self.meta(options)}
+
+        # The test client's 'testserver' and the live server's address
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver', '127.0.0.1']):
+            if options['mode'] in ('client', 'both'):
+                self.stdout.write(self.style.MIGRATE_HEADING("Test client (sequential)"))
+                results["client"] = self.run_client(rng, tenants, options)
+            if options['mode'] in ('http', 'both'):
+                plan = self.http_plan(rng, tenants, options)
+                for server in servers:
+                    self.stdout.write(self.style.MIGRATE_HEADING(
+                        f"HTTP load, {server.upper()} ({options['http_requests']} requests, "
+                        f"concurrency {options['concurrency']})"
+                    ))
+                    # "http" is the WSGI run, as in results from before ASGI was measured
+                    results["http" if server == 'wsgi' else "asgi"] = self.run_http(plan, server, options)
+                if len(servers) == 2:
+                    self.side_by_side(results["http"], results["asgi"])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), results)
+
+    # --- Setup ---
+
+    def load_tenants(self, rng, options):
+        """ Sampled organizations: admin, a fresh token pair and a few request parameters each. """
+        prefix = options['prefix']
+        count = Organization.objects.filter(name__startswith=f"{prefix} org ").count()
+        if not count:
+            raise CommandError(f"No '{prefix}' data; run 'seed_synthetic_data' first.")
+        numbers = rng.sample(range(1, count + 1), min(options['tenants'], count))
+        admins = {
+            user.email: user
+            for user in User.objects.select_related('profile').filter(
+                username__in=[admin_email(prefix, n) for n in numbers]
+            )
+        }
+
+        tenants = []
+        for number in numbers:
+            admin = admins.get(admin_email(prefix, number))
+            if admin is None:
+                continue
+            org_id = admin.profile.organization_id
+            sample = list(
+                UserProfile.objects.filter(organization_id=org_id)
+                .exclude(department_id=None)
+                .values_list('department_id', 'user__last_name')[:20]
+            )
+            department_id, last_name = rng.choice(sample) if sample else ('none', admin.last_name)
+            words = search_words(last_name)
+            refresh = TenantRefreshToken.for_user(admin)
+            tenants.append({
+                'number': number, 'admin': admin, 'department': department_id,
+                'search': words[0][:3] if words else 'a',
+                'access': str(refresh.access_token), 'refresh': str(refresh),
+            })
+        return tenants
+
+    def meta(self, options):
+        def git(*args):
+            try:
+                return subprocess.run(['git', *args], capture_output=True, text=True, check=True,
+                                      cwd=settings.BASE_DIR).stdout.strip()
+            except (OSError, subprocess.CalledProcessError):
+                return None
+
+        prefix = options['prefix']
+        return {
+            "commit": git('rev-parse', '--short', 'HEAD'),
+            "dirty": bool(git('status', '--porcelain', '--untracked-files=no')),
+            "started_at": timezone.now().isoformat(timespec='seconds'),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "dataset": {
+                "prefix": prefix,
+                "organizations": Organization.objects.filter(name__startswith=f"{prefix} org ").count(),
+                "members": UserProfile.objects.filter(organization__name__startswith=f"{prefix} org ").count(),
+            },
+            "options": {key: options[key] for key in (
+                'tenants', 'iterations', 'login_iterations', 'http_requests', 'concurrency', 'warmup', 'mode',
+                'server', 'seed',
+            )},
+        }
+
+    # --- Test client ---
+
+    def run_client(self, rng, tenants, options):
+        client = APIClient()
+        results = {}
+        for label in [*READ_SCENARIOS, *WRITE_SCENARIOS]:
+            iterations = options['login_iterations'] if label == 'login' else options['iterations']
+            latencies, queries, errors = [], [], 0
+            for i in range(options['warmup'] + iterations):
+                tenant = rng.choice(tenants)
+                start = time.perf_counter()
+                response = self.client_request(client, label, tenant, i)
+                elapsed = time.perf_counter() - start
+                if i < options['warmup']:
+                    continue
+                latencies.append(elapsed)
+                queries.append(response.wsgi_request.metrics.queries)
+                if response.status_code >= 400:
+                    errors += 1
+            results[label] = summarize(latencies, errors, queries)
+            self.report(label, results[label])
+        return results
+
+    def client_request(self, client, label, tenant, i):
+        if label in READ_SCENARIOS:
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {tenant['access']}")
+            return client.get(READ_SCENARIOS[label](tenant))
+
+        # Rolled back so every run starts from the same data
+        with transaction.atomic():
+            if label == 'login':
+                # Measure a login, not the brute-force throttle
+                buckets.clear()
+                client.credentials()
+                response = client.post('/api/auth/login/', {
+                    'email': tenant['admin'].email, 'password': self.password,
+                }, format='json')
+            elif label == 'token_refresh':
+                client.credentials()
+                response = client.post('/api/auth/token/refresh/', {'refresh': tenant['refresh']}, format='json')
+            else:
+                client.credentials(HTTP_AUTHORIZATION=f"Bearer {tenant['access']}")
+                response = client.post('/api/staff/', {
+                    'email': f"bench-invite-{i}@org{tenant['number']}.invite.example", 'role': 'STAFF',
+                }, format='json')
+            transaction.set_rollback(True)
+        return response
+
+    # --- HTTP ---
+
+    def http_plan(self, rng, tenants, options):
+        """ The same request sequence is sent to every server, so their figures compare. """
+        plan = []
+        for _ in range(options['http_requests']):
+            label, path = rng.choice(list(HTTP_SCENARIOS.items()))
+            tenant = rng.choice(tenants)
+            plan.append((label, 'GET', path(tenant), {'Authorization': f"Bearer {tenant['access']}"}))
+        return plan
+
+    def run_http(self, plan, server, options):
+        try:
+            with (live_server() if server == 'wsgi' else asgi_server()) as address:
+                # Warm each worker's caches and connections outside the measurement
+                run_http_load(address, plan[:options['warmup'] * len(HTTP_SCENARIOS)], options['concurrency'])
+                measured, wall = run_http_load(address, plan, options['concurrency'])
+        except RuntimeError as e:
+            raise CommandError(f"{server.upper()} server: {e}")
+
+        by_label = defaultdict(list)
+        for label, elapsed, status, queries in measured:
+            by_label[label].append((elapsed, status, queries))
+
+        def figures(rows, elapsed=None):
+            return summarize(
+                [row[0] for row in rows],
+                sum(1 for row in rows if row[1] is None or row[1] >= 400),
+                [row[2] for row in rows],
+                elapsed,
+            )
+
+        results = {"wall_seconds": round(wall, 3), "overall": figures(
+            [row[1:] for row in measured], wall
+        ), "scenarios": {}}
+        self.report('overall', results["overall"])
+        for label in HTTP_SCENARIOS:
+            if by_label[label]:
+                results["scenarios"][label] = figures(by_label[label])
+                self.report(label, results["scenarios"][label])
+        return results
+
+    # --- Output ---
+
+    def report(self, label, figures):
+        self.stdout.write(
+            f"{label:<24} n={figures['requests']:<6} p50 {figures['p50_ms']:>8.2f}ms  "
+            f"p95 {figures['p95_ms']:>8.2f}ms  p99 {figures['p99_ms']:>8.2f}ms  "
+            f"{figures['throughput_rps'] or 0:>8.1f} req/s  "
+            f"{figures['queries_per_request'] if figures['queries_per_request'] is not None else '-'} q/req"
+            + (self.style.ERROR(f"  {figures['errors']} errors") if figures['errors'] else "")
+        )
+
+    def side_by_side(self, wsgi, asgi):
+        self.stdout.write(self.style.MIGRATE_HEADING("WSGI vs ASGI"))
+        rows = [('overall', wsgi['overall'], asgi['overall'])] + [
+            (label, wsgi['scenarios'].get(label), asgi['scenarios'].get(label)) for label in HTTP_SCENARIOS
+        ]
+        self.stdout.write(f"{'':<24} {'p50 ms':>17}  {'p95 ms':>17}  {'req/s':>15}")
+        for label, old, new in rows:
+            if old and new:
+                self.stdout.write(
+                    f"{label:<24} {old['p50_ms']:>8.2f}{new['p50_ms']:>9.2f}  "
+                    f"{old['p95_ms']:>8.2f}{new['p95_ms']:>9.2f}  "
+                    f"{old['throughput_rps'] or 0:>7.1f}{new['throughput_rps'] or 0:>8.1f}"
+                )
+        self.stdout.write(f"{'':<24} (WSGI, then ASGI; a scenario's req/s is per connection, overall is the whole run)")
+
+    def compare(self, before, after):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Compared with {before['meta'].get('commit')} ({before['meta'].get('started_at')})"
+        ))
+        pairs = [(f"client {label}", before.get("client", {}).get(label), figures)
+                 for label, figures in after.get("client", {}).items()]
+        for run in ("http", "asgi"):
+            pairs += [(f"{run} {label}", before.get(run, {}).get("scenarios", {}).get(label), figures)
+                      for label, figures in after.get(run, {}).get("scenarios", {}).items()]
+        for label, old, new in pairs:
+            if not old or not old['p95_ms']:
+                continue
+            change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            line = (f"{label:<32} p95 {old['p95_ms']:>8.2f} -> {new['p95_ms']:>8.2f}ms ({change:+.0f}%)  "
+                    f"q/req {old['queries_per_request']} -> {new['queries_per_request']}")
+            worse = change > 20 or (new['queries_per_request'] or 0) > (old['queries_per_request'] or 0)
+            self.stdout.write(self.style.WARNING(line) if worse else line)
@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from core.mail import INVITE_LOGIN_URL, build_invite_email, build_invite_emails
+
+ROLES = ('STAFF', 'STUDENT', 'ORG_ADMIN')
+
+
+class Command(BaseCommand):
+    help = "Benchmarks building N personalised staff invitations (nothing is sent)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        recipients = [(f"user{i}@example.com", ROLES[i % len(ROLES)]) for i in range(count)]
+        org_name, sender_name = "Benchmark Academy", "Bench Admin"
+
+        def render_each():
+            # A full template lookup + render of both parts for every recipient
+            messages = []
+            for to_email, role in recipients:
+                context = {'sender_name': sender_name, 'org_name': org_name,
+                           'role': role, 'login_url': INVITE_LOGIN_URL}
+                msg = EmailMultiAlternatives(
+                    f"You're invited to join {org_name} on EduSphere",
+                    render_to_string('emails/staff_invite.txt', context),
+                    settings.EMAIL_HOST_USER, [to_email],
+                )
+                msg.attach_alternative(render_to_string('emails/staff_invite.html', context), "text/html")
+                messages.append(msg)
+            return messages
+
+        def build_each():
+            return [build_invite_email(to_email, role, org_name, sender_name) for to_email, role in recipients]
+
+        def build_batch():
+            return build_invite_emails(recipients, org_name, sender_name)
+
+        # Warm the template cache so every strategy sees compiled templates
+        build_batch()
+
+        results = {}
+        for label, fn in [
+            ('render_to_string per invite', render_each),
+            ('build_invite_email per invite', build_each),
+            ('build_invite_emails batch', build_batch),
+        ]:
+            start = time.perf_counter()
+            messages = fn()
+            results[label] = elapsed = time.perf_counter() - start
+            assert len(messages) == count
+            self.stdout.write(f"{label:<32} {elapsed:7.3f}s  {count / elapsed:10.0f} invites/s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"batch is {results['render_to_string per invite'] / results['build_invite_emails batch']:.1f}x "
+            f"faster than rendering per invite"
+        ))
@@ -0,0 +1,76 @@
+import json
+import timeit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from core.authentication import ClaimsTenantContext, TenantContext
+from core.models import UserProfile
+from core.permissions import ADMIN_ROLES, PERMISSIONS, compile_permissions
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark: compiled permission masks vs. walking the permissions JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100_000, help="Simulated requests per strategy")
+        parser.add_argument('--checks', type=int, default=10, help="Permission checks per request")
+
+    def handle(self, *args, **options):
+        requests, checks = options['requests'], options['checks']
+        document = {name: bool(i % 2) for i, name in enumerate(PERMISSIONS)}
+        raw = json.dumps(document)
+        names = [PERMISSIONS[i % len(PERMISSIONS)] for i in range(checks)]
+
+        # No database needed: the profile is wired to its user in memory
+        user = User(id=1, username='bench')
+        profile = UserProfile(user=user, role='STAFF', permissions=document, authz_version=1)
+        claims = {'user_id': 1, 'org_id': 1, 'role': 'STAFF', 'authz_ver': 1,
+                  'perms': compile_permissions(document)}
+
+        def walk(profile, perms, name):
+            # What every consumer has to repeat without the compiled mask
+            if profile.role in ADMIN_ROLES:
+                return True
+            return isinstance(perms, dict) and perms.get(name) is True
+
+        def parse_and_walk():
+            # ... starting from the stored JSON text
+            perms = json.loads(raw)
+            return [walk(profile, perms, name) for name in names]
+
+        def dict_walk():
+            return [walk(profile, profile.permissions, name) for name in names]
+
+        # Auth builds the tenant context for every request anyway; only the
+        # permission work (lazy compile / cache lookup, then the checks) is timed
+        def contexts(factory):
+            pool = iter([factory() for _ in range(requests)])
+            return lambda: [tenant.has_perm(name) for tenant in (next(pool),) for name in names]
+
+        compiled_context = lambda: contexts(lambda: TenantContext(user))
+        claims_context = lambda: contexts(lambda: ClaimsTenantContext(claims))
+
+        strategies = [
+            ('parse JSON + dict walk', parse_and_walk),
+            ('dict walk', dict_walk),
+            ('compiled mask (DB auth)', compiled_context),
+            ('token claim mask', claims_context),
+        ]
+        self.stdout.write(f"{requests} requests x {checks} checks")
+        results = {}
+        for label, fn in strategies:
+            # A fresh context pool per run; plain strategies are returned as-is
+            runs = [fn() if fn in (compiled_context, claims_context) else fn for _ in range(3)]
+            seconds = min(timeit.timeit(run, number=requests) for run in runs)
+            results[label] = seconds
+            self.stdout.write(
+                f"{label:<26} {seconds / requests * 1e6:8.2f} us/request"
+                f" {seconds / (requests * checks) * 1e9:8.1f} ns/check"
+            )
+
+        baseline = results['dict walk']
+        self.stdout.write(self.style.SUCCESS(
+            f"vs dict walk: compiled {baseline / results['compiled mask (DB auth)']:.2f}x, "
+            f"token claims {baseline / results['token claim mask']:.2f}x"
+        ))
@@ -0,0 +1,81 @@
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.export import EXPORT_FORMATS, roster_rows
+from core.models import Organization, UserProfile
+from core.serializers import StaffMemberSerializer
+from core.staff import staff_queryset
+
+SEED_BATCH = 5000
+
+
+def current_rss_mb():
+    # Linux only; elsewhere the tracemalloc figures still apply
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * 4096 / 2**20
+    except OSError:
+        return 0.0
+
+
+class Command(BaseCommand):
+    help = ("Seeds a throwaway organization (rolled back afterwards) and measures time and peak "
+            "memory of the streaming roster export, optionally against serializing the whole list.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200_000)
+        parser.add_argument('--baseline', action='store_true',
+                            help="Also time StaffMemberSerializer over the whole roster, as the list view would.")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            org = self.seed(rows)
+            for export_type, (stream, _, _) in EXPORT_FORMATS.items():
+                self.measure(export_type, lambda: stream(roster_rows(UserProfile.objects.filter(organization=org), org.id)))
+            if options['baseline']:
+                self.measure('list + serializer', lambda: [
+                    str(StaffMemberSerializer(list(staff_queryset(org.id)), many=True).data)
+                ])
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        start = time.perf_counter()
+        org = Organization.objects.create(name="Export Benchmark")
+        for offset in range(0, rows, SEED_BATCH):
+            batch = range(offset, min(offset + SEED_BATCH, rows))
+            User.objects.bulk_create([
+                User(username=f"export-bench-{i}", email=f"member{i}@bench.example",
+                     first_name=f"First{i}", last_name=f"Last{i}", password='!')
+                for i in batch
+            ])
+            user_ids = User.objects.filter(
+                username__in=[f"export-bench-{i}" for i in batch]
+            ).values_list('id', flat=True)
+            UserProfile.objects.bulk_create([
+                UserProfile(user_id=uid, organization=org, role='STAFF', designation='Teacher',
+                            permissions={'can_upload_data': True})
+                for uid in user_ids
+            ])
+        self.stdout.write(f"Seeded {rows} members in {time.perf_counter() - start:.1f}s")
+        return org
+
+    def measure(self, label, make_stream):
+        rss_before = peak_rss = current_rss_mb()
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = 0
+        for chunk in make_stream():
+            size += len(chunk)
+            peak_rss = max(peak_rss, current_rss_mb())
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"{label:<18} {elapsed:6.1f}s  {size / 2**20:7.1f} MB out  "
+            f"peak Python heap {peak / 2**20:6.1f} MB  RSS growth {peak_rss - rss_before:6.1f} MB"
+        )
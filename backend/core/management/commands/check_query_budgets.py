@@ -0,0 +1,78 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from core.authentication import TenantRefreshToken
+from core.instrumentation import assert_within_query_budget
+from core.models import Organization, UserProfile
+from core.sharding import DIRECTORY
+from core.views import CurrentUserView, LocationSearchView, SetupOrganizationView, StaffManagementView
+
+# Enough members that a per-row query would blow the roster's budget
+ROSTER_SIZE = 30
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Calls the hot views against throwaway data (rolled back afterwards) "
+        "and fails if any runs more queries than its declared query_budget."
+    )
+
+    def handle(self, *args, **options):
+        failures = []
+        # Cache entries left behind are keyed by ids the rollback burns (MySQL doesn't reuse them)
+        # Budgets are for one database: with shards configured, a new organization
+        # placed elsewhere also pays once for moving its admin's profile there
+        try:
+            with transaction.atomic(), override_settings(NEW_ORG_SHARD=DIRECTORY):
+                self.check_views(failures)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f"{len(failures)} views are over their query budget.")
+
+    def check_views(self, failures):
+        factory = APIRequestFactory()
+        admin = self.make_user('budget-admin@example.invalid')
+        newcomer = self.make_user('budget-newcomer@example.invalid')
+
+        org = Organization.objects.create(name="Query Budget Check")
+        UserProfile.objects.filter(user=admin).update(organization=org, role='ORG_ADMIN', is_setup_complete=True)
+        for i in range(ROSTER_SIZE):
+            member = self.make_user(f'budget-member{i}@example.invalid')
+            UserProfile.objects.filter(user=member).update(organization=org, role='STAFF', is_setup_complete=True)
+
+        for label, view_class, method, user, data in [
+            ('SetupOrganizationView POST', SetupOrganizationView, 'POST', newcomer, {'name': "Budget Check 2"}),
+            ('StaffManagementView GET', StaffManagementView, 'GET', admin, None),
+            ('StaffManagementView POST', StaffManagementView, 'POST', admin, {'email': 'budget-invite@example.invalid'}),
+            ('CurrentUserView GET', CurrentUserView, 'GET', admin, None),
+            ('LocationSearchView GET', LocationSearchView, 'GET', newcomer, {'q': 'pune'}),
+        ]:
+            # Minting the token reads the profile too; that isn't the view's cost
+            token = TenantRefreshToken.for_user(user).access_token
+            request = getattr(factory, method.lower())('/', data, format='json', HTTP_AUTHORIZATION=f"Bearer {token}")
+            try:
+                with assert_within_query_budget(view_class, method) as metrics:
+                    response = view_class.as_view()(request)
+            except AssertionError as e:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"{label}: {e}"))
+                continue
+            if response.status_code >= 400:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"{label}: HTTP {response.status_code} {response.data}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{label}: {metrics.queries} queries, ok"))
+
+    def make_user(self, email):
+        # The profile itself comes from the post_save signal
+        return User.objects.create_user(username=email, email=email)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.explain import full_scans, hot_queries
+
+
+class Command(BaseCommand):
+    help = "EXPLAINs the hot tenant-scoped queries and fails if any falls back to a full table scan."
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, queryset in hot_queries().items():
+            scanned = full_scans(queryset)
+            if scanned:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: full scan on {', '.join(scanned)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries are not using an index.")
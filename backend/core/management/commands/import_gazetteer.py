@@ -0,0 +1,78 @@
+import csv
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.gazetteer import normalize, reload_gazetteer
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the location search gazetteer (core/gazetteer.py) from a GeoNames dump, e.g. "
+        "cities15000.txt from https://download.geonames.org/export/dump/. Pass admin1CodesASCII.txt "
+        "and countryInfo.txt from the same place to get state and country names instead of codes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('cities', help="GeoNames cities file (tab-separated, 19 columns)")
+        parser.add_argument('--admin1', help="admin1CodesASCII.txt")
+        parser.add_argument('--countries', help="countryInfo.txt")
+        parser.add_argument('--country', action='append', default=[], help="Only this ISO country code (repeatable)")
+        parser.add_argument('--min-population', type=int, default=0)
+        parser.add_argument('--alternate-names', action='store_true',
+                            help="Also index GeoNames' alternate names (in every script; makes the file much bigger)")
+        parser.add_argument('--output', default=settings.GAZETTEER_PATH)
+
+    def handle(self, *args, **options):
+        regions = self.read_names(options['admin1'], key=0, name=1)
+        countries = self.read_names(options['countries'], key=0, name=4)
+        only = {code.upper() for code in options['country']}
+
+        rows = []
+        try:
+            with open(options['cities'], encoding='utf-8', newline='') as f:
+                for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                    if len(row) < 15:
+                        continue
+                    country_code, population = row[8], int(row[14] or 0)
+                    if (only and country_code not in only) or population < options['min_population']:
+                        continue
+                    alternates = {row[2]}
+                    if options['alternate_names']:
+                        alternates.update(row[3].split(','))
+                    name_key = normalize(row[1])
+                    rows.append((
+                        row[1],
+                        regions.get(f"{country_code}.{row[10]}", ''),
+                        countries.get(country_code, country_code),
+                        population,
+                        ','.join(sorted(name for name in alternates if name and normalize(name) != name_key)),
+                    ))
+        except OSError as e:
+            raise CommandError(e)
+
+        rows.sort(key=lambda row: -row[3])
+        os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            f.write(f"# Built by 'import_gazetteer' from {os.path.basename(options['cities'])}\n")
+            f.write("# name\tregion\tcountry\tpopulation\talternate names\n")
+            for row in rows:
+                f.write('\t'.join(str(value).replace('\t', ' ') for value in row) + '\n')
+        # Only this process; running servers pick the file up when they restart
+        reload_gazetteer()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(rows)} places to {options['output']}."))
+
+    def read_names(self, path, key, name):
+        """ code -> name from a GeoNames lookup file, or {} without one. """
+        if not path:
+            return {}
+        names = {}
+        try:
+            with open(path, encoding='utf-8', newline='') as f:
+                for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                    if row and not row[0].startswith('#') and len(row) > max(key, name):
+                        names[row[key]] = row[name]
+        except OSError as e:
+            raise CommandError(e)
+        return names
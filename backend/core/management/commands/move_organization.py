@@ -0,0 +1,146 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from core.cache import invalidate_me
+from core.departments import config_cache_key
+from core.models import Department, Organization, ShardAssignment, ShardedMember, StaffTombstone, UserProfile
+from core.search import reindex_members
+from core.sharding import DIRECTORY, forget_shard, mirror_users, use_shard
+from core.staff import _cascade_delete
+from core.stats import recompute_organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves an organization to another shard (see core/sharding.py): its writes are refused "
+        "while its rows are copied, then the directory points at the new shard and the old rows "
+        "are deleted. Department and profile ids change. --show lists the shards' sizes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('org_id', type=int, nargs='?')
+        parser.add_argument('target', nargs='?', help="Shard alias to move it to")
+        parser.add_argument('--show', action='store_true', help="Print organizations and members per shard")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--settle', type=float, default=5.0,
+                            help="Seconds to let in-flight requests finish once writes are refused")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['show']:
+            return self.show()
+        org_id, target = options['org_id'], options['target']
+        if org_id is None or target is None:
+            raise CommandError("Give an organization id and a target shard, or --show.")
+        if target not in settings.TENANT_SHARDS:
+            raise CommandError(f"Unknown shard '{target}'; configured: {', '.join(settings.TENANT_SHARDS)}.")
+
+        assignment = ShardAssignment.objects.using(DIRECTORY).filter(pk=org_id).first()
+        source = assignment.alias if assignment else DIRECTORY
+        if source == target:
+            raise CommandError(f"Organization {org_id} is already on '{target}'.")
+        if not Organization.objects.using(source).filter(pk=org_id).exists():
+            raise CommandError(f"Organization {org_id} not found on '{source}'.")
+
+        user_ids = list(
+            UserProfile.objects.using(source).filter(organization_id=org_id)
+            .order_by('user_id').values_list('user_id', flat=True)
+        )
+        self.stdout.write(f"Organization {org_id}: {len(user_ids)} members, '{source}' -> '{target}'")
+        if options['dry_run']:
+            return
+
+        self.set_moving(org_id, source, True)
+        try:
+            # Requests that resolved the shard before the flag may still be writing
+            time.sleep(options['settle'])
+            with transaction.atomic(using=target):
+                self.copy(org_id, source, target, user_ids, options['batch_size'])
+            self.switch(org_id, target, user_ids)
+        except BaseException:
+            self.set_moving(org_id, source, False)
+            raise
+
+        self.delete_source(org_id, source, user_ids)
+        invalidate_me(*user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Moved organization {org_id} to '{target}'."))
+
+    # --- Steps ---
+
+    def set_moving(self, org_id, alias, moving):
+        ShardAssignment.objects.using(DIRECTORY).update_or_create(pk=org_id, defaults={'alias': alias, 'moving': moving})
+        forget_shard(org_id)
+
+    def copy(self, org_id, source, target, user_ids, batch_size):
+        """ Inserts the organization's rows on `target`; counters and search terms are rebuilt, not copied. """
+        mirror_users(target, user_ids)
+
+        org = Organization.objects.using(source).get(pk=org_id)
+        # Department ids change: make every process rebuild its department map
+        org.config_version += 1
+        Organization.objects.using(target).bulk_create([org])
+
+        # bulk_create skips every signal; ids are read back in insertion order
+        departments = list(Department.objects.using(source).filter(organization_id=org_id).order_by('id'))
+        old_ids = [department.pk for department in departments]
+        for department in departments:
+            department.pk = None
+        Department.objects.using(target).bulk_create(departments, batch_size=batch_size)
+        new_ids = Department.objects.using(target).filter(organization_id=org_id).order_by('id').values_list('id', flat=True)
+        department_ids = dict(zip(old_ids, new_ids))
+
+        profiles = UserProfile.objects.using(source).filter(organization_id=org_id).order_by('id')
+        batch = []
+        for profile in profiles.iterator(chunk_size=batch_size):
+            profile.pk = None
+            profile.department_id = department_ids.get(profile.department_id)
+            batch.append(profile)
+            if len(batch) >= batch_size:
+                UserProfile.objects.using(target).bulk_create(batch)
+                batch = []
+        UserProfile.objects.using(target).bulk_create(batch)
+
+        tombstones = list(StaffTombstone.objects.using(source).filter(organization_id=org_id))
+        for tombstone in tombstones:
+            tombstone.pk = None
+        StaffTombstone.objects.using(target).bulk_create(tombstones, batch_size=batch_size)
+
+        with use_shard(target):
+            recompute_organization(org_id)
+            reindex_members(user_ids)
+
+    def switch(self, org_id, target, user_ids):
+        with transaction.atomic(using=DIRECTORY):
+            ShardAssignment.objects.using(DIRECTORY).filter(pk=org_id).update(alias=target, moving=False)
+            # Members outside 'default' are listed so logins can find them
+            ShardedMember.objects.using(DIRECTORY).filter(organization_id=org_id).delete()
+            if target != DIRECTORY:
+                ShardedMember.objects.using(DIRECTORY).bulk_create([
+                    ShardedMember(user_id=user_id, organization_id=org_id) for user_id in user_ids
+                ], batch_size=1000)
+        forget_shard(org_id)
+        cache.delete(config_cache_key(org_id))
+
+    def delete_source(self, org_id, source, user_ids):
+        """ The old copy: set-based deletes, so no signal touches the (already moved) counters or tombstones. """
+        with transaction.atomic(using=source):
+            _cascade_delete(UserProfile, UserProfile.objects.using(source).filter(organization_id=org_id))
+            _cascade_delete(Organization, Organization.objects.using(source).filter(pk=org_id))
+            if source != DIRECTORY:
+                # The source shard's mirror of the members (the directory keeps the real rows)
+                _cascade_delete(User, User.objects.using(source).filter(id__in=user_ids))
+
+    def show(self):
+        organizations = Counter(dict(
+            ShardAssignment.objects.using(DIRECTORY).values('alias').annotate(n=Count('id')).values_list('alias', 'n').order_by()
+        ))
+        for alias in settings.TENANT_SHARDS:
+            members = UserProfile.objects.using(alias).filter(organization__isnull=False).count()
+            self.stdout.write(f"{alias:<16} {organizations[alias]:>8} organizations {members:>10} members")
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.mail import get_delivery_connection, send_queued_mail
+
+
+class Command(BaseCommand):
+    help = "Delivers queued OutboundEmail rows over a single reused SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep running and poll for new mail.")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to sleep when the queue is empty (with --loop).")
+
+    def handle(self, *args, **options):
+        connection = get_delivery_connection()
+        total_sent = total_failed = 0
+        try:
+            while True:
+                try:
+                    sent, failed = send_queued_mail(connection, options['batch_size'])
+                except Exception as e:
+                    # Relay is down: drop the session and try again after a pause
+                    self.stderr.write(f"Mail batch failed: {e}")
+                    connection.close()
+                    sent = failed = 0
+                    if not options['loop']:
+                        raise
+
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent}, failed {failed}")
+                    continue  # More may be waiting, don't sleep
+
+                if not options['loop']:
+                    break
+                # Idle: release the SMTP session instead of holding it open
+                connection.close()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Sent {total_sent}, failed {total_failed}."
+        ))
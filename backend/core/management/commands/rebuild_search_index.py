@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import UserProfile
+from core.search import reindex_members
+from core.sharding import use_shard
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the staff search index (StaffSearchTerm) from the roster."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', type=int, action='append', dest='orgs',
+                            help="Organization id to reindex (repeatable). Default: all.")
+
+    def handle(self, *args, **options):
+        total = 0
+        for alias in settings.TENANT_SHARDS:
+            with use_shard(alias):
+                members = UserProfile.objects.filter(organization__isnull=False)
+                if options['orgs']:
+                    members = members.filter(organization_id__in=options['orgs'])
+                user_ids = list(members.order_by('user_id').values_list('user_id', flat=True))
+                reindex_members(user_ids)
+            total += len(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Reindexed {total} members."))
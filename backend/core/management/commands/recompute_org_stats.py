@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.sharding import organization_ids, tenant_context
+from core.stats import recompute_organization
+
+
+class Command(BaseCommand):
+    help = "Recounts the dashboard counters (OrganizationCounter) from the roster and repairs any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', type=int, action='append', dest='orgs',
+                            help="Organization id to recompute (repeatable). Default: all.")
+
+    def handle(self, *args, **options):
+        org_ids = options['orgs'] or organization_ids()
+        checked = drifted = 0
+        for org_id in org_ids:
+            with tenant_context(org_id):
+                drift = recompute_organization(org_id)
+            checked += 1
+            if drift:
+                drifted += 1
+                details = ", ".join(
+                    f"{dimension}:{key or '-'} {stored}->{actual}"
+                    for (dimension, key), (stored, actual) in sorted(drift.items())
+                )
+                self.stdout.write(f"Org {org_id}: {details}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Checked {checked} organizations, repaired {drifted}."))
@@ -0,0 +1,178 @@
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.benchmark import DEFAULT_PASSWORD, DEFAULT_PREFIX, admin_email, org_domain, org_name
+from core.models import Department, Organization, UserProfile
+from core.search import reindex_members
+from core.sharding import (
+    DIRECTORY, allocate_organization_id, mirror_users, register_members, tenant_atomic, use_shard,
+)
+from core.stats import apply_deltas, count_member, member_status
+
+FIRST_NAMES = (
+    'Aarav', 'Aisha', 'Alex', 'Ananya', 'Ben', 'Carlos', 'Chen', 'Diya', 'Elena', 'Fatima', 'Grace', 'Hana',
+    'Ivan', 'Jonas', 'Joanna', 'Kabir', 'Lena', 'Liam', 'Maya', 'Mohammed', 'Nina', 'Omar', 'Priya', 'Rahul',
+    'Sara', 'Sofia', 'Tariq', 'Uma', 'Victor', 'Wei', 'Yusuf', 'Zara',
+)
+LAST_NAMES = (
+    'Ahmed', 'Banerjee', 'Brown', 'Costa', 'Das', 'Fischer', 'Garcia', 'Gupta', 'Hughes', 'Iyer', 'Jones',
+    'Kapoor', 'Khan', 'Kim', 'Lopez', 'Martin', 'Mehta', 'Nair', 'Novak', 'Okafor', 'Patel', 'Rossi', 'Sato',
+    'Sharma', 'Singh', 'Smith', 'Tanaka', 'Wang', 'Williams', 'Yadav',
+)
+DEPARTMENT_NAMES = (
+    'Accounts', 'Administration', 'Biology', 'Chemistry', 'Commerce', 'Computer Engineering', 'English',
+    'Examinations', 'History', 'Library', 'Mathematics', 'Physical Education', 'Physics', 'Transport',
+)
+DESIGNATIONS = ('Teacher', 'Senior Teacher', 'HOD', 'Lab Assistant', 'Clerk', 'Coordinator', 'Librarian', None)
+# Member roles by weight; every organization also gets one ORG_ADMIN
+ROLE_WEIGHTS = {'STAFF': 30, 'STUDENT': 68, 'ORG_ADMIN': 2}
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates synthetic organizations, departments and members with bulk inserts, "
+        "for benchmarking (see 'bench_api'). Deterministic for a given --seed. "
+        "Use a scratch database, e.g. DB_ENGINE=sqlite DB_NAME=/tmp/bench.sqlite3."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orgs', type=int, default=100)
+        parser.add_argument('--members', type=int, default=50000, help="Members across all organizations")
+        parser.add_argument('--departments', type=int, default=8, help="Departments per organization")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--prefix', default=DEFAULT_PREFIX, help="Tags the data so several sets can coexist")
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help="Password of every organization admin")
+        parser.add_argument('--skip-search-index', action='store_true')
+        parser.add_argument('--shard', default=DIRECTORY, help="Database alias the organizations are placed on")
+
+    def handle(self, *args, **options):
+        if options['shard'] not in settings.TENANT_SHARDS:
+            raise CommandError(f"Unknown shard '{options['shard']}'; see DB_SHARDS.")
+        with use_shard(options['shard']):
+            self.seed(options)
+
+    def seed(self, options):
+        orgs, members, prefix = options['orgs'], options['members'], options['prefix']
+        if orgs < 1 or members < orgs:
+            raise CommandError("Need at least one organization and one member (its admin) per organization.")
+        if Organization.objects.filter(name=org_name(prefix, 1)).exists():
+            raise CommandError(f"Data with prefix '{prefix}' already exists; pick another --prefix.")
+
+        rng = random.Random(options['seed'])
+        self.shard = options['shard']
+        started = time.perf_counter()
+
+        org_ids = self.create_organizations(rng, prefix, orgs, options['shard'])
+        departments = self.create_departments(rng, org_ids, options['departments'])
+        self.stdout.write(f"{orgs} organizations, {sum(map(len, departments.values()))} departments")
+
+        # Tenant sizes follow a heavy tail: a few large institutions, many small ones
+        weights = [rng.paretovariate(1.2) for _ in org_ids]
+        scale = (members - orgs) / sum(weights)
+        sizes = [1 + int(weight * scale) for weight in weights]
+        sizes[max(range(orgs), key=weights.__getitem__)] += members - sum(sizes)
+
+        admin_password = make_password(options['password'])
+        member_password = make_password(None)
+        created = 0
+        batch = []
+        for number, (org_id, size) in enumerate(zip(org_ids, sizes), start=1):
+            for i in range(size):
+                batch.append(self.member(rng, prefix, number, org_id, i, departments[org_id],
+                                         admin_password if i == 0 else member_password))
+                if len(batch) >= options['batch_size']:
+                    created += self.insert(batch, options['skip_search_index'])
+                    batch = []
+                    self.progress(created, members, started)
+        if batch:
+            created += self.insert(batch, options['skip_search_index'])
+            self.progress(created, members, started)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {orgs} organizations and {created} members in {time.perf_counter() - started:.1f}s. "
+            f"Admins sign in as {admin_email(prefix, 1)} ... {admin_email(prefix, orgs)}."
+        ))
+
+    def create_organizations(self, rng, prefix, count, shard):
+        types = [code for code, _ in Organization.TYPE_CHOICES]
+        # bulk_create skips pre_save, so allocate the ids from the directory here
+        org_ids = [allocate_organization_id(shard) for _ in range(count)]
+        Organization.objects.bulk_create([
+            Organization(id=org_id, name=org_name(prefix, n), type=rng.choice(types), address=f"{n} Synthetic Road")
+            for n, org_id in enumerate(org_ids, start=1)
+        ], batch_size=1000)
+        return org_ids
+
+    def create_departments(self, rng, org_ids, per_org):
+        per_org = min(per_org, len(DEPARTMENT_NAMES))
+        Department.objects.bulk_create([
+            Department(organization_id=org_id, name=name)
+            for org_id in org_ids
+            for name in rng.sample(DEPARTMENT_NAMES, per_org)
+        ], batch_size=1000)
+        departments = {org_id: [] for org_id in org_ids}
+        for dept_id, org_id in Department.objects.filter(organization_id__in=org_ids).values_list('id', 'organization_id'):
+            departments[org_id].append(dept_id)
+        return departments
+
+    def member(self, rng, prefix, number, org_id, index, department_ids, password):
+        now = timezone.now()
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        if index == 0:
+            email, role, is_active, last_login = admin_email(prefix, number), 'ORG_ADMIN', True, now
+        else:
+            email = f"{first}.{last}.{index}@{org_domain(prefix, number)}".lower()
+            role = rng.choices(list(ROLE_WEIGHTS), weights=list(ROLE_WEIGHTS.values()))[0]
+            # Roughly 5% deactivated, a quarter invited but never signed in
+            is_active = rng.random() > 0.05
+            last_login = now - timedelta(days=rng.randint(0, 365)) if rng.random() > 0.25 else None
+        joined = now - timedelta(days=rng.randint(0, 3 * 365))
+        user = User(
+            username=email, email=email, password=password, first_name=first, last_name=last,
+            is_active=is_active, last_login=last_login, date_joined=min(joined, last_login or joined),
+        )
+        profile = UserProfile(
+            organization_id=org_id, role=role, is_setup_complete=True,
+            department_id=rng.choice(department_ids) if department_ids and rng.random() > 0.1 else None,
+            designation=rng.choice(DESIGNATIONS) if role != 'STUDENT' else None,
+        )
+        return user, profile
+
+    def insert(self, batch, skip_search_index):
+        """ One batch: users, their ids read back, profiles and counters in a transaction; then the search terms. """
+        deltas = Counter()
+        members = defaultdict(list)
+        with tenant_atomic():
+            # bulk_create skips post_save, so no profile is provisioned (or user mirrored) behind our back
+            User.objects.bulk_create([user for user, _ in batch])
+            user_ids = dict(User.objects.using(DIRECTORY).filter(
+                username__in=[user.username for user, _ in batch]
+            ).values_list('username', 'id'))
+            mirror_users(self.shard, user_ids.values())
+            for user, profile in batch:
+                profile.user_id = user_ids[user.username]
+                members[profile.organization_id].append(profile.user_id)
+                count_member(deltas, profile.organization_id, profile.role, profile.department_id,
+                             member_status(user.is_active, user.last_login))
+            UserProfile.objects.bulk_create([profile for _, profile in batch])
+            for org_id, org_members in members.items():
+                register_members(org_id, org_members)
+            apply_deltas(deltas)
+        if not skip_search_index:
+            reindex_members(user_ids.values())
+        return len(batch)
+
+    def progress(self, created, total, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"  {created}/{total} members ({created / elapsed:.0f}/s)")
@@ -0,0 +1,147 @@
+# backend/core/middleware.py
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import JsonResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.logconfig import new_request_id, request_id
+from core.routers import current_shard, read_only_request
+from core.sharding import DIRECTORY, astream_in_shard, member_db, shard_state, sharding_enabled, stream_in_shard
+
+
+class AsyncCapableMiddleware:
+    """
+    Base for the middlewares below: under ASGI, with the rest of the stack
+    async too, Django calls them without hopping to a thread per request.
+    Subclasses implement __call__ for WSGI, handing over to __acall__ for ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+
+class RequestIdMiddleware(AsyncCapableMiddleware):
+    """ Tags the request, and every log record emitted while serving it, with an id (echoed as X-Request-ID). """
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id.reset(token)
+        return self.finish(request, response)
+
+    def start(self, request):
+        request.request_id = new_request_id(request.headers.get('X-Request-ID'))
+        return request_id.set(request.request_id)
+
+    def finish(self, request, response):
+        response['X-Request-ID'] = request.request_id
+        return response
+
+
+class ReadReplicaMiddleware(AsyncCapableMiddleware):
+    """ Marks GET/HEAD requests so PrimaryReplicaRouter may serve their reads from the replica. """
+    SAFE_METHODS = ('GET', 'HEAD')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = read_only_request.set(request.method in self.SAFE_METHODS)
+        try:
+            return self.get_response(request)
+        finally:
+            read_only_request.reset(token)
+
+    async def __acall__(self, request):
+        token = read_only_request.set(request.method in self.SAFE_METHODS)
+        try:
+            return await self.get_response(request)
+        finally:
+            read_only_request.reset(token)
+
+
+class TenantShardMiddleware(AsyncCapableMiddleware):
+    """
+    Routes the request's tenant queries to the caller's shard (see core/sharding.py),
+    taken from the org_id claim of the bearer token without touching a table.
+    While an organization is being moved between shards, its writes get a 503.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not sharding_enabled():
+            return self.get_response(request)
+
+        alias, moving = self.resolve(request)
+        if moving and request.method not in self.SAFE_METHODS:
+            return self.moving_response()
+
+        token = current_shard.set(alias)
+        try:
+            return self.keep_shard(self.get_response(request), alias)
+        finally:
+            current_shard.reset(token)
+
+    async def __acall__(self, request):
+        if not sharding_enabled():
+            return await self.get_response(request)
+
+        # A cache hit usually, but a miss reads the directory
+        alias, moving = await sync_to_async(self.resolve)(request)
+        if moving and request.method not in self.SAFE_METHODS:
+            return self.moving_response()
+
+        token = current_shard.set(alias)
+        try:
+            return self.keep_shard(await self.get_response(request), alias)
+        finally:
+            current_shard.reset(token)
+
+    def keep_shard(self, response, alias):
+        # A streamed body (e.g. the roster export) is generated after we return
+        if getattr(response, 'streaming', False) and alias not in (None, DIRECTORY):
+            if response.is_async:
+                response.streaming_content = astream_in_shard(response.streaming_content, alias)
+            else:
+                response.streaming_content = stream_in_shard(response.streaming_content, alias)
+        return response
+
+    def moving_response(self):
+        response = JsonResponse(
+            {"error": "Your organization is being moved to another server. Try again in a minute."}, status=503
+        )
+        response['Retry-After'] = '60'
+        return response
+
+    def resolve(self, request):
+        header = request.headers.get('Authorization', '').split()
+        if len(header) != 2 or header[0] != 'Bearer':
+            return None, False
+        try:
+            access = AccessToken(header[1])
+        except TokenError:
+            # The view's authentication rejects it
+            return None, False
+        if 'org_id' in access:
+            return shard_state(access['org_id'])
+        # Issued before tenant claims existed
+        return member_db(access[api_settings.USER_ID_CLAIM]), False
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_email_indexes(apps, schema_editor):
+    """
+    auth_user.email has no index, so every invite's exists() check scans the table.
+    We can't add Meta.indexes to django.contrib.auth's User, hence raw SQL.
+
+    - MySQL/MariaDB: the column's collation is already case-insensitive, so a plain
+      index serves case-insensitive lookups. It stays non-unique because MariaDB 10.4
+      has no partial/functional indexes and admin accounts may share a blank email.
+    - SQLite/PostgreSQL: a plain index for lookups plus a case-insensitive unique
+      index that ignores blank emails.
+    """
+    vendor = schema_editor.connection.vendor
+    schema_editor.execute("CREATE INDEX auth_user_email_idx ON auth_user (email)")
+    if vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(
+            "CREATE UNIQUE INDEX auth_user_email_ci_uniq ON auth_user (LOWER(email)) "
+            "WHERE email <> ''"
+        )
+
+
+def drop_email_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute("DROP INDEX auth_user_email_idx ON auth_user")
+    else:
+        schema_editor.execute("DROP INDEX auth_user_email_idx")
+        schema_editor.execute("DROP INDEX auth_user_email_ci_uniq")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['organization', 'role'], name='profile_org_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['organization', 'department'], name='profile_org_dept_idx'),
+        ),
+        migrations.RunPython(create_email_indexes, drop_email_indexes),
+    ]
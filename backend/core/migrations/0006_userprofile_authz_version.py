@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_staff_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='authz_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
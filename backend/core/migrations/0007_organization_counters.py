@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_userprofile_authz_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('role', 'Role'), ('status', 'Status'), ('department', 'Department')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=32)),
+                ('count', models.IntegerField(default=0)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='core.organization')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('organization', 'dimension', 'key'), name='org_counter_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_organization_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='config_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='department_defaults',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
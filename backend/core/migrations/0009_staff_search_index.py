@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_department_config'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.organization')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='core.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'term'], name='search_org_term_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def assign_existing_organizations(apps, schema_editor):
+    """
+    Every organization so far lives in 'default'. Recording them also makes
+    the next allocated organization id (core/sharding.py) follow the highest
+    existing one. Shards start empty, so only the directory has anything to do.
+    """
+    alias = schema_editor.connection.alias
+    if alias != 'default':
+        return
+    Organization = apps.get_model('core', 'Organization')
+    ShardAssignment = apps.get_model('core', 'ShardAssignment')
+    ShardAssignment.objects.using(alias).bulk_create([
+        ShardAssignment(id=org_id, alias='default')
+        for org_id in Organization.objects.using(alias).values_list('id', flat=True).iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0009_staff_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(db_index=True, max_length=64)),
+                ('moving', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ShardedMember',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sharded_member', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('organization_id', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.RunPython(assign_existing_organizations, migrations.RunPython.noop),
+    ]
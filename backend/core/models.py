@@ -4,6 +4,10 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from core.permissions import validate_permissions
 
 # --- 1. The SaaS Hierarchy ---
 
@@ -23,6 +27,11 @@ class Organization(models.Model):
     address = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Config every department inherits; Department.config overrides it key by key
+    department_defaults = models.JSONField(default=dict, blank=True)
+    # Bumped whenever the defaults or any department change (see core/departments.py)
+    config_version = models.PositiveIntegerField(default=1)
+
     def __str__(self):
         return f"{self.name} ({self.type})"
 
@@ -32,6 +41,7 @@ class Department(models.Model):
     """
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='departments')
     name = models.CharField(max_length=100)
+    # Overrides on top of Organization.department_defaults
     config = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
@@ -64,15 +74,184 @@ class UserProfile(models.Model):
     is_setup_complete = models.BooleanField(default=False)
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     permissions = models.JSONField(default=dict, blank=True)
+    # Copied into each access token ('authz_ver'). Bumped whenever role,
+    # organization or permissions change, which invalidates older tokens.
+    authz_version = models.PositiveIntegerField(default=1)
+
+    # Drives /api/staff/changes/. auto_now is skipped by save(update_fields=[...])
+    # and queryset.update(), so always list/set 'updated_at' explicitly there.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Staff listing filters (?role=, ?department=) within one organization
+            models.Index(fields=['organization', 'role'], name='profile_org_role_idx'),
+            models.Index(fields=['organization', 'department'], name='profile_org_dept_idx'),
+            # Delta sync: "what changed in my org since T?"
+            models.Index(fields=['organization', 'updated_at'], name='profile_org_updated_idx'),
+        ]
+
+    def clean(self):
+        # Same schema the staff API enforces (admin forms call this)
+        try:
+            self.permissions = validate_permissions(self.permissions)
+        except ValueError as e:
+            raise ValidationError({'permissions': str(e)})
 
     def __str__(self):
         return f"{self.user.username} ({self.role})"
 
-# --- 3. Signals ---
+class StaffTombstone(models.Model):
+    """
+    Marker left behind when a member's profile is deleted.
+    Removing staff hard-deletes the User (and cascades the profile), so delta
+    sync clients learn about removals from here rather than from the profile.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='tombstones')
+    user_id = models.IntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'deleted_at'], name='tombstone_org_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"User {self.user_id} removed from org {self.organization_id}"
+
+# --- 3. Outbound Mail Queue ---
+
+class OutboundEmail(models.Model):
+    """
+    A persistent outbox row. Requests only insert these;
+    the 'process_mail_queue' worker delivers them over a reused SMTP connection.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RETRYING', 'Retrying'),
+        ('SENT', 'Sent'),
+        ('DEAD', 'Dead Letter'),   # Gave up after MAIL_QUEUE_MAX_ATTEMPTS
+    ]
+
+    to_email = models.EmailField(db_index=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "what is due?" scan
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+# --- 4. Dashboard Counters ---
+
+class OrganizationCounter(models.Model):
+    """
+    Denormalized member headcounts behind /api/org/stats/.
+    One row per (organization, dimension, key), e.g. ('role', 'STAFF') or
+    ('department', '12'). Kept current by core/stats.py; repaired by the
+    'recompute_org_stats' command.
+    """
+    DIMENSION_CHOICES = [
+        ('total', 'Total'),
+        ('role', 'Role'),
+        ('status', 'Status'),
+        ('department', 'Department'),  # key is the department id, or 'none'
+    ]
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='counters')
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=32, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'dimension', 'key'], name='org_counter_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.organization_id} {self.dimension}:{self.key} = {self.count}"
+
+# --- 5. Staff Search Index ---
+
+class StaffSearchTerm(models.Model):
+    """
+    One lower-cased word from a member's name, email, designation or
+    department. Typeahead search is a prefix range scan on
+    (organization, term), maintained by core/search.py.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='+')
+    profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'term'], name='search_org_term_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> profile {self.profile_id}"
+
+# --- 6. Shard Directory ---
+#
+# Kept in the directory database ('default') only; see core/sharding.py.
+
+class ShardAssignment(models.Model):
+    """
+    Which database an organization lives on. Also hands out organization ids
+    (the id of this row becomes the organization's), so they stay unique
+    across shards.
+    """
+    alias = models.CharField(max_length=64, db_index=True)
+    # Set by 'move_organization' while it copies the organization; writes are refused meanwhile
+    moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"org {self.pk} -> {self.alias}"
+
+class ShardedMember(models.Model):
+    """
+    A user whose profile lives on a shard other than 'default', and the
+    organization it belongs to. Lets requests without tenant claims (login,
+    token refresh) find the user's shard. No row: the profile is in 'default'.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='sharded_member')
+    organization_id = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"user {self.user_id} -> org {self.organization_id}"
+
+# --- 7. Signals ---
+
+@receiver(post_save, sender=User)
+def mirror_user(sender, instance, raw=False, using=None, **kwargs):
+    """ Copies the saved user into its shard, before ensure_profile_exists creates a profile there. """
+    # Imported here: core.sharding imports this module
+    from core.sharding import DIRECTORY, member_db, mirror_users, sharding_enabled
+
+    if raw or using != DIRECTORY or not sharding_enabled():
+        return
+    mirror_users(member_db(instance.pk), [instance.pk])
 
 @receiver(post_save, sender=User)
-def ensure_profile_exists(sender, instance, created, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
-    else:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+def ensure_profile_exists(sender, instance, created, raw=False, **kwargs):
+    """
+    Provisions a profile for brand-new users only.
+    Ordinary saves (e.g. last_login on every login) must not touch UserProfile.
+    """
+    if created and not raw:
+        UserProfile.objects.get_or_create(user=instance)
\ No newline at end of file
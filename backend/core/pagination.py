@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class StaffCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the staff roster.
+    Pages are fetched with 'WHERE id > last_seen' instead of OFFSET,
+    so page 200 costs the same as page 1 and no COUNT(*) is ever run.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = 'id'
@@ -0,0 +1,136 @@
+# backend/core/permissions.py
+#
+# UserProfile.permissions is stored as JSON ({"can_manage_fees": true, ...}).
+# It is validated on write and compiled into an int bitmask, so a check is
+# one AND instead of a dict walk. The mask also rides in the access token
+# ('perms' claim), so stateless requests can check permissions with no query.
+
+from rest_framework.permissions import BasePermission
+
+# Every grantable permission, in bit order. Append only: bit positions are
+# baked into issued tokens. Keep in sync with FEATURE_FLAGS in StaffManagement.jsx.
+PERMISSIONS = (
+    'can_manage_fees',
+    'can_upload_data',
+    'can_manage_students',
+)
+PERMISSION_BITS = {name: 1 << bit for bit, name in enumerate(PERMISSIONS)}
+ALL_PERMISSIONS = (1 << len(PERMISSIONS)) - 1
+
+# Roles that implicitly hold every permission
+ADMIN_ROLES = frozenset({'SUPER_ADMIN', 'ORG_ADMIN'})
+
+
+def validate_permissions(data):
+    """
+    Schema check for a permissions document: an object mapping known
+    permission names to booleans. Returns the normalized dict
+    (every known name present). Raises ValueError with a readable message.
+    """
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ValueError("Permissions must be an object")
+
+    unknown = sorted(set(data) - set(PERMISSION_BITS))
+    if unknown:
+        raise ValueError(f"Unknown permission: {', '.join(unknown)}")
+    not_bool = sorted(name for name, value in data.items() if not isinstance(value, bool))
+    if not_bool:
+        raise ValueError(f"Permission values must be true or false: {', '.join(not_bool)}")
+
+    return {name: data.get(name, False) for name in PERMISSIONS}
+
+
+def validate_permissions_patch(patch):
+    """
+    Schema check for a JSON merge patch (RFC 7396) against a permissions
+    document: known names mapped to true, false or null (null drops the grant).
+    """
+    if not isinstance(patch, dict) or not patch:
+        raise ValueError("Permissions patch must be a non-empty object")
+
+    unknown = sorted(set(patch) - set(PERMISSION_BITS))
+    if unknown:
+        raise ValueError(f"Unknown permission: {', '.join(unknown)}")
+    invalid = sorted(name for name, value in patch.items() if value is not None and not isinstance(value, bool))
+    if invalid:
+        raise ValueError(f"Permission values must be true, false or null: {', '.join(invalid)}")
+    return patch
+
+
+def merge_permissions(document, patch):
+    """ Applies a validated merge patch; returns a normalized document. """
+    merged = {name: isinstance(document, dict) and document.get(name) is True for name in PERMISSIONS}
+    for name, value in patch.items():
+        merged[name] = bool(value)
+    return merged
+
+
+def compile_permissions(data):
+    """
+    Permissions document -> bitmask. Lenient on purpose: rows written before
+    validation existed may hold unknown keys or truthy strings; those are ignored.
+    """
+    mask = 0
+    if isinstance(data, dict):
+        for name, value in data.items():
+            if value is True:
+                mask |= PERMISSION_BITS.get(name, 0)
+    return mask
+
+
+def effective_mask(role, data):
+    """ Admin roles hold every permission; everyone else what their document grants. """
+    return ALL_PERMISSIONS if role in ADMIN_ROLES else compile_permissions(data)
+
+
+# Compiled masks keyed by (user_id, authz_version). A permissions change
+# always bumps authz_version, so an entry can never go stale, only unused.
+_compiled = {}
+COMPILED_CACHE_SIZE = 10000
+
+
+def profile_permission_mask(profile):
+    """ Effective bitmask for a profile, compiled once per authz_version. """
+    if profile is None:
+        return 0
+    key = (profile.user_id, profile.authz_version)
+    mask = _compiled.get(key)
+    if mask is None:
+        if len(_compiled) >= COMPILED_CACHE_SIZE:
+            _compiled.clear()
+        mask = _compiled[key] = effective_mask(profile.role, profile.permissions)
+    return mask
+
+
+def mask_for(*names):
+    """ Bitmask for a set of permission names; unknown names are a programming error. """
+    try:
+        return sum(PERMISSION_BITS[name] for name in set(names))
+    except KeyError as e:
+        raise ValueError(f"Unknown permission: {e.args[0]}") from None
+
+
+class PermissionRequired(BasePermission):
+    """
+    DRF permission: `permission_classes = [IsAuthenticated, require_perms('can_manage_fees')]`.
+    The required mask is computed once, when the class is built.
+    """
+    required_mask = 0
+
+    def has_permission(self, request, view):
+        # Imported here: core.authentication imports this module
+        from core.authentication import get_tenant
+        if not request.user or not request.user.is_authenticated:
+            return False
+        return get_tenant(request).permission_mask & self.required_mask == self.required_mask
+
+
+def require_perms(*names):
+    """ Builds a PermissionRequired subclass for the given permission names. """
+    return type(
+        f"Require_{'_'.join(sorted(names))}",
+        (PermissionRequired,),
+        {'required_mask': mask_for(*names)},
+    )
@@ -0,0 +1,132 @@
+# backend/core/ratelimit.py
+#
+# Token-bucket throttles for the password endpoints (login, registration,
+# password reset). Each bucket holds `burst` tokens and refills at `rate`
+# tokens per second; a request spends one. Buckets live in process memory:
+# no cache round trip on the hot path, and a flood of guesses from one IP,
+# from one IP at one account, or at one account from anywhere is turned away
+# before any PBKDF2 work is done.
+
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+# Drop idle buckets once the store grows past this many keys
+MAX_BUCKETS = 50000
+
+
+class TokenBucketStore:
+    """ Thread-safe map of key -> (tokens, last_refill). """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, burst, rate):
+        """ Spends one token. Returns 0 if allowed, else seconds until one is available. """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._prune(now)
+            return (1 - tokens) / rate
+
+    def _prune(self, now):
+        # A bucket idle long enough to have refilled completely is the same as no bucket
+        longest_refill = max(burst / rate for burst, rate in settings.AUTH_RATE_LIMITS.values())
+        self._buckets = {
+            key: value for key, value in self._buckets.items() if now - value[1] < longest_refill
+        }
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+buckets = TokenBucketStore()
+
+
+def _auth_views():
+    # Imported lazily: these modules pull in allauth's models
+    from dj_rest_auth.registration.views import RegisterView
+    from dj_rest_auth.views import LoginView, PasswordChangeView, PasswordResetConfirmView, PasswordResetView
+    return (LoginView, RegisterView, PasswordResetView, PasswordResetConfirmView, PasswordChangeView)
+
+
+class AuthRateThrottle(BaseThrottle):
+    """
+    Base class: only POSTs to the password endpoints are counted, so these
+    can sit in DEFAULT_THROTTLE_CLASSES without touching other views.
+    """
+    limit_name = None
+
+    def __init__(self):
+        self.retry_after = None
+
+    def allow_request(self, request, view):
+        if request.method != 'POST' or not isinstance(view, _auth_views()):
+            return True
+        key = self.get_key(request)
+        if key is None:
+            return True
+        burst, rate = settings.AUTH_RATE_LIMITS[self.limit_name]
+        self.retry_after = buckets.take(f"{self.limit_name}:{key}", burst, rate)
+        return self.retry_after == 0
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def wait(self):
+        return self.retry_after
+
+
+class AuthIPThrottle(AuthRateThrottle):
+    """ Per client address (honours REST_FRAMEWORK['NUM_PROXIES']). """
+    limit_name = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+def targeted_account(request):
+    """ The account a password request is about, normalized, or None. """
+    data = request.data if hasattr(request.data, 'get') else {}
+    account = data.get('email') or data.get('username') or data.get('uid')
+    if isinstance(account, str) and account.strip():
+        return account.strip().lower()
+    # Password change: the account is the authenticated caller
+    if request.user and request.user.is_authenticated:
+        return f"user-{request.user.pk}"
+    return None
+
+
+class AuthAccountThrottle(AuthRateThrottle):
+    """
+    Per targeted account and client address: the tight limit. Keyed on the
+    account alone, anyone could lock a member out by sending five wrong
+    passwords for them; this way guesses only use up the guesser's own bucket.
+    """
+    limit_name = 'account'
+
+    def get_key(self, request):
+        account = targeted_account(request)
+        return f"{account}:{self.get_ident(request)}" if account else None
+
+
+class AuthAccountGlobalThrottle(AuthRateThrottle):
+    """
+    Per targeted account, however many addresses the guesses come from. A
+    much bigger bucket than AuthAccountThrottle's: it caps what a botnet can
+    try against one account, and only such a flood locks the member out.
+    """
+    limit_name = 'account_global'
+
+    def get_key(self, request):
+        return targeted_account(request)
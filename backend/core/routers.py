@@ -0,0 +1,106 @@
+# backend/core/routers.py
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# True while handling a GET/HEAD request (set by core.middleware.ReadReplicaMiddleware)
+read_only_request = ContextVar('read_only_request', default=False)
+
+# The shard alias of the organization being served (set by core.middleware.TenantShardMiddleware,
+# or core.sharding.tenant_context() outside requests); None means the directory, 'default'
+current_shard = ContextVar('current_shard', default=None)
+
+
+@contextmanager
+def use_primary():
+    """
+    Reads inside the block skip the replica even during a GET: for
+    authentication, and for anything about to be cached, which a lagging
+    replica would otherwise pin at its old value until the entry expires.
+    """
+    token = read_only_request.set(False)
+    try:
+        yield
+    finally:
+        read_only_request.reset(token)
+
+
+class TenantShardRouter:
+    """
+    Sends tenant models (see core.sharding.TENANT_MODELS) to their
+    organization's shard, and User reads to the shard's mirror of auth_user
+    while serving a tenant, so profile->user joins stay on one database.
+    User writes always go to the directory. Returns None (no opinion) for
+    'default', so PrimaryReplicaRouter still decides between it and the replica.
+    List it first.
+    """
+
+    def db_for_read(self, model, **hints):
+        # Imported here: core.sharding imports the models, which can't load while routers are set up
+        from core.sharding import is_tenant_model
+
+        if model._meta.label_lower == 'auth.user':
+            return self._shard(hints)
+        if is_tenant_model(model):
+            return self._shard(hints)
+        return None
+
+    def db_for_write(self, model, **hints):
+        from core.sharding import DIRECTORY, is_tenant_model
+
+        if model._meta.label_lower == 'auth.user':
+            return DIRECTORY
+        if is_tenant_model(model):
+            return self._shard(hints)
+        return None
+
+    def _shard(self, hints):
+        from core.sharding import DIRECTORY, member_db
+
+        instance = hints.get('instance')
+        alias = getattr(getattr(instance, '_state', None), 'db', None)
+        if alias == DIRECTORY and instance._meta.label_lower == 'auth.user':
+            # A user read from the directory (e.g. at login): their profile is wherever they are a member
+            alias = member_db(instance.pk)
+        alias = alias or current_shard.get()
+        return alias if alias != DIRECTORY else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Tenant rows reference mirrored users, and org-less profiles directory users
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard gets the full schema ('migrate --database <alias>'); most tables just stay empty
+        return None
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to the 'replica' database during safe (GET/HEAD) requests,
+    when one is configured. Everything else, and every write, goes to 'default',
+    so a request never reads back its own writes from a lagging replica.
+    Reads under use_primary() go to 'default' too.
+    """
+    replica_alias = 'replica'
+
+    def db_for_read(self, model, **hints):
+        if read_only_request.get() and self.replica_alias in settings.DATABASES:
+            return self.replica_alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explicit, otherwise Django would save an instance back to the
+        # database it was read from (the replica)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica and primary hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        if db == self.replica_alias:
+            return False
+        return None
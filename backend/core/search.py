@@ -0,0 +1,111 @@
+# backend/core/search.py
+#
+# Server-side staff search. Every member's name, email, designation and
+# department name are split into lower-case words and stored as
+# StaffSearchTerm rows. A query word matches any term it is a prefix of,
+# within one organization: a range scan on the (organization, term) index,
+# however large the organization is.
+# Signals reindex members as they change; bulk paths call reindex_members().
+
+import re
+
+from django.db.models import Exists, OuterRef
+
+from core.models import StaffSearchTerm, UserProfile
+from core.sharding import tenant_atomic
+
+SEARCH_TERM_MAX_LENGTH = 64
+# More words than this narrow nothing useful and cost one subquery each
+SEARCH_MAX_WORDS = 5
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+REINDEX_CHUNK_SIZE = 1000
+SELECTIVITY_SAMPLE = 500
+
+_WORD = re.compile(r'\w+')
+
+
+def search_words(text):
+    """ Lower-cased words of `text`, in order, without repeats. """
+    return list(dict.fromkeys(_WORD.findall((text or '').lower())))
+
+
+def member_terms(first_name, last_name, email, designation, department_name):
+    """ The index terms for one member. The whole email is a term too, so 'jo.smith@' keeps matching. """
+    terms = set()
+    for text in (first_name, last_name, email, designation, department_name):
+        terms.update(search_words(text))
+    if email:
+        terms.add(email.lower())
+    return {term[:SEARCH_TERM_MAX_LENGTH] for term in terms}
+
+
+def reindex_members(user_ids):
+    """
+    Rebuilds the search terms of the given members: per chunk, one read
+    (profile + user + department joined), one DELETE and one INSERT.
+    Members without an organization end up with no terms.
+    """
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), REINDEX_CHUNK_SIZE):
+        rows = UserProfile.objects.filter(user_id__in=user_ids[start:start + REINDEX_CHUNK_SIZE]).values_list(
+            'id', 'organization_id', 'user__first_name', 'user__last_name', 'user__email',
+            'designation', 'department__name',
+        )
+        with tenant_atomic():
+            rows = list(rows)
+            StaffSearchTerm.objects.filter(profile_id__in=[row[0] for row in rows]).delete()
+            StaffSearchTerm.objects.bulk_create([
+                StaffSearchTerm(organization_id=org_id, profile_id=profile_id, term=term)
+                for profile_id, org_id, *fields in rows if org_id
+                for term in member_terms(*fields)
+            ])
+
+
+def _prefix_match(word, **filters):
+    """
+    Terms starting with `word`. The range is what the index serves on every
+    backend (a bare LIKE 'jo%' can't use it on SQLite, nor on MySQL as
+    LIKE BINARY); startswith then drops anything the collation let in.
+    """
+    word = word[:SEARCH_TERM_MAX_LENGTH]
+    upper_bound = word[:-1] + chr(ord(word[-1]) + 1)
+    return StaffSearchTerm.objects.filter(term__gte=word, term__lt=upper_bound, term__startswith=word, **filters)
+
+
+def search_members(queryset, query, organization_id):
+    """
+    Narrows an organization-scoped roster queryset to members matching every
+    word of `query` as a prefix of some term ("jo sm" finds Joanna Smith).
+    For paginated listings; typeahead uses typeahead_profile_ids().
+    """
+    for word in search_words(query)[:SEARCH_MAX_WORDS]:
+        queryset = queryset.filter(id__in=_prefix_match(word, organization_id=organization_id).values('profile_id'))
+    return queryset
+
+
+def typeahead_profile_ids(organization_id, query, limit=SEARCH_DEFAULT_LIMIT):
+    """
+    Up to `limit` profile ids matching every word of `query`, in term order.
+    The rarest word drives a walk along the (organization, term) index and
+    each candidate is checked for the other words by profile, so the query
+    stops after `limit` hits instead of collecting every match: a one-letter
+    query costs the same as a full name. The slow case left is two common
+    words that never occur together: the whole driving range is walked.
+    """
+    words = search_words(query)[:SEARCH_MAX_WORDS]
+    if not words:
+        return []
+    if len(words) > 1:
+        # Drive with the rarest word; counting is capped so each estimate stays a short index walk
+        estimates = {
+            word: _prefix_match(word, organization_id=organization_id).values('id')[:SELECTIVITY_SAMPLE].count()
+            for word in words
+        }
+        if not all(estimates.values()):
+            return []
+        words.sort(key=estimates.get)
+    candidates = _prefix_match(words[0], organization_id=organization_id)
+    for word in words[1:]:
+        candidates = candidates.filter(Exists(_prefix_match(word, profile_id=OuterRef('profile_id'))))
+    return list(candidates.values_list('profile_id', flat=True).distinct()[:limit])
@@ -1,12 +1,16 @@
 from rest_framework import serializers
 from dj_rest_auth.serializers import UserDetailsSerializer, PasswordResetSerializer, PasswordResetConfirmSerializer
 from dj_rest_auth.registration.serializers import RegisterSerializer
+from dj_rest_auth.jwt_auth import CookieTokenRefreshSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from allauth.account.forms import ResetPasswordForm as AllAuthPasswordResetForm
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_str
 from django.contrib.auth.password_validation import validate_password
+from core.models import UserProfile
+from core.authentication import TenantRefreshToken
 
 # 1. User Details (for /user/me/)
 class CustomUserDetailsSerializer(UserDetailsSerializer):
@@ -20,6 +24,79 @@ class CustomUserDetailsSerializer(UserDetailsSerializer):
             'role', 'organization_name', 'is_setup_complete', 'permissions'
         )
 
+# 1a. Current User payload (for /api/user/me/, sync and async views)
+def current_user_payload(user, profile, org):
+    return {
+        "id": user.id,
+        "name": user.get_full_name() or user.email.split('@')[0],
+        "email": user.email,
+        "role": profile.get_role_display(),
+        "role_code": profile.role,
+        "organization": org.name if org else "No Campus",
+        "location": org.address if org else "",
+        "designation": profile.designation or "Staff Member",
+        "org_type": org.type if org else "Institute",
+        "is_setup_complete": profile.is_setup_complete
+    }
+
+# 1b. Staff Roster Row (for /api/staff/)
+class StaffMemberSerializer(serializers.ModelSerializer):
+    """
+    One row of the staff table. Expects the queryset to select_related
+    'user', and context={'departments': department_map(org_id)} for the
+    department names, so that serializing a page adds no queries.
+    """
+    id = serializers.IntegerField(source="user_id")
+    name = serializers.SerializerMethodField()
+    email = serializers.EmailField(source="user.email")
+    role = serializers.CharField(source="get_role_display")
+    role_code = serializers.CharField(source="role")
+    department = serializers.SerializerMethodField()
+    status = serializers.SerializerMethodField()
+    last_login = serializers.DateTimeField(source="user.last_login")
+    permissions = serializers.SerializerMethodField()
+    email_status = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserProfile
+        fields = (
+            'id', 'name', 'email', 'role', 'role_code',
+            'department', 'status', 'last_login', 'permissions', 'email_status'
+        )
+
+    def get_name(self, member):
+        u = member.user
+        return u.get_full_name() or u.email.split('@')[0]
+
+    def get_department(self, member):
+        departments = self.context.get('departments')
+        if departments is not None:
+            return departments.name(member.department_id)
+        return member.department.name if member.department else "-"
+
+    def get_status(self, member):
+        if not member.user.is_active:
+            return "Deactivated"
+        # If last_login is None, they haven't accepted the invite yet
+        return "Invited" if member.user.last_login is None else "Active"
+
+    def get_permissions(self, member):
+        return member.permissions or {}
+
+    def get_email_status(self, member):
+        # Annotated by staff_queryset(): PENDING / RETRYING / SENT / DEAD, or None
+        return getattr(member, 'email_status', None)
+
+# 1c. Department (for /api/departments/)
+def department_payload(department):
+    """ A DepartmentInfo from core.departments.department_map(). """
+    return {
+        "id": department.id,
+        "name": department.name,
+        "config": department.config,
+        "effective_config": department.effective_config,
+    }
+
 # 2. Password Reset Request (Sending the Email)
 class CustomPasswordResetSerializer(PasswordResetSerializer):
     """
@@ -54,22 +131,23 @@ class CustomPasswordResetConfirmSerializer(PasswordResetConfirmSerializer):
         if attrs.get('new_password1') != attrs.get('new_password2'):
             raise serializers.ValidationError({'new_password1': ['The two password fields didn’t match.']})
 
-        # D. Check if Password is SAME as Old Password
-        if self.user.check_password(attrs.get('new_password1')):
-             raise serializers.ValidationError({'new_password1': ['Your new password cannot be the same as your old password.']})
-
-        # E. Check Password Complexity (Length, Digits, Commonality)
+        # D. Check Password Complexity (Length, Digits, Commonality)
         try:
             validate_password(attrs.get('new_password1'), self.user)
         except Exception as e:
             # e.messages is a list of strings from Django's validators
             raise serializers.ValidationError({'new_password1': list(e.messages)})
 
+        # E. Check if Password is SAME as Old Password
+        # (last: it costs a full PBKDF2 run, so only pay it for otherwise valid requests)
+        if self.user.check_password(attrs.get('new_password1')):
+             raise serializers.ValidationError({'new_password1': ['Your new password cannot be the same as your old password.']})
+
         return attrs
 
     def save(self):
         self.user.set_password(self.validated_data['new_password1'])
-        self.user.save()
+        self.user.save(update_fields=['password'])
         return self.user
 
 class CustomRegisterSerializer(RegisterSerializer):
@@ -90,4 +168,13 @@ class CustomRegisterSerializer(RegisterSerializer):
         if self.validated_data.get('username'):
             user.username = self.validated_data.get('username')
             
-        user.save()
\ No newline at end of file
+        user.save(update_fields=['first_name', 'last_name', 'username'])
+
+# 4. JWTs with tenant claims (see StatelessTenantJWTAuthentication)
+class TenantTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """ Used by dj-rest-auth at login: access tokens carry role, org_id and authz_ver. """
+    token_class = TenantRefreshToken
+
+class TenantTokenRefreshSerializer(CookieTokenRefreshSerializer):
+    """ Every refresh re-reads the claims, so a bumped authz_version is picked up here. """
+    token_class = TenantRefreshToken
@@ -0,0 +1,242 @@
+# backend/core/sharding.py
+#
+# Organizations spread over several databases ("shards"). settings.TENANT_SHARDS
+# lists the aliases. 'default' is always one of them and is also the
+# directory: the only copy of auth_user and the other auth, session and
+# allauth tables, the mail outbox, and ShardAssignment (which shard each
+# organization lives on). Everything an organization owns (TENANT_MODELS)
+# lives on its shard.
+#
+# So the roster's profile -> user joins stay on one database, each shard
+# other than 'default' also keeps a mirror of its members' auth_user rows.
+# The directory row is the one that gets written; the mirror follows it
+# through signals (core/models.py, core/signals.py), and explicitly in the
+# bulk paths of core/staff.py, which bypass signals.
+#
+# Requests are routed by core.middleware.TenantShardMiddleware, which sets
+# the caller's shard from the org_id claim of their access token;
+# core.routers.TenantShardRouter sends tenant models there. Code running
+# outside a request wraps tenant work in tenant_context(org_id).
+#
+# With a single shard (the default setup), the only query this adds is the
+# id allocated for each new organization.
+
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count
+
+from core.models import ShardAssignment, ShardedMember, UserProfile
+from core.routers import current_shard
+
+DIRECTORY = DEFAULT_DB_ALIAS
+
+# Stored on the organization's shard; everything else stays in the directory
+TENANT_MODELS = frozenset({
+    'core.organization', 'core.department', 'core.userprofile',
+    'core.organizationcounter', 'core.staffsearchterm', 'core.stafftombstone',
+})
+
+SHARD_CACHE_TIMEOUT = 60 * 10
+MIRROR_CHUNK_SIZE = 1000
+
+
+def sharding_enabled():
+    return len(settings.TENANT_SHARDS) > 1
+
+
+def is_tenant_model(model):
+    return model._meta.label_lower in TENANT_MODELS
+
+
+# --- Resolving shards ---
+
+def shard_cache_key(organization_id):
+    return f"tenant-shard:{organization_id}"
+
+
+def shard_state(organization_id):
+    """
+    (alias, moving) for an organization, cached. Organizations created before
+    sharding was enabled have no ShardAssignment row and live in 'default'.
+    """
+    if organization_id is None or not sharding_enabled():
+        return DIRECTORY, False
+    key = shard_cache_key(organization_id)
+    state = cache.get(key)
+    if state is None:
+        row = (
+            ShardAssignment.objects.using(DIRECTORY)
+            .filter(pk=organization_id).values_list('alias', 'moving').first()
+        )
+        state = tuple(row) if row else (DIRECTORY, False)
+        cache.set(key, state, SHARD_CACHE_TIMEOUT)
+    return state
+
+
+def shard_for(organization_id):
+    return shard_state(organization_id)[0]
+
+
+def forget_shard(organization_id):
+    cache.delete(shard_cache_key(organization_id))
+
+
+def member_db(user_id):
+    """ Where a user's profile lives: the shard being served, else looked up in the directory. """
+    alias = current_shard.get()
+    if alias or not sharding_enabled():
+        return alias or DIRECTORY
+    organization_id = (
+        ShardedMember.objects.using(DIRECTORY)
+        .filter(user_id=user_id).values_list('organization_id', flat=True).first()
+    )
+    return shard_for(organization_id)
+
+
+def tenant_db():
+    """ The alias tenant models are routed to right now. """
+    return current_shard.get() or DIRECTORY
+
+
+@contextmanager
+def use_shard(alias):
+    token = current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        current_shard.reset(token)
+
+
+def stream_in_shard(chunks, alias):
+    """
+    Yields from `chunks` with tenant models routed to `alias` while each one is
+    produced. A streaming response's generator only runs once the response is
+    being sent, after the request's own routing has been reset.
+    """
+    chunks = iter(chunks)
+    while True:
+        with use_shard(alias):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def astream_in_shard(chunks, alias):
+    """ stream_in_shard() for an async iterator. """
+    chunks = aiter(chunks)
+    while True:
+        with use_shard(alias):
+            chunk = await anext(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def tenant_context(organization_id):
+    """ Routes tenant models to the organization's shard for the duration of the block. """
+    return use_shard(shard_for(organization_id))
+
+
+def member_context(user_id):
+    """ Routes tenant models to the shard holding this user's profile, unless one is already being served. """
+    return use_shard(member_db(user_id))
+
+
+def organization_ids():
+    """ Every organization on every shard, from the directory. """
+    return ShardAssignment.objects.using(DIRECTORY).order_by('id').values_list('id', flat=True)
+
+
+@contextmanager
+def tenant_atomic():
+    """
+    transaction.atomic() on the directory and, when tenant models are routed
+    elsewhere, on that shard too. Not two-phase: the shard commits first.
+    """
+    alias = tenant_db()
+    with transaction.atomic(using=DIRECTORY):
+        with transaction.atomic(using=alias) if alias != DIRECTORY else nullcontext():
+            yield
+
+
+# --- Placing organizations ---
+
+def place_organization():
+    """ Shard for a new organization: settings.NEW_ORG_SHARD, else the one with the fewest organizations. """
+    if not sharding_enabled():
+        return DIRECTORY
+    if settings.NEW_ORG_SHARD:
+        return settings.NEW_ORG_SHARD
+    counts = dict(
+        ShardAssignment.objects.using(DIRECTORY)
+        .values('alias').annotate(n=Count('id')).values_list('alias', 'n').order_by()
+    )
+    return min(settings.TENANT_SHARDS, key=lambda alias: counts.get(alias, 0))
+
+
+def allocate_organization_id(alias):
+    """ Reserves a globally unique organization id and records it as living on `alias`. """
+    return ShardAssignment.objects.using(DIRECTORY).create(alias=alias).pk
+
+
+# --- Mirroring directory rows onto shards ---
+
+def _upsert(model, alias, objs, update_fields):
+    # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target; SQLite and PostgreSQL need one
+    target = [model._meta.pk.name] if connections[alias].features.supports_update_conflicts_with_target else None
+    model.objects.using(alias).bulk_create(
+        objs, update_conflicts=True, update_fields=update_fields, unique_fields=target,
+    )
+
+
+def mirror_users(alias, user_ids):
+    """ Copies the directory's auth_user rows for `user_ids` onto shard `alias`, inserting or overwriting. """
+    if alias == DIRECTORY:
+        return
+    user_ids = list(user_ids)
+    fields = [field.name for field in User._meta.concrete_fields if not field.primary_key]
+    for start in range(0, len(user_ids), MIRROR_CHUNK_SIZE):
+        users = list(User.objects.using(DIRECTORY).filter(id__in=user_ids[start:start + MIRROR_CHUNK_SIZE]))
+        if users:
+            _upsert(User, alias, users, fields)
+
+
+def update_users(user_ids, **fields):
+    """ queryset.update() of auth_user, in the directory and in the current shard's mirror. """
+    User.objects.using(DIRECTORY).filter(id__in=user_ids).update(**fields)
+    alias = tenant_db()
+    if alias != DIRECTORY:
+        User.objects.using(alias).filter(id__in=user_ids).update(**fields)
+
+
+def register_members(organization_id, user_ids):
+    """ Records in the directory that these members' profiles live on the organization's shard. """
+    if shard_for(organization_id) == DIRECTORY:
+        return
+    _upsert(ShardedMember, DIRECTORY, [
+        ShardedMember(user_id=user_id, organization_id=organization_id) for user_id in user_ids
+    ], ['organization_id'])
+
+
+def relocate_profile(profile, alias, update_fields):
+    """
+    Saves a profile that has just been given an organization on shard `alias`.
+    Org-less profiles live in the directory, so unless that is the shard the
+    profile moves: it is inserted there as a new row and the old one deleted.
+    """
+    source = profile._state.db or DIRECTORY
+    if source == alias:
+        profile.save(update_fields=update_fields)
+        return
+    mirror_users(alias, [profile.user_id])
+    with use_shard(source):
+        UserProfile.objects.filter(pk=profile.pk).delete()
+    profile.pk = None
+    profile._state.adding = True
+    with use_shard(alias):
+        profile.save(using=alias)
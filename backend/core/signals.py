@@ -1,27 +1,234 @@
+import logging
 from django.dispatch import receiver
+from collections import Counter
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.contrib.auth.models import User, update_last_login
+from django.utils import timezone
 from allauth.account.signals import user_signed_up
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from core.cache import invalidate_me
+from core.mail import build_welcome_email
+from core.authentication import forget_authz_version
+from core.models import Department, Organization, OrganizationCounter, ShardAssignment, UserProfile, StaffTombstone
+from core.departments import bump_config_version
+from core.search import reindex_members
+from core.stats import apply_deltas, count_member, member_snapshot, member_status, move_status
+from core.sharding import (
+    DIRECTORY, allocate_organization_id, forget_shard, member_context, member_db, register_members,
+    sharding_enabled, use_shard,
+)
+
+logger = logging.getLogger(__name__)
 
 @receiver(user_signed_up)
 def send_welcome_email(request, user, **kwargs):
     """
-    Sends a styled welcome email immediately after a user signs up.
+    Queues a styled welcome email immediately after a user signs up.
     """
-    subject = "Welcome to EduSphere! 🚀"
-    from_email = settings.EMAIL_HOST_USER
-    to_email = [user.email]
-
-    # Load the HTML template
-    html_content = render_to_string('emails/welcome_email.html', {'user': user})
-    
-    # Create the email
-    msg = EmailMultiAlternatives(subject, "Welcome to EduSphere!", from_email, to_email)
-    msg.attach_alternative(html_content, "text/html")
-    
+    # Goes to the mail queue (see core/mail.py), not straight to SMTP
     try:
-        msg.send()
-        print(f"✅ Welcome email sent to {user.email}")
-    except Exception as e:
-        print(f"❌ Failed to send welcome email: {e}")
\ No newline at end of file
+        build_welcome_email(user).send()
+        logger.info("Welcome email queued", extra={'event': 'welcome_email_queued', 'user_id': user.id})
+    except Exception:
+        logger.exception("Failed to queue welcome email", extra={'user_id': user.id})
+
+# --- /api/user/me/ cache invalidation ---
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_me_for_user(sender, instance, update_fields=None, **kwargs):
+    # A login only touches last_login, which isn't part of the payload
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_me(instance.pk)
+    # is_active may have changed (or the user is gone): re-check their tokens
+    forget_authz_version(instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_me_for_profile(sender, instance, **kwargs):
+    invalidate_me(instance.user_id)
+
+@receiver(post_save, sender=Organization)
+@receiver(pre_delete, sender=Organization)
+def invalidate_me_for_organization(sender, instance, **kwargs):
+    # pre_delete: after the delete, SET_NULL has already detached the members
+    member_ids = UserProfile.objects.filter(organization=instance).values_list('user_id', flat=True)
+    invalidate_me(*member_ids)
+
+# --- Delta sync tombstones ---
+
+@receiver(post_delete, sender=UserProfile)
+def record_staff_tombstone(sender, instance, **kwargs):
+    if instance.organization_id:
+        StaffTombstone.objects.create(organization_id=instance.organization_id, user_id=instance.user_id)
+
+# --- Dashboard counters (see core/stats.py) ---
+#
+# pre_* reads the member's stored state, post_* counts the new state; the
+# difference is written as a few F() updates. Keys whose delta is zero
+# (e.g. a role change leaves 'total' alone) are never written.
+
+COUNTED_PROFILE_FIELDS = {'organization', 'organization_id', 'role', 'department', 'department_id'}
+COUNTED_USER_FIELDS = {'is_active', 'last_login'}
+
+def _touches_fields(update_fields, counted):
+    return update_fields is None or bool(counted & set(update_fields))
+
+@receiver(pre_save, sender=UserProfile)
+def snapshot_profile_counters(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and instance.pk and _touches_fields(update_fields, COUNTED_PROFILE_FIELDS):
+        instance._counted_before = member_snapshot(pk=instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+def count_profile_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _touches_fields(update_fields, COUNTED_PROFILE_FIELDS):
+        return
+    before = instance.__dict__.pop('_counted_before', None)
+    deltas = Counter()
+    if before:
+        count_member(deltas, *before, sign=-1)
+    if instance.organization_id:
+        # Saving a profile never changes the user's status
+        status = before[3] if before else member_status(instance.user.is_active, instance.user.last_login)
+        count_member(deltas, instance.organization_id, instance.role, instance.department_id, status)
+    apply_deltas(deltas)
+
+@receiver(pre_delete, sender=UserProfile)
+def snapshot_deleted_profile(sender, instance, **kwargs):
+    # Before the collector deletes anything: the user row is still there to read
+    instance._counted_before = member_snapshot(pk=instance.pk)
+
+@receiver(post_delete, sender=UserProfile)
+def count_profile_delete(sender, instance, **kwargs):
+    before = instance.__dict__.pop('_counted_before', None)
+    if before:
+        deltas = Counter()
+        count_member(deltas, *before, sign=-1)
+        apply_deltas(deltas)
+
+# Replaces django.contrib.auth's receiver, which saves last_login without
+# saying what it was: a repeat login can't move a member between statuses,
+# so it needn't read their profile.
+user_logged_in.disconnect(update_last_login, dispatch_uid='update_last_login')
+
+@receiver(user_logged_in, dispatch_uid='update_last_login')
+def record_login(sender, user, **kwargs):
+    user._first_login = user.last_login is None
+    user.last_login = timezone.now()
+    user.save(update_fields=['last_login'])
+
+@receiver(pre_save, sender=User)
+def snapshot_user_counters(sender, instance, raw=False, update_fields=None, **kwargs):
+    # First login (invited -> active) and (de)activation move a member between statuses
+    first_login = instance.__dict__.pop('_first_login', True)
+    if raw or not instance.pk or not _touches_fields(update_fields, COUNTED_USER_FIELDS):
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'} and not first_login:
+        return
+    # Logins aren't served on a shard; the member's profile and counters may be on one
+    with member_context(instance.pk):
+        instance._counted_before = member_snapshot(user_id=instance.pk, organization__isnull=False)
+
+@receiver(post_save, sender=User)
+def count_user_status_change(sender, instance, **kwargs):
+    before = instance.__dict__.pop('_counted_before', None)
+    if not before:
+        return
+    deltas = Counter()
+    move_status(deltas, before, member_status(instance.is_active, instance.last_login))
+    with member_context(instance.pk):
+        apply_deltas(deltas)
+
+@receiver(pre_delete, sender=Department)
+def uncount_department(sender, instance, **kwargs):
+    # Its members are about to be SET_NULL by a bulk UPDATE, which sends no signals
+    counter = OrganizationCounter.objects.filter(
+        organization_id=instance.organization_id, dimension='department', key=str(instance.pk)
+    ).first()
+    if counter:
+        apply_deltas({(instance.organization_id, 'department', 'none'): counter.count})
+        counter.delete()
+
+# --- Department map invalidation (see core/departments.py) ---
+
+@receiver(post_save, sender=Department)
+def department_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    bump_config_version(instance.organization_id)
+    if not created and (update_fields is None or 'name' in update_fields):
+        # Roster rows show the department name: let delta sync clients refetch them
+        UserProfile.objects.filter(department=instance).update(updated_at=timezone.now())
+
+@receiver(pre_delete, sender=Department)
+def department_deleted(sender, instance, **kwargs):
+    # Before SET_NULL detaches the members, which doesn't touch updated_at
+    UserProfile.objects.filter(department=instance).update(updated_at=timezone.now())
+    bump_config_version(instance.organization_id)
+
+# --- Staff search index (see core/search.py) ---
+
+SEARCHED_PROFILE_FIELDS = {'organization', 'organization_id', 'department', 'department_id', 'designation'}
+SEARCHED_USER_FIELDS = {'first_name', 'last_name', 'email'}
+
+@receiver(post_save, sender=UserProfile)
+def reindex_profile(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and _touches_fields(update_fields, SEARCHED_PROFILE_FIELDS):
+        reindex_members([instance.user_id])
+
+@receiver(post_save, sender=User)
+def reindex_user(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # New users are indexed once ensure_profile_exists has given them a profile
+    if not raw and not created and _touches_fields(update_fields, SEARCHED_USER_FIELDS):
+        with member_context(instance.pk):
+            reindex_members([instance.pk])
+
+@receiver(post_save, sender=Department)
+def reindex_department_members(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw and not created and (update_fields is None or 'name' in update_fields):
+        reindex_members(UserProfile.objects.filter(department=instance).values_list('user_id', flat=True))
+
+@receiver(pre_delete, sender=Department)
+def remember_department_members(sender, instance, **kwargs):
+    instance._member_ids = list(UserProfile.objects.filter(department=instance).values_list('user_id', flat=True))
+
+@receiver(post_delete, sender=Department)
+def reindex_former_department_members(sender, instance, **kwargs):
+    # By now SET_NULL has detached them
+    reindex_members(instance.__dict__.pop('_member_ids', []))
+
+# --- Tenant shards (see core/sharding.py) ---
+
+@receiver(pre_save, sender=Organization)
+def allocate_organization(sender, instance, raw=False, using=None, **kwargs):
+    # Ids come from the directory, so they are unique across shards
+    if not raw and instance.pk is None:
+        instance.pk = allocate_organization_id(using)
+
+@receiver(post_delete, sender=Organization)
+def release_organization(sender, instance, using=None, **kwargs):
+    ShardAssignment.objects.using(DIRECTORY).filter(pk=instance.pk, alias=using).delete()
+    forget_shard(instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+def register_sharded_member(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    # Lets logins and token refreshes, which carry no tenant claims, find the member's shard
+    if not raw and using != DIRECTORY and instance.organization_id and (
+        update_fields is None or 'organization' in update_fields
+    ):
+        register_members(instance.organization_id, [instance.user_id])
+
+@receiver(pre_delete, sender=User)
+def find_mirrored_user(sender, instance, using=None, **kwargs):
+    # Looked up now: the cascade is about to delete the user's ShardedMember row
+    if using == DIRECTORY and sharding_enabled():
+        instance._mirror_shard = member_db(instance.pk)
+
+@receiver(post_delete, sender=User)
+def delete_mirrored_user(sender, instance, using=None, **kwargs):
+    alias = instance.__dict__.pop('_mirror_shard', DIRECTORY)
+    if using == DIRECTORY and alias != DIRECTORY:
+        # A regular delete, so the profile's signals (counters, tombstone) run on the shard
+        with use_shard(alias):
+            User.objects.using(alias).filter(pk=instance.pk).delete()
@@ -0,0 +1,453 @@
+# backend/core/staff.py
+
+import json
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.mail import get_connection
+from django.core.validators import validate_email
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from core.authentication import forget_authz_version
+from core.cache import invalidate_me
+from core.mail import build_invite_emails
+from core.models import OutboundEmail, StaffTombstone, UserProfile
+from core.permissions import merge_permissions
+from core.search import reindex_members, search_members
+from core.sharding import DIRECTORY, mirror_users, register_members, tenant_atomic, tenant_db, update_users
+from core.stats import apply_deltas, count_members, member_status, move_status, snapshot_members
+
+# ?status= values: deactivated accounts, otherwise "has this user ever logged in?"
+STATUS_FILTERS = {
+    'active': Q(user__is_active=True, user__last_login__isnull=False),
+    'invited': Q(user__is_active=True, user__last_login__isnull=True),
+    'deactivated': Q(user__is_active=False),
+}
+
+
+def staff_queryset(organization_id):
+    """
+    Base roster query for one organization.
+    User is joined in, so listing a page is a single query; department names
+    come from the in-process department map (pass it to StaffMemberSerializer
+    as context={'departments': department_map(org_id)}).
+    The delivery state of each member's latest email rides along as a subquery,
+    except on a shard, where the outbox isn't (see attach_email_status()).
+    """
+    if organization_id is None:
+        # filter(organization_id=None) would match every org-less profile
+        return UserProfile.objects.none()
+    members = UserProfile.objects.filter(organization_id=organization_id).select_related('user')
+    if tenant_db() != DIRECTORY:
+        return members
+    latest_mail_status = (
+        OutboundEmail.objects
+        .filter(to_email=OuterRef('user__email'))
+        .order_by('-id')
+        .values('status')[:1]
+    )
+    return members.annotate(email_status=Subquery(latest_mail_status))
+
+
+def attach_email_status(members):
+    """
+    Sets email_status on a page of staff_queryset() rows served from a shard,
+    with one query against the outbox in the directory. Returns `members`.
+    """
+    members = list(members)
+    if tenant_db() == DIRECTORY or not members:
+        return members
+    latest = {}
+    for email, mail_status in (
+        OutboundEmail.objects.using(DIRECTORY)
+        .filter(to_email__in={m.user.email for m in members})
+        .order_by('id').values_list('to_email', 'status')
+    ):
+        latest[email] = mail_status
+    for member in members:
+        member.email_status = latest.get(member.user.email)
+    return members
+
+
+def apply_staff_filters(queryset, params, organization_id=None):
+    """
+    Narrows a roster queryset using ?role=, ?status=, ?department= and
+    ?q= (search; needs the queryset's `organization_id`).
+    Raises ValueError with a readable message on bad input.
+    """
+    role = params.get('role')
+    if role:
+        roles = [r.strip().upper() for r in role.split(',') if r.strip()]
+        valid_roles = {code for code, _ in UserProfile.ROLE_CHOICES}
+        unknown = [r for r in roles if r not in valid_roles]
+        if unknown:
+            raise ValueError(f"Unknown role: {', '.join(unknown)}")
+        queryset = queryset.filter(role__in=roles)
+
+    status_param = params.get('status')
+    if status_param:
+        key = status_param.strip().lower()
+        if key not in STATUS_FILTERS:
+            raise ValueError("Status must be 'Active', 'Invited' or 'Deactivated'")
+        queryset = queryset.filter(STATUS_FILTERS[key])
+
+    department = params.get('department')
+    if department:
+        if department.lower() == 'none':
+            queryset = queryset.filter(department__isnull=True)
+        else:
+            try:
+                queryset = queryset.filter(department_id=int(department))
+            except ValueError:
+                raise ValueError("Department must be an id or 'none'")
+
+    query = params.get('q')
+    if query and organization_id is not None:
+        queryset = search_members(queryset, query, organization_id)
+
+    return queryset
+
+
+# --- Delta Sync ---
+
+# Re-send anything touched this long before the cursor: a transaction that
+# started before the cursor may commit after it. Clients upsert by id, so repeats are harmless.
+DELTA_OVERLAP = timedelta(seconds=5)
+DELTA_MAX_ROWS = 1000
+
+
+def staff_changes(organization_id, since):
+    """
+    Members created/updated (including first login) and removed since `since`.
+    Returns (updated_members, deleted_user_ids, reset). `reset` is True when too
+    much changed for a delta to be worthwhile; the client should reload the list.
+    """
+    window_start = since - DELTA_OVERLAP
+    updated = list(
+        staff_queryset(organization_id)
+        .filter(Q(updated_at__gte=window_start) | Q(user__last_login__gte=window_start))
+        .order_by('id')[:DELTA_MAX_ROWS + 1]
+    )
+    if len(updated) > DELTA_MAX_ROWS:
+        return [], [], True
+
+    deleted = list(
+        StaffTombstone.objects
+        .filter(organization_id=organization_id, deleted_at__gte=window_start)
+        .values_list('user_id', flat=True)
+    )
+    # Never report a member as both live and deleted
+    live_ids = {m.user_id for m in updated}
+    return updated, [uid for uid in deleted if uid not in live_ids], False
+
+
+def new_sync_cursor():
+    return timezone.now()
+
+
+# --- Bulk Invites ---
+
+BULK_INVITE_CHUNK_SIZE = 500
+BULK_INVITE_MAX_ROWS = 10000
+INVITABLE_ROLES = {'ORG_ADMIN', 'STAFF', 'STUDENT'}
+INVITE_ROW_FIELDS = ('email', 'role', 'first_name', 'last_name')
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bulk_invite(rows, organization, sender_name, chunk_size=BULK_INVITE_CHUNK_SIZE):
+    """
+    Invites many people at once.
+    `rows` is any iterable of dicts with 'email' and optional 'role',
+    'first_name', 'last_name' (e.g. a csv.DictReader), consumed lazily.
+
+    Per chunk: one query to find emails that already exist, one bulk INSERT
+    for users, one to read back their ids, one bulk INSERT for profiles and
+    one for the queued invite mails, all in a single transaction.
+    Returns a list of {'row', 'email', 'status', 'detail'} dicts.
+    """
+    report = []
+    seen = set()
+
+    # Read one row past the limit so we can tell the caller it was hit
+    numbered = enumerate(islice(rows, BULK_INVITE_MAX_ROWS + 1), start=1)
+    for chunk in _chunks(numbered, chunk_size):
+        candidates = []
+        for row_number, row in chunk:
+            if row_number > BULK_INVITE_MAX_ROWS:
+                report.append({"row": row_number, "email": None, "status": "error",
+                               "detail": f"Limit of {BULK_INVITE_MAX_ROWS} rows reached; "
+                                         "the rest of the upload was not read"})
+                continue
+            entry = _clean_invite_row(row)
+            email = entry.get('email') or None
+            if 'error' in entry:
+                report.append({"row": row_number, "email": email, "status": "error",
+                               "detail": entry['error']})
+            elif email in seen:
+                report.append({"row": row_number, "email": email, "status": "skipped",
+                               "detail": "Duplicate in upload"})
+            else:
+                seen.add(email)
+                candidates.append((row_number, entry))
+
+        if candidates:
+            report.extend(_invite_chunk(candidates, organization, sender_name))
+
+    report.sort(key=lambda r: r['row'])
+    return report
+
+
+def _clean_invite_row(row):
+    if isinstance(row, str):
+        row = {'email': row}
+    if not isinstance(row, dict):
+        return {'error': "Row must be an object or an email string"}
+    for field in INVITE_ROW_FIELDS:
+        if row.get(field) is not None and not isinstance(row[field], str):
+            return {'error': f"'{field}' must be a string"}
+
+    email = (row.get('email') or '').strip().lower()
+    role = (row.get('role') or 'STAFF').strip().upper()
+    entry = {
+        'email': email,
+        'role': role,
+        'first_name': (row.get('first_name') or '').strip()[:150],
+        'last_name': (row.get('last_name') or '').strip()[:150],
+    }
+    try:
+        validate_email(email)
+    except DjangoValidationError:
+        entry['error'] = "Invalid email address"
+        return entry
+    if role not in INVITABLE_ROLES:
+        entry['error'] = f"Unknown role: {role}"
+    return entry
+
+
+def _invite_chunk(candidates, organization, sender_name):
+    emails = [entry['email'] for _, entry in candidates]
+    report = []
+
+    with tenant_atomic():
+        # 1. One set-based existence check for the whole chunk (against the directory,
+        #    not a shard's mirror, which only has that shard's members)
+        existing = set()
+        for email, username in User.objects.using(DIRECTORY).filter(
+            Q(email__in=emails) | Q(username__in=emails)
+        ).values_list('email', 'username'):
+            existing.add(email.lower())
+            existing.add(username.lower())
+
+        fresh = []
+        for row_number, entry in candidates:
+            if entry['email'] in existing:
+                report.append({"row": row_number, "email": entry['email'],
+                               "status": "skipped", "detail": "User already exists"})
+            else:
+                fresh.append((row_number, entry))
+        if not fresh:
+            return report
+
+        # 2. Users (no post_save signals fire for bulk_create)
+        unusable = make_password(None)
+        User.objects.bulk_create([
+            User(username=entry['email'], email=entry['email'], password=unusable,
+                 first_name=entry['first_name'], last_name=entry['last_name'])
+            for _, entry in fresh
+        ])
+        # MySQL does not return ids from bulk INSERT, so read them back
+        user_ids = dict(User.objects.using(DIRECTORY).filter(
+            username__in=[entry['email'] for _, entry in fresh]
+        ).values_list('username', 'id'))
+        mirror_users(tenant_db(), user_ids.values())
+
+        # 3. Profiles
+        UserProfile.objects.bulk_create([
+            UserProfile(user_id=user_ids[entry['email']], organization=organization,
+                        role=entry['role'], is_setup_complete=True)
+            for _, entry in fresh
+        ])
+        register_members(organization.id, user_ids.values())
+        apply_deltas(count_members((organization.id, entry['role'], None, 'invited') for _, entry in fresh))
+        reindex_members(user_ids.values())
+
+        # 4. Invite mails: one send_messages() call = one bulk INSERT into the outbox
+        get_connection().send_messages(build_invite_emails(
+            [(entry['email'], entry['role']) for _, entry in fresh], organization.name, sender_name
+        ))
+
+    for row_number, entry in fresh:
+        report.append({"row": row_number, "email": entry['email'], "status": "invited",
+                       "detail": None, "id": user_ids[entry['email']]})
+    return report
+
+
+# --- Bulk Updates ---
+
+BULK_UPDATE_CHUNK_SIZE = 1000
+
+
+def bulk_update_members(members, role=None, permissions_patch=None):
+    """
+    Applies a new role and/or a permissions merge patch to every profile in
+    `members` (an organization-scoped UserProfile queryset).
+    Only rows that actually change are written: the role as one UPDATE, the
+    permissions as one UPDATE per distinct resulting document (usually one),
+    all in a single transaction. Returns (matched, updated).
+    """
+    now = timezone.now()
+    changed = set()
+
+    with tenant_atomic():
+        # Locked so a concurrent patch can't be lost between read and write
+        rows = list(members.select_for_update().values_list('user_id', 'organization_id', 'role', 'permissions'))
+
+        if role is not None:
+            user_ids, deltas = [], Counter()
+            for uid, org_id, current, _ in rows:
+                if current != role:
+                    user_ids.append(uid)
+                    deltas[(org_id, 'role', current)] -= 1
+                    deltas[(org_id, 'role', role)] += 1
+            _update_profiles(user_ids, now, role=role)
+            apply_deltas(deltas)
+            changed.update(user_ids)
+
+        if permissions_patch:
+            by_document = defaultdict(list)
+            for uid, _, _, document in rows:
+                merged = merge_permissions(document, permissions_patch)
+                if merged != document:
+                    by_document[json.dumps(merged, sort_keys=True)].append(uid)
+            for document, user_ids in by_document.items():
+                _update_profiles(user_ids, now, permissions=json.loads(document))
+                changed.update(user_ids)
+
+        if changed:
+            # .update() skips the post_save signals that normally clear these
+            user_ids = sorted(changed)
+            transaction.on_commit(lambda: (invalidate_me(*user_ids), forget_authz_version(*user_ids)))
+
+    return len(rows), len(changed)
+
+
+def _update_profiles(user_ids, now, **fields):
+    """ Set-based UPDATE that also bumps updated_at (delta sync) and authz_version (tokens). """
+    for chunk in _chunks(user_ids, BULK_UPDATE_CHUNK_SIZE):
+        UserProfile.objects.filter(user_id__in=chunk).update(
+            updated_at=now, authz_version=F('authz_version') + 1, **fields
+        )
+
+
+# --- Bulk Removal ---
+
+def remove_members(members, deactivate=False):
+    """
+    Deletes (or deactivates) the users behind `members`, an organization-scoped
+    UserProfile queryset. Membership is resolved with one query; the work is
+    then done per chunk of ids with set-based statements:
+      - deactivate: one UPDATE of auth_user.is_active (reversible)
+      - delete: one DELETE per related table, children first, via subqueries,
+        instead of Django's collector loading every related row.
+    Returns the list of affected user ids.
+    """
+    # Each member's counted state, for the dashboard counters and tombstones
+    snapshots = snapshot_members(members.filter(user__is_superuser=False))
+    user_ids = list(snapshots)
+    now = timezone.now()
+
+    for chunk in _chunks(user_ids, BULK_UPDATE_CHUNK_SIZE):
+        with tenant_atomic():
+            if deactivate:
+                update_users(chunk, is_active=False)
+                # Shows up in delta sync; outstanding tokens must be re-checked
+                _update_profiles(chunk, now)
+                deltas = Counter()
+                for uid in chunk:
+                    move_status(deltas, snapshots[uid], 'deactivated')
+                apply_deltas(deltas)
+            else:
+                # What the post_delete signals would have recorded
+                StaffTombstone.objects.bulk_create([
+                    StaffTombstone(organization_id=snapshots[uid][0], user_id=uid, deleted_at=now)
+                    for uid in chunk if snapshots[uid][0]
+                ])
+                _cascade_delete(User, User.objects.using(DIRECTORY).filter(id__in=chunk))
+                if tenant_db() != DIRECTORY:
+                    # The shard's mirror, and the profiles and search terms hanging off it
+                    _cascade_delete(User, User.objects.using(tenant_db()).filter(id__in=chunk))
+                apply_deltas(count_members((snapshots[uid] for uid in chunk), sign=-1))
+            transaction.on_commit(lambda chunk=chunk: (invalidate_me(*chunk), forget_authz_version(*chunk)))
+
+    return user_ids
+
+
+def reactivate_members(members):
+    """ Undoes remove_members(deactivate=True). Returns the affected user ids. """
+    rows = list(members.filter(user__is_active=False).values_list('user_id', 'organization_id', 'user__last_login'))
+    user_ids = [uid for uid, _, _ in rows]
+    now = timezone.now()
+    for chunk in _chunks(rows, BULK_UPDATE_CHUNK_SIZE):
+        chunk_ids = [uid for uid, _, _ in chunk]
+        with tenant_atomic():
+            update_users(chunk_ids, is_active=True)
+            _update_profiles(chunk_ids, now)
+            deltas = Counter()
+            for _, org_id, last_login in chunk:
+                move_status(deltas, (org_id, None, None, 'deactivated'), member_status(True, last_login))
+            apply_deltas(deltas)
+            transaction.on_commit(lambda ids=chunk_ids: (invalidate_me(*ids), forget_authz_version(*ids)))
+    return user_ids
+
+
+def _cascade_delete(model, queryset):
+    """
+    DELETE `queryset` and everything that cascades from it with one statement
+    per table, all on the queryset's database. Related rows are matched with subqueries and never loaded, so
+    no signals fire; callers do the signal work themselves.
+    """
+    for relation in model._meta.related_objects:
+        related_model, field = relation.related_model, relation.field
+        if relation.many_to_many:
+            # Another model's ManyToManyField to us: clear its auto-created through rows
+            if relation.through._meta.auto_created:
+                links = relation.through._base_manager.using(queryset.db).filter(
+                    **{f"{field.m2m_reverse_field_name()}__in": queryset}
+                )
+                links._raw_delete(links.db)
+            continue
+        children = related_model._base_manager.using(queryset.db).filter(**{f"{field.name}__in": queryset})
+        if relation.on_delete is models.CASCADE:
+            _cascade_delete(related_model, children)
+        elif relation.on_delete is models.SET_NULL:
+            children.update(**{field.name: None})
+        elif relation.on_delete is not models.DO_NOTHING:
+            raise ValueError(
+                f"Can't bulk delete {model.__name__}: "
+                f"{related_model.__name__}.{field.name} uses {relation.on_delete.__name__}"
+            )
+
+    # Forward many-to-many fields (e.g. User.groups) keep their rows in auto-created through tables
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        if through._meta.auto_created:
+            through_rows = through._base_manager.using(queryset.db).filter(**{f"{field.m2m_field_name()}__in": queryset})
+            through_rows._raw_delete(through_rows.db)
+
+    queryset._raw_delete(queryset.db)
@@ -0,0 +1,197 @@
+# backend/core/stats.py
+#
+# Dashboard headcounts (by role, status and department) come from
+# OrganizationCounter rows instead of counting the roster on every load.
+# Signals keep them up to date one member at a time; the bulk staff
+# operations (which bypass signals) adjust them with set-based statements.
+# 'recompute_org_stats' rebuilds them from the source tables to repair drift.
+
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, Q
+
+from core.departments import department_map
+from core.models import OrganizationCounter, UserProfile
+from core.sharding import tenant_atomic
+
+# One counter per (dimension, key); 'total' has a single key
+TOTAL = ('total', '')
+STATUSES = ('active', 'invited', 'deactivated')
+
+
+def member_status(is_active, last_login):
+    """ Same buckets as the roster's ?status= filter and its 'status' column. """
+    if not is_active:
+        return 'deactivated'
+    return 'active' if last_login else 'invited'
+
+
+def member_keys(role, department_id, status):
+    """ Every counter a member with this role/department/status contributes to. """
+    return [
+        TOTAL,
+        ('role', role),
+        ('status', status),
+        ('department', str(department_id) if department_id else 'none'),
+    ]
+
+
+def count_member(deltas, organization_id, role, department_id, status, sign=1):
+    """ Adds (sign=1) or removes (sign=-1) one member in a Counter of pending deltas. """
+    if organization_id:
+        for dimension, key in member_keys(role, department_id, status):
+            deltas[(organization_id, dimension, key)] += sign
+
+
+def apply_deltas(deltas):
+    """
+    Writes a Counter of {(organization_id, dimension, key): delta}.
+    Missing rows are created in one INSERT (conflicts ignored), then one
+    UPDATE ... SET count = count + delta per distinct delta value, so a whole
+    bulk operation costs a handful of statements whatever its size.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    OrganizationCounter.objects.bulk_create([
+        OrganizationCounter(organization_id=org_id, dimension=dimension, key=key, count=0)
+        for org_id, dimension, key in deltas
+    ], ignore_conflicts=True)
+
+    by_delta = defaultdict(list)
+    for key, delta in deltas.items():
+        by_delta[delta].append(key)
+    for delta, keys in by_delta.items():
+        match = Q()
+        for org_id, dimension, key in keys:
+            match |= Q(organization_id=org_id, dimension=dimension, key=key)
+        OrganizationCounter.objects.filter(match).update(count=F('count') + delta)
+
+
+def member_snapshot(**lookup):
+    """
+    (organization_id, role, department_id, status) of one stored profile, or
+    None. Read before a change so the old buckets can be decremented.
+    """
+    row = (
+        UserProfile.objects.filter(**lookup)
+        .values_list('organization_id', 'role', 'department_id', 'user__is_active', 'user__last_login')
+        .first()
+    )
+    if row is None:
+        return None
+    org_id, role, department_id, is_active, last_login = row
+    return org_id, role, department_id, member_status(is_active, last_login)
+
+
+def snapshot_members(queryset):
+    """ member_snapshot() for every profile in a queryset, in one query: {user_id: snapshot}. """
+    rows = queryset.values_list(
+        'user_id', 'organization_id', 'role', 'department_id', 'user__is_active', 'user__last_login'
+    )
+    return {
+        uid: (org_id, role, department_id, member_status(is_active, last_login))
+        for uid, org_id, role, department_id, is_active, last_login in rows
+    }
+
+
+def move_status(deltas, snapshot, status):
+    """ Moves a member (as snapshotted) from its old status bucket to `status`. """
+    org_id, _, _, old_status = snapshot
+    if org_id and status != old_status:
+        deltas[(org_id, 'status', old_status)] -= 1
+        deltas[(org_id, 'status', status)] += 1
+
+
+def count_members(snapshots, sign=1):
+    """ Counter of deltas that adds (or removes) every snapshot. """
+    deltas = Counter()
+    for org_id, role, department_id, status in snapshots:
+        count_member(deltas, org_id, role, department_id, status, sign)
+    return deltas
+
+
+# --- Reads ---
+
+def organization_stats(organization_id):
+    """
+    Dashboard payload for one organization: one query for the counters
+    (department names come from the department map), independent of how
+    many members there are.
+    """
+    counts = defaultdict(dict)
+    for dimension, key, count in OrganizationCounter.objects.filter(
+        organization_id=organization_id
+    ).values_list('dimension', 'key', 'count'):
+        counts[dimension][key] = count
+
+    departments = counts['department']
+    return {
+        "total": counts[TOTAL[0]].get(TOTAL[1], 0),
+        "by_role": {code: counts['role'].get(code, 0) for code, _ in UserProfile.ROLE_CHOICES},
+        "by_status": {key: counts['status'].get(key, 0) for key in STATUSES},
+        "departments": [
+            {"id": department.id, "name": department.name, "count": departments.get(str(department.id), 0)}
+            for department in department_map(organization_id).values()
+        ],
+        "unassigned": departments.get('none', 0),
+    }
+
+
+# --- Reconciliation ---
+
+def compute_counters(organization_id):
+    """ Counts straight from the roster: {(dimension, key): count}. """
+    # Imported here: core.staff imports this module
+    from core.staff import STATUS_FILTERS
+
+    members = UserProfile.objects.filter(organization_id=organization_id)
+    counts = Counter()
+
+    by_status = members.aggregate(
+        **{key: Count('id', filter=condition) for key, condition in STATUS_FILTERS.items()}
+    )
+    for key, n in by_status.items():
+        counts[TOTAL] += n
+        counts[('status', key)] = n
+    for role, n in members.values('role').annotate(n=Count('id')).values_list('role', 'n').order_by():
+        counts[('role', role)] = n
+    for department_id, n in (
+        members.values('department_id').annotate(n=Count('id')).values_list('department_id', 'n').order_by()
+    ):
+        counts[('department', str(department_id) if department_id else 'none')] = n
+    return counts
+
+
+def recompute_organization(organization_id):
+    """
+    Rebuilds one organization's counters from the source tables.
+    Existing rows are locked first and corrected in place, so a concurrent
+    incremental update either lands before the recount or waits and applies
+    on top of it. Returns {(dimension, key): (stored, actual)} for every
+    counter that had drifted.
+    """
+    with tenant_atomic():
+        stored = {
+            (row.dimension, row.key): row
+            for row in OrganizationCounter.objects.select_for_update().filter(organization_id=organization_id)
+        }
+        actual = compute_counters(organization_id)
+
+        drift, changed, missing = {}, [], []
+        for key in stored.keys() | actual.keys():
+            row, count = stored.get(key), actual.get(key, 0)
+            if row is None:
+                missing.append(OrganizationCounter(
+                    organization_id=organization_id, dimension=key[0], key=key[1], count=count
+                ))
+                drift[key] = (0, count)
+            elif row.count != count:
+                drift[key] = (row.count, count)
+                row.count = count
+                changed.append(row)
+
+        OrganizationCounter.objects.bulk_update(changed, ['count'])
+        OrganizationCounter.objects.bulk_create(missing, ignore_conflicts=True)
+    return drift
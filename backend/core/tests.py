@@ -0,0 +1,360 @@
+import time
+import tracemalloc
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.db import connection
+from django.db.models import F
+from django.test import AsyncClient, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.authentication import TenantRefreshToken
+from core.departments import department_map
+from core.mail import QueuedEmailBackend, send_queued_mail
+from core.models import Organization, OrganizationCounter, OutboundEmail, UserProfile
+from core.ratelimit import buckets
+from core.stats import member_snapshot, recompute_organization
+
+
+def make_member(email, org=None, role='STAFF', password=None):
+    """ A user with an organization; the profile itself comes from the post_save signal. """
+    user = User.objects.create_user(username=email, email=email, password=password)
+    UserProfile.objects.filter(user=user).update(organization=org, role=role, is_setup_complete=True)
+    return User.objects.select_related('profile').get(pk=user.pk)
+
+
+def make_organization(name, members):
+    """ An organization with an admin and `members` staff; returns the admin. """
+    org = Organization.objects.create(name=name)
+    admin = make_member(f"admin@{name}.example", org, role='ORG_ADMIN')
+    for i in range(members):
+        make_member(f"member{i}@{name}.example", org)
+    return admin
+
+
+def add_members(org, count, prefix):
+    """ `count` staff in bulk, without the per-user signals; for tests that need volume. """
+    users = User.objects.bulk_create(
+        User(username=f"{prefix}{i}@{org.name}.example", email=f"{prefix}{i}@{org.name}.example")
+        for i in range(count)
+    )
+    UserProfile.objects.bulk_create(
+        (UserProfile(user=user, organization=org, role='STAFF', is_setup_complete=True) for user in users),
+        batch_size=5000,
+    )
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {TenantRefreshToken.for_user(user).access_token}")
+    return client
+
+
+# Organization ids come back after each rollback; don't inherit another test's department maps
+@mock.patch.dict('core.departments._maps', clear=True)
+class StaffRosterTests(TestCase):
+
+    def count_queries(self, client, path):
+        # Starts from a cold cache; each organization's department map stays in process once built
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(captured), response
+
+    def test_page_query_count_does_not_grow_with_the_organization(self):
+        small = client_for(make_organization('small', members=3))
+        large = client_for(make_organization('large', members=60))
+
+        expected, _ = self.count_queries(small, '/api/staff/?page_size=25')
+        cache.clear()
+        with self.assertNumQueries(expected):
+            response = large.get('/api/staff/?page_size=25')
+        self.assertEqual(len(response.data['results']), 25)
+
+        # A later page costs the same as the first
+        first_page, _ = self.count_queries(large, '/api/staff/?page_size=25')
+        cache.clear()
+        with self.assertNumQueries(first_page):
+            response = large.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_invalid_cursor_is_a_client_error(self):
+        admin = make_organization('cursor', members=1)
+        response = client_for(admin).get('/api/staff/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['detail'], "Invalid cursor")
+
+
+class BulkInviteTests(TestCase):
+
+    def test_non_string_values_are_reported_per_row(self):
+        admin = make_organization('bulk', members=0)
+        response = client_for(admin).post('/api/staff/bulk-invite/', [
+            {"email": 123},
+            {"email": "new@bulk.example", "first_name": ["x"]},
+            {"email": "ok@bulk.example", "role": "staff"},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        report = {row['row']: row for row in response.data['results']}
+        self.assertEqual(report[1]['status'], 'error')
+        self.assertEqual(report[2]['status'], 'error')
+        self.assertEqual(report[3]['status'], 'invited')
+        self.assertTrue(User.objects.filter(email='ok@bulk.example').exists())
+
+
+
+class AsyncInviteTests(TestCase):
+
+    def setUp(self):
+        admin = make_organization('async', members=0)
+        self.client = client_for(admin)
+        self.headers = {'Authorization': f"Bearer {TenantRefreshToken.for_user(admin).access_token}"}
+
+    async def test_invited_member_is_searchable(self):
+        response = await AsyncClient().post(
+            '/api/async/staff/', {'email': 'zelda.quinn@async.example', 'role': 'STUDENT'},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = await sync_to_async(self.client.get)('/api/staff/search/?q=zelda')
+        self.assertEqual([member['email'] for member in response.data['results']], ['zelda.quinn@async.example'])
+
+    async def test_only_invitable_roles_are_accepted(self):
+        for role in ('NOPE', 'SUPER_ADMIN', ['STAFF']):
+            response = await AsyncClient().post(
+                '/api/async/staff/', {'email': 'role@async.example', 'role': role},
+                content_type='application/json', headers=self.headers,
+            )
+            self.assertEqual(response.status_code, 400, role)
+        self.assertFalse(await User.objects.filter(email='role@async.example').aexists())
+
+
+class LoginCounterTests(TestCase):
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="login")
+        make_member('login@login.example', self.org, password='pw')
+        recompute_organization(self.org.id)
+
+    def login(self):
+        # Not the throttle under test
+        buckets.clear()
+        response = APIClient().post('/api/auth/login/', {'email': 'login@login.example', 'password': 'pw'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def statuses(self):
+        return dict(OrganizationCounter.objects.filter(
+            organization=self.org, dimension='status',
+        ).values_list('key', 'count'))
+
+    def test_only_the_first_login_reads_the_member_for_the_counters(self):
+        with mock.patch('core.signals.member_snapshot', wraps=member_snapshot) as snapshot:
+            self.login()
+            self.assertEqual(snapshot.call_count, 1)
+            self.assertEqual(self.statuses(), {'invited': 0, 'active': 1, 'deactivated': 0})
+
+            self.login()
+            self.assertEqual(snapshot.call_count, 1)
+            self.assertEqual(self.statuses(), {'invited': 0, 'active': 1, 'deactivated': 0})
+
+
+class LoginWriteTests(TestCase):
+
+    def test_login_issues_exactly_one_update(self):
+        org = Organization.objects.create(name="writes")
+        make_member('writes@writes.example', org, password='pw')
+        client = APIClient()
+
+        for attempt in ('first', 'repeat'):
+            buckets.clear()
+            with CaptureQueriesContext(connection) as captured:
+                response = client.post('/api/auth/login/', {
+                    'email': 'writes@writes.example', 'password': 'pw',
+                }, format='json')
+            self.assertEqual(response.status_code, 200)
+            # The session row and the dashboard counters are written by their own apps
+            updates = [
+                query['sql'] for query in captured.captured_queries
+                if query['sql'].startswith('UPDATE') and 'django_session' not in query['sql']
+                and 'core_organizationcounter' not in query['sql']
+            ]
+            self.assertEqual(len(updates), 1, f"{attempt} login: {updates}")
+            self.assertIn('"auth_user"', updates[0])
+            self.assertFalse(any(
+                query['sql'].startswith(('INSERT', 'UPDATE')) and 'core_userprofile' in query['sql']
+                for query in captured.captured_queries
+            ))
+
+
+
+class LoginThrottleTests(TestCase):
+
+    def login(self, password, address):
+        return APIClient().post('/api/auth/login/', {
+            'email': 'target@throttle.example', 'password': password,
+        }, format='json', REMOTE_ADDR=address)
+
+    def test_guesses_from_elsewhere_do_not_lock_the_member_out(self):
+        make_member('target@throttle.example', Organization.objects.create(name="throttle"), password='pw')
+        buckets.clear()
+        for _ in range(5):
+            self.assertEqual(self.login('wrong', '203.0.113.9').status_code, 400)
+        self.assertEqual(self.login('wrong', '203.0.113.9').status_code, 429)
+        self.assertEqual(self.login('pw', '198.51.100.7').status_code, 200)
+
+    def test_guesses_spread_over_many_addresses_are_capped(self):
+        make_member('target@throttle.example', Organization.objects.create(name="throttle"), password='pw')
+        buckets.clear()
+        burst, _ = settings.AUTH_RATE_LIMITS['account_global']
+        for i in range(burst):
+            self.assertEqual(self.login('wrong', f'203.0.{i // 250}.{i % 250 + 1}').status_code, 400)
+        self.assertEqual(self.login('wrong', '198.51.100.200').status_code, 429)
+
+class StaleVersionTests(TestCase):
+
+    @override_settings(VERSION_CACHE_TIMEOUT=5)
+    def test_a_bump_this_worker_did_not_see_expires_with_the_timeout(self):
+        admin = make_organization('claims', members=0)
+        client = client_for(admin)
+        cache.clear()
+        self.assertEqual(client.get('/api/staff/').status_code, 200)
+
+        # Bumped by another worker: the delete never reached this process's cache
+        UserProfile.objects.filter(user=admin).update(authz_version=F('authz_version') + 1)
+        self.assertEqual(client.get('/api/staff/').status_code, 200)
+
+        later = time.time() + 6
+        with mock.patch('time.time', return_value=later):
+            response = client.get('/api/staff/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'token_stale')
+
+    @override_settings(VERSION_CACHE_TIMEOUT=5)
+    @mock.patch.dict('core.departments._maps', clear=True)
+    def test_a_department_change_on_another_worker_expires_with_the_timeout(self):
+        org = Organization.objects.create(name="departments", department_defaults={'shift': 'day'})
+        cache.clear()
+        self.assertEqual(department_map(org.id).defaults, {'shift': 'day'})
+
+        Organization.objects.filter(pk=org.pk).update(
+            config_version=F('config_version') + 1, department_defaults={'shift': 'night'},
+        )
+        self.assertEqual(department_map(org.id).defaults, {'shift': 'day'})
+
+        later = time.time() + 6
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(department_map(org.id).defaults, {'shift': 'night'})
+
+    @override_settings(VERSION_CACHE_TIMEOUT=5)
+    def test_a_current_user_payload_cached_before_a_change_expires_with_the_timeout(self):
+        admin = make_organization('me', members=0)
+        UserProfile.objects.filter(user=admin).update(is_setup_complete=False)
+        client = client_for(admin)
+        cache.clear()
+        self.assertFalse(client.get('/api/user/me/').data['is_setup_complete'])
+
+        # Completed through another worker, whose invalidation this one never saw
+        UserProfile.objects.filter(user=admin).update(is_setup_complete=True)
+        later = time.time() + 6
+        with mock.patch('time.time', return_value=later):
+            self.assertTrue(client.get('/api/user/me/').data['is_setup_complete'])
+
+
+class FlakyEmailBackend(LocmemEmailBackend):
+    """ Refuses mail to anyone at bounce.example. """
+
+    def send_messages(self, messages):
+        if any(to.endswith('@bounce.example') for message in messages for to in message.to):
+            raise OSError("550 mailbox unavailable")
+        return super().send_messages(messages)
+
+
+class MailQueueTests(TestCase):
+
+    def queue(self, *recipients):
+        QueuedEmailBackend().send_messages([EmailMessage("Hi", "Body", "from@example.com", [to]) for to in recipients])
+
+    def test_each_message_is_marked_on_its_own(self):
+        self.queue('a@example.com', 'b@bounce.example', 'c@example.com')
+        sent, failed = send_queued_mail(get_connection('core.tests.FlakyEmailBackend'))
+        self.assertEqual((sent, failed), (2, 1))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(dict(OutboundEmail.objects.values_list('to_email', 'status')), {
+            'a@example.com': 'SENT', 'b@bounce.example': 'RETRYING', 'c@example.com': 'SENT',
+        })
+        # Retried later, not picked up again by the next batch
+        self.assertEqual(send_queued_mail(get_connection('core.tests.FlakyEmailBackend')), (0, 0))
+
+    def test_retry_policy_is_read_when_sending(self):
+        self.queue('d@bounce.example')
+        with self.settings(MAIL_QUEUE_MAX_ATTEMPTS=1):
+            send_queued_mail(get_connection('core.tests.FlakyEmailBackend'))
+        row = OutboundEmail.objects.get()
+        self.assertEqual((row.status, row.attempts), ('DEAD', 1))
+
+
+@tag('slow')
+class ExportMemoryTests(TestCase):
+
+    def export_peak(self, client):
+        """ Peak traced allocation, in bytes, while the whole CSV export is read; plus its size. """
+        response = client.get('/api/staff/export/?type=csv')
+        self.assertEqual(response.status_code, 200)
+        size = 0
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                size += len(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, size
+
+    def test_memory_stays_flat_as_the_roster_grows(self):
+        admin = make_organization('export', members=0)
+        org = admin.profile.organization
+        client = client_for(admin)
+
+        add_members(org, 20_000, 'small')
+        small_peak, small_size = self.export_peak(client)
+        add_members(org, 180_000, 'large')
+        peak, size = self.export_peak(client)
+
+        # Ten times the rows in about the same memory: nothing is held for the whole export
+        self.assertGreater(size, 9 * small_size)
+        self.assertLess(peak, small_peak * 1.5)
+        self.assertLess(peak, 16 * 1024 * 1024)
+
+
+@skipUnless(len(settings.TENANT_SHARDS) > 1, "Needs a second shard (DB_SHARDS)")
+class ShardedExportTests(TestCase):
+    databases = '__all__'
+
+    def test_export_reads_the_organizations_shard(self):
+        cache.clear()
+        # The organization's id comes back after the rollback; its cached placement must not
+        self.addCleanup(cache.clear)
+        founder = User.objects.create_user(username='founder@sharded.example', email='founder@sharded.example')
+        with override_settings(NEW_ORG_SHARD=settings.TENANT_SHARDS[1]):
+            response = client_for(founder).post('/api/setup-organization/', {'name': 'Sharded'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        client = client_for(founder)
+        response = client.post('/api/staff/bulk-invite/', [
+            {"email": f"member{i}@sharded.example", "role": "staff"} for i in range(3)
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+
+        roster = client.get('/api/staff/?page_size=50').data['results']
+        response = client.get('/api/staff/export/?type=csv')
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(roster), 4)
+        self.assertEqual(len(lines) - 1, len(roster))
@@ -1,15 +1,48 @@
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
 from allauth.socialaccount.providers.oauth2.client import OAuth2Client
 from dj_rest_auth.registration.views import SocialLoginView
+from dj_rest_auth.jwt_auth import get_refresh_view
 from django.contrib.auth.models import User
-import traceback
-from core.models import Organization, UserProfile 
-
-from django.core.mail import send_mail
+from django.contrib.auth.hashers import make_password
 from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import hmac
+import logging
+import csv
+import io
+from collections import Counter
+from core.models import Department, Organization, UserProfile 
+from core.pagination import StaffCursorPagination
+from core.serializers import StaffMemberSerializer, TenantTokenRefreshSerializer, current_user_payload, department_payload
+from core.staff import (
+    staff_queryset, apply_staff_filters, bulk_invite, bulk_update_members, staff_changes, new_sync_cursor,
+    remove_members, reactivate_members, attach_email_status, INVITABLE_ROLES,
+)
+from core.sharding import DIRECTORY, place_organization, relocate_profile, tenant_atomic, use_shard
+from core.stats import organization_stats
+from core.export import EXPORT_FORMATS, roster_rows
+from core.gazetteer import LOCATION_DEFAULT_LIMIT, LOCATION_MAX_LIMIT, search_locations
+from core.search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, search_words, typeahead_profile_ids
+from core.departments import bump_config_version, department_map, merge_config, validate_config
+from core.mail import build_invite_email
+from core.authentication import (
+    get_tenant, bump_authz_version, StatelessTenantJWTAuthentication, TenantJWTAuthentication
+)
+from core.cache import get_cached_me, set_cached_me
+from core.instrumentation import registry
+from core.permissions import validate_permissions, validate_permissions_patch
+
+logger = logging.getLogger(__name__)
+
+# Read endpoints authorize from token claims; writes still load the user
+CLAIMS_AUTHENTICATION = [StatelessTenantJWTAuthentication, TenantJWTAuthentication]
 
 # 1. Google Login
 class GoogleLogin(SocialLoginView):
@@ -17,16 +50,25 @@ class GoogleLogin(SocialLoginView):
     callback_url = "http://localhost:5173"
     client_class = OAuth2Client
 
+# 1a. Token Refresh (re-stamps the tenant claims on the new access token)
+class TenantTokenRefreshView(get_refresh_view()):
+    serializer_class = TenantTokenRefreshSerializer
+
 # 2. Setup Organization
 class SetupOrganizationView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    # See core/instrumentation.py; checked by 'check_query_budgets'
+    query_budget = 15
 
     def post(self, request):
-        user = request.user
+        tenant = get_tenant(request)
         data = request.data
         
+        if tenant.profile is None:
+            return Response({"error": "Profile not found"}, status=404)
+
         # 1. Prevent duplicate setup
-        if hasattr(user, 'profile') and user.profile.organization:
+        if tenant.organization:
             return Response({"error": "Organization already exists."}, status=400)
 
         org_name = data.get('name')
@@ -36,20 +78,24 @@ class SetupOrganizationView(APIView):
         if not org_name:
             return Response({"error": "Organization name is required"}, status=400)
 
-        # 2. Create Organization with Type
-        org = Organization.objects.create(
-            name=org_name,
-            type=org_type, 
-            address=data.get('address', '')
-        )
-
-        # 3. Update User Profile with Designation
-        profile = user.profile
-        profile.organization = org
-        profile.role = 'ORG_ADMIN'
-        profile.designation = designation 
-        profile.is_setup_complete = True
-        profile.save()
+        # 2. Create Organization with Type, on the shard it is placed on (see core/sharding.py)
+        shard = place_organization()
+        with use_shard(shard):
+            org = Organization.objects.create(
+                name=org_name,
+                type=org_type, 
+                address=data.get('address', '')
+            )
+
+            # 3. Update User Profile with Designation (moves it onto the shard)
+            profile = tenant.profile
+            profile.organization = org
+            profile.role = 'ORG_ADMIN'
+            profile.designation = designation 
+            profile.is_setup_complete = True
+            relocate_profile(profile, shard, ['organization', 'role', 'designation', 'is_setup_complete', 'updated_at'])
+            # The caller's token still says "no organization"; make them refresh it
+            bump_authz_version(profile.user_id)
 
         return Response({
             "message": "Setup Complete", 
@@ -57,16 +103,44 @@ class SetupOrganizationView(APIView):
             "redirect": "/"
         })
 
-# 3. Staff Management 
-
-class StaffManagementView(APIView):
+# 2a. Location Search (setup wizard autocomplete)
+class LocationSearchView(APIView):
+    """
+    GET /api/locations/search/?q=pun&limit=8
+    Places whose name has a word starting with q, biggest first; "pune, mah"
+    narrows by state or country. Served from the in-memory gazetteer
+    (core/gazetteer.py), falling through to LOCATION_SEARCH_UPSTREAM only
+    when nothing matches locally.
+    """
+    authentication_classes = CLAIMS_AUTHENTICATION
     permission_classes = [permissions.IsAuthenticated]
+    # The authz version check, on a cold cache
+    query_budget = 1
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', LOCATION_DEFAULT_LIMIT)), LOCATION_MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "Limit must be a number"}, status=400)
+        if limit < 1:
+            return Response({"results": [], "source": "local"})
+
+        results, source = search_locations(request.query_params.get('q', ''), limit)
+        # The same for every caller; lets the browser answer a retyped prefix itself
+        return Response({"results": results, "source": source}, headers={"Cache-Control": "private, max-age=3600"})
+
+# 3. Staff Management 
 
+class AdminAccessMixin:
     def check_admin_access(self, request):
         """ Helper to ensure only Admins can access this API """
-        if not hasattr(request.user, 'profile'):
-            return False
-        return request.user.profile.role in ['SUPER_ADMIN', 'ORG_ADMIN']
+        return get_tenant(request).is_admin
+
+class StaffManagementView(AdminAccessMixin, APIView):
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
+    # A page costs the same whatever its size; an invite is a fixed set of writes
+    query_budget = {'GET': 6, 'POST': 24}
 
     def get(self, request):
         try:
@@ -74,35 +148,24 @@ class StaffManagementView(APIView):
             if not self.check_admin_access(request):
                 return Response({"error": "Access Denied: Admins only."}, status=403)
 
-            user_profile = request.user.profile
-            members = UserProfile.objects.filter(organization=user_profile.organization)
-            
-            data = []
-            for member in members:
-                u = member.user 
-
-                # 2. Status Logic
-                # If last_login is None, they haven't accepted the invite yet
-                status_label = "Active"
-                if u.last_login is None:
-                    status_label = "Invited"
-                
-                data.append({
-                    "id": u.id,
-                    "name": u.get_full_name() or u.email.split('@')[0],
-                    "email": u.email,
-                    "role": member.get_role_display(),
-                    "role_code": member.role,
-                    "department": member.department.name if member.department else "-",
-                    "status": status_label,
-                    "last_login": u.last_login,
-                    # 3. Send Permissions to Frontend
-                    "permissions": member.permissions or {} 
-                })
-            
-            return Response(data)
+            # 2. One joined query per page, filtered server-side
+            org_id = get_tenant(request).organization_id
+            members = staff_queryset(org_id)
+            try:
+                members = apply_staff_filters(members, request.query_params, org_id)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+
+            # 3. Keyset pagination (?cursor=...&page_size=...)
+            paginator = StaffCursorPagination()
+            page = attach_email_status(paginator.paginate_queryset(members, request, view=self))
+            data = StaffMemberSerializer(page, many=True, context={'departments': department_map(org_id)}).data
+            return paginator.get_paginated_response(data)
+        except APIException:
+            # E.g. NotFound for a bad ?cursor=; DRF renders those itself
+            raise
         except Exception as e:
-            traceback.print_exc()
+            logger.exception("Listing staff failed")
             return Response({"error": str(e)}, status=500)
 
     def post(self, request):
@@ -110,109 +173,43 @@ class StaffManagementView(APIView):
         if not self.check_admin_access(request):
             return Response({"error": "Permission denied"}, status=403)
 
-        email = request.data.get('email')
+        # Stored lower-case so the indexed equality lookup below is case-insensitive
+        email = (request.data.get('email') or '').strip().lower()
         role = request.data.get('role', 'STAFF')
         
         if not email:
             return Response({"error": "Email is required"}, status=400)
 
-        # 1. Check if user exists
-        if User.objects.filter(email=email).exists():
+        admin_org = get_tenant(request).organization
+        if not admin_org:
+            return Response({"error": "You are not part of an organization!"}, status=400)
+
+        # 1. Check if user exists (anywhere: the directory, not this shard's mirror)
+        if User.objects.using(DIRECTORY).filter(email=email).exists():
             return Response({"error": "User with this email already exists!"}, status=400)
 
         try:
-            # 2. Create the User
-            new_user = User.objects.create(username=email, email=email)
-            new_user.set_unusable_password()
-            new_user.save()
+            # 2. Create the User (unusable password set up front: one INSERT, no UPDATE)
+            new_user = User.objects.create(username=email, email=email, password=make_password(None))
 
-            # 3. Create Profile
+            # 3. Fetch Profile (provisioned by the post_save signal)
             profile, created = UserProfile.objects.get_or_create(user=new_user)
             
             # 4. Link Organization
-            admin_org = request.user.profile.organization
-            if not admin_org:
-                return Response({"error": "You are not part of an organization!"}, status=400)
-
             profile.organization = admin_org
             profile.role = role
             profile.is_setup_complete = True 
-            profile.save()
+            profile.save(update_fields=['organization', 'role', 'is_setup_complete', 'updated_at'])
 
-            # --- 5. PREPARE EMAIL DATA ---
+            # --- 5. QUEUE THE INVITE EMAIL ---
             try:
-                login_url = "http://localhost:5173/login" 
-                
                 # Get Sender Name (The Admin who clicked invite)
-                sender_name = request.user.get_full_name()
-                if not sender_name:
-                    sender_name = "The Administrator"
-
-                subject = f"You're invited to join {admin_org.name} on EduSphere"
-                
-                # --- PLAIN TEXT VERSION (Fallback) ---
-                plain_message = (
-                    f"Hello,\n\n"
-                    f"{sender_name} has invited you to join the staff at {admin_org.name} as a {role}.\n\n"
-                    f"Click here to get started: {login_url}\n\n"
-                    f"Welcome to the team!"
-                )
-
-                # --- HTML STYLED VERSION ---
-                html_message = f"""
-                <!DOCTYPE html>
-                <html>
-                <body style="margin:0; padding:0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f4f4f9;">
-                    <div style="max-width: 600px; margin: 40px auto; background: #ffffff; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 15px rgba(0,0,0,0.05);">
-                        
-                        <div style="background: linear-gradient(135deg, #4f46e5 0%, #7c3aed 100%); padding: 30px; text-align: center;">
-                            <h1 style="color: white; margin: 0; font-size: 24px;">Welcome to EduSphere</h1>
-                        </div>
-
-                        <div style="padding: 40px 30px; text-align: center; color: #333333;">
-                            <h2 style="color: #1e1b4b; margin-top: 0;">You've been invited!</h2>
-                            <p style="font-size: 16px; line-height: 1.6; color: #4b5563; margin-bottom: 25px;">
-                                <strong>{sender_name}</strong> has invited you to join the team at <strong>{admin_org.name}</strong>.
-                            </p>
-                            
-                            <div style="background: #f3f4f6; padding: 15px; border-radius: 8px; margin-bottom: 30px; display: inline-block;">
-                                <p style="margin: 0; font-size: 14px; color: #6b7280;">Your Role</p>
-                                <p style="margin: 5px 0 0 0; font-size: 18px; font-weight: bold; color: #4f46e5;">{role}</p>
-                            </div>
-
-                            <br/>
-
-                            <a href="{login_url}" style="background-color: #4f46e5; color: white; padding: 14px 28px; text-decoration: none; border-radius: 8px; font-weight: bold; display: inline-block; box-shadow: 0 4px 6px rgba(79, 70, 229, 0.25);">
-                                Accept Invitation
-                            </a>
-
-                            <p style="margin-top: 30px; font-size: 14px; color: #9ca3af;">
-                                If the button above doesn't work, verify your email at: <br/>
-                                <a href="{login_url}" style="color: #4f46e5;">{login_url}</a><br/>
-                                  or contact {sender_name} for assistance.
-                            </p>
-                        </div>
-
-                        <div style="background-color: #f9fafb; padding: 20px; text-align: center; border-top: 1px solid #e5e7eb;">
-                            <p style="margin: 0; font-size: 12px; color: #9ca3af;">&copy; 2026 EduSphere. All rights reserved.</p>
-                        </div>
-                    </div>
-                </body>
-                </html>
-                """
-                
-                send_mail(
-                    subject,
-                    plain_message, # Plain text fallback
-                    settings.EMAIL_HOST_USER,
-                    [email],
-                    fail_silently=False,
-                    html_message=html_message
-                )
-                print(f"Email sent successfully to {email}")
-
-            except Exception as mail_error:
-                print(f"Failed to send email: {mail_error}")
+                sender_name = request.user.get_full_name() or "The Administrator"
+                build_invite_email(email, role, admin_org.name, sender_name).send()
+                logger.info("Invite email queued", extra={'event': 'invite_queued', 'user_id': new_user.id})
+
+            except Exception:
+                logger.exception("Failed to queue invite email", extra={'user_id': new_user.id})
             
             return Response({
                 "message": f"Invite sent to {email}",
@@ -223,10 +220,10 @@ class StaffManagementView(APIView):
                 }
             })
 
-        except Exception as e:
+        except Exception:
             if 'new_user' in locals():
                 new_user.delete()
-            print("Invite Error:", e)
+            logger.exception("Invite failed")
             return Response({"error": "Failed to create user. Check server logs."}, status=500)
 
     def patch(self, request):
@@ -235,12 +232,16 @@ class StaffManagementView(APIView):
             return Response({"error": "Permission denied"}, status=403)
 
         user_id = request.data.get('user_id')
-        new_permissions = request.data.get('permissions')
+        try:
+            new_permissions = validate_permissions(request.data.get('permissions'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
 
         try:
-            target_profile = UserProfile.objects.get(user_id=user_id, organization=request.user.profile.organization)
+            target_profile = UserProfile.objects.get(user_id=user_id, organization_id=get_tenant(request).organization_id)
             target_profile.permissions = new_permissions
-            target_profile.save()
+            target_profile.save(update_fields=['permissions', 'updated_at'])
+            bump_authz_version(target_profile.user_id)
             return Response({"message": "Permissions updated"})
         except UserProfile.DoesNotExist:
             return Response({"error": "User not found"}, status=404)
@@ -257,12 +258,12 @@ class StaffManagementView(APIView):
             if int(user_id) == request.user.id:
                 return Response({"error": "You cannot delete yourself."}, status=400)
 
-            target_user = User.objects.get(id=user_id)
+            target_user = User.objects.select_related('profile').get(id=user_id)
             
             # 2. Check Permissions (Safe Mode)
             # If the user has a profile, we must ensure they belong to YOUR org.
-            if hasattr(target_user, 'profile') and target_user.profile.organization:
-                if target_user.profile.organization != request.user.profile.organization:
+            if hasattr(target_user, 'profile') and target_user.profile.organization_id:
+                if target_user.profile.organization_id != get_tenant(request).organization_id:
                     return Response({"error": "User belongs to another organization"}, status=403)
             else:
                 # 3. Handle "Ghost" Users (No Profile)
@@ -278,54 +279,466 @@ class StaffManagementView(APIView):
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=404)
         except Exception as e:
-            traceback.print_exc()
+            logger.exception("Removing staff member failed")
             return Response({"error": str(e)}, status=500)
         
-# 4. Current User (Topbar)
+# 4. Current User (Topbar & Sidebar)
 class CurrentUserView(APIView):
+    """
+    Hottest endpoint we serve, so the payload is cached per user
+    (see core/cache.py; invalidated by signals) and revalidated with ETags.
+    A cache hit touches no table at all: auth comes from the token claims.
+    """
+    authentication_classes = CLAIMS_AUTHENTICATION
     permission_classes = [permissions.IsAuthenticated]
+    # On a cold cache; a warm one serves it without any query
+    query_budget = 3
 
     def get(self, request):
-        user = request.user
-        if not hasattr(user, 'profile'):
-            return Response({"error": "Profile not found"}, status=404)
-            
-        profile = user.profile
-        org = profile.organization
+        user_id = request.user.id
+        entry = get_cached_me(user_id)
+
+        if entry is None:
+            tenant = get_tenant(request)
+            user, profile, org = tenant.user, tenant.profile, tenant.organization
+            if profile is None:
+                return Response({"error": "Profile not found"}, status=404)
+
+            entry = set_cached_me(user_id, current_user_payload(user, profile, org))
+
+        headers = {"ETag": entry['etag'], "Cache-Control": "private, no-cache"}
+        if request.headers.get('If-None-Match') == entry['etag']:
+            return Response(status=304, headers=headers)
+        return Response(entry['payload'], headers=headers)
+
+# 5. Staff Delta Sync
+class StaffChangesView(AdminAccessMixin, APIView):
+    """
+    GET /api/staff/changes/?since=<cursor>
+    Returns members created/updated and the ids of members removed since the
+    cursor, plus a new cursor. Without ?since it just hands out a cursor:
+    take one before loading the full list, then poll with it.
+    """
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not self.check_admin_access(request):
+            return Response({"error": "Access Denied: Admins only."}, status=403)
+
+        cursor = new_sync_cursor()
+        since_param = request.query_params.get('since')
+        if not since_param:
+            return Response({"cursor": cursor, "updated": [], "deleted": [], "reset": False})
+
+        since = parse_datetime(since_param)
+        if since is None:
+            return Response({"error": "Invalid 'since' cursor"}, status=400)
+
+        org_id = get_tenant(request).organization_id
+        updated, deleted, reset = staff_changes(org_id, since)
         return Response({
-            "id": user.id,
-            "name": user.get_full_name() or user.email.split('@')[0],
-            "email": user.email,
-            "role": profile.get_role_display(),
-            "organization": profile.organization.name if profile.organization else "No Campus",
-            "designation": profile.designation or "Staff Member", 
-            "location": org.address if org else "",
-            "org_type": org.type if org else "Institute",       
-            "is_setup_complete": profile.is_setup_complete
+            "cursor": cursor,
+            "updated": StaffMemberSerializer(attach_email_status(updated), many=True, context={'departments': department_map(org_id)}).data,
+            "deleted": deleted,
+            "reset": reset,
         })
-    
-#For sidebar
 
-class CurrentUserView(APIView):
+# 6. Bulk Invite (JSON array or CSV upload)
+class BulkInviteView(AdminAccessMixin, APIView):
+    """
+    POST a JSON list (or {"members": [...]}) of {email, role, first_name, last_name},
+    or a multipart 'file' CSV with those column headers.
+    Rows are processed in chunks; the response reports the outcome of every row.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+
+    def post(self, request):
+        if not self.check_admin_access(request):
+            return Response({"error": "Permission denied"}, status=403)
+
+        admin_org = get_tenant(request).organization
+        if not admin_org:
+            return Response({"error": "You are not part of an organization!"}, status=400)
+
+        upload = request.FILES.get('file')
+        if upload:
+            # Read the upload line by line instead of loading it into memory
+            reader = csv.DictReader(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''))
+            if not reader.fieldnames:
+                return Response({"error": "The CSV file is empty"}, status=400)
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+            if 'email' not in reader.fieldnames:
+                return Response({"error": "The CSV needs an 'email' column"}, status=400)
+            rows = reader
+        else:
+            data = request.data
+            rows = data.get('members') if isinstance(data, dict) else data
+            if not isinstance(rows, list) or not rows:
+                return Response({"error": "Send a list of members or a CSV file"}, status=400)
+
+        sender_name = request.user.get_full_name() or "The Administrator"
+        try:
+            report = bulk_invite(rows, admin_org, sender_name)
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response({"error": f"Could not read the CSV file: {e}"}, status=400)
+
+        counts = Counter(row['status'] for row in report)
+        return Response({
+            "invited": counts['invited'],
+            "skipped": counts['skipped'],
+            "errors": counts['error'],
+            "results": report,
+        })
+
+# 7. Bulk Role / Permission Update
+class BulkTargetMixin:
+    def target_members(self, request):
+        """
+        Members of the admin's organization chosen by {"user_ids": [...]} or
+        {"filter": {"role", "department", "status", "q"}}. The caller is never
+        included. Raises ValueError with a readable message.
+        """
+        data = request.data
+        members = UserProfile.objects.filter(
+            organization_id=get_tenant(request).organization_id
+        ).exclude(user_id=get_tenant(request).user_id)
+
+        if 'user_ids' in data:
+            user_ids = data['user_ids']
+            if not isinstance(user_ids, list) or not user_ids:
+                raise ValueError("'user_ids' must be a non-empty list")
+            try:
+                user_ids = [int(uid) for uid in user_ids]
+            except (TypeError, ValueError):
+                raise ValueError("'user_ids' must contain numeric ids")
+            return members.filter(user_id__in=user_ids)
+        if isinstance(data.get('filter'), dict):
+            return apply_staff_filters(members, data['filter'], get_tenant(request).organization_id)
+        raise ValueError("Send 'user_ids' or a 'filter' to choose members")
+
+class StaffBulkUpdateView(AdminAccessMixin, BulkTargetMixin, APIView):
+    """
+    PATCH a target set (see BulkTargetMixin) together with "role" and/or
+    "permissions", a JSON merge patch such as
+    {"can_manage_fees": true, "can_upload_data": null} (null revokes).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def patch(self, request):
+        if not self.check_admin_access(request):
+            return Response({"error": "Permission denied"}, status=403)
+        if not get_tenant(request).organization_id:
+            return Response({"error": "You are not part of an organization!"}, status=400)
+
+        data = request.data
+        role = data.get('role')
+        permissions_patch = data.get('permissions')
+        if role is None and permissions_patch is None:
+            return Response({"error": "Send a 'role' and/or 'permissions' to apply"}, status=400)
+        if role is not None:
+            role = str(role).strip().upper()
+            if role not in INVITABLE_ROLES:
+                return Response({"error": f"Unknown role: {role}"}, status=400)
+
+        try:
+            if permissions_patch is not None:
+                validate_permissions_patch(permissions_patch)
+            members = self.target_members(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        matched, updated = bulk_update_members(members, role=role, permissions_patch=permissions_patch)
+        return Response({"matched": matched, "updated": updated})
+
+# 8. Bulk Removal (offboarding)
+class StaffBulkRemoveView(AdminAccessMixin, BulkTargetMixin, APIView):
+    """
+    POST a target set (see BulkTargetMixin) with "mode":
+      "deactivate" (default) - blocks login, keeps all data; reversible
+      "reactivate"           - undoes a deactivation
+      "delete"               - permanently removes the accounts
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    MODES = ('deactivate', 'reactivate', 'delete')
+
+    def post(self, request):
+        if not self.check_admin_access(request):
+            return Response({"error": "Permission denied"}, status=403)
+        if not get_tenant(request).organization_id:
+            return Response({"error": "You are not part of an organization!"}, status=400)
+
+        mode = request.data.get('mode', 'deactivate')
+        if mode not in self.MODES:
+            return Response({"error": f"Mode must be one of: {', '.join(self.MODES)}"}, status=400)
+        try:
+            members = self.target_members(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        if mode == 'reactivate':
+            user_ids = reactivate_members(members)
+        else:
+            user_ids = remove_members(members, deactivate=(mode == 'deactivate'))
+        return Response({"mode": mode, "count": len(user_ids), "user_ids": user_ids})
+
+# 9. Organization Stats (dashboard)
+class OrganizationStatsView(APIView):
+    """
+    GET /api/org/stats/ - headcounts by role, status and department.
+    Read from the OrganizationCounter table (see core/stats.py) and the
+    department map, so the cost doesn't grow with the size of the organization.
+    """
+    authentication_classes = CLAIMS_AUTHENTICATION
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        if not hasattr(user, 'profile'):
-            return Response({"error": "Profile not found"}, status=404)
-            
-        profile = user.profile
-        org = profile.organization
+        org_id = get_tenant(request).organization_id
+        if not org_id:
+            return Response({"error": "You are not part of an organization!"}, status=400)
+        return Response({"organization_id": org_id, **organization_stats(org_id)})
+
+# 10. Departments
+class DepartmentAccessMixin(AdminAccessMixin):
+    """ Any member may read; only admins may change anything. """
+    def check_access(self, request):
+        if request.method not in permissions.SAFE_METHODS and not self.check_admin_access(request):
+            return Response({"error": "Permission denied"}, status=403)
+        if not get_tenant(request).organization_id:
+            return Response({"error": "You are not part of an organization!"}, status=400)
+        return None
+
+    def clean_name(self, name, org_id, exclude_id=None):
+        """ Raises ValueError with a readable message. """
+        name = (name or '').strip() if isinstance(name, str) else ''
+        if not name:
+            raise ValueError("Department name is required")
+        if len(name) > 100:
+            raise ValueError("Department name is too long (max 100 characters)")
+        if Department.objects.filter(organization_id=org_id, name__iexact=name).exclude(pk=exclude_id).exists():
+            raise ValueError(f"A department named '{name}' already exists")
+        return name
+
+class DepartmentListView(DepartmentAccessMixin, APIView):
+    """
+    GET  /api/departments/ - every department with its own and its effective
+         config, served from the in-process department map.
+    POST /api/departments/ - {"name", "config"} creates one.
+    """
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
 
+    def get(self, request):
+        denied = self.check_access(request)
+        if denied:
+            return denied
+        departments = department_map(get_tenant(request).organization_id)
         return Response({
-            "id": user.id,
-            "name": user.get_full_name() or user.email.split('@')[0],
-            "email": user.email,
-            "role": profile.get_role_display(),
-            "role_code": profile.role,
-            "organization": org.name if org else "No Campus",
-            "location": org.address if org else "",
-            "designation": profile.designation or "Staff Member",
-            "org_type": org.type if org else "Institute",
-            "is_setup_complete": profile.is_setup_complete
-        })
\ No newline at end of file
+            "defaults": departments.defaults,
+            "results": [department_payload(d) for d in departments.values()],
+        })
+
+    def post(self, request):
+        denied = self.check_access(request)
+        if denied:
+            return denied
+        org_id = get_tenant(request).organization_id
+        try:
+            name = self.clean_name(request.data.get('name'), org_id)
+            config = validate_config(request.data.get('config') or {})
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        department = Department.objects.create(organization_id=org_id, name=name, config=config)
+        return Response(department_payload(department_map(org_id)[department.id]), status=201)
+
+class DepartmentDetailView(DepartmentAccessMixin, APIView):
+    """
+    GET    /api/departments/<id>/
+    PATCH  /api/departments/<id>/ - "name" and/or "config", a JSON merge
+           patch against the department's overrides (null removes a key)
+    DELETE /api/departments/<id>/ - members are left without a department
+    """
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, department_id):
+        denied = self.check_access(request)
+        if denied:
+            return denied
+        department = department_map(get_tenant(request).organization_id).get(department_id)
+        if department is None:
+            return Response({"error": "Department not found"}, status=404)
+        return Response(department_payload(department))
+
+    def patch(self, request, department_id):
+        denied = self.check_access(request)
+        if denied:
+            return denied
+        org_id = get_tenant(request).organization_id
+        data = request.data
+        if 'name' not in data and 'config' not in data:
+            return Response({"error": "Send a 'name' and/or 'config' to change"}, status=400)
+
+        with tenant_atomic():
+            department = Department.objects.select_for_update().filter(pk=department_id, organization_id=org_id).first()
+            if department is None:
+                return Response({"error": "Department not found"}, status=404)
+            fields = []
+            try:
+                if 'name' in data:
+                    department.name = self.clean_name(data['name'], org_id, exclude_id=department.pk)
+                    fields.append('name')
+                if 'config' in data:
+                    department.config = merge_config(department.config, validate_config(data['config']))
+                    fields.append('config')
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+            department.save(update_fields=fields)
+
+        return Response(department_payload(department_map(org_id)[department.pk]))
+
+    def delete(self, request, department_id):
+        denied = self.check_access(request)
+        if denied:
+            return denied
+        department = Department.objects.filter(pk=department_id, organization_id=get_tenant(request).organization_id).first()
+        if department is None:
+            return Response({"error": "Department not found"}, status=404)
+        department.delete()
+        return Response({"message": "Department removed"})
+
+class DepartmentDefaultsView(DepartmentAccessMixin, APIView):
+    """
+    GET   /api/departments/defaults/ - the config every department inherits
+    PATCH /api/departments/defaults/ - JSON merge patch against it
+    """
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        denied = self.check_access(request)
+        if denied:
+            return denied
+        return Response(department_map(get_tenant(request).organization_id).defaults)
+
+    def patch(self, request):
+        denied = self.check_access(request)
+        if denied:
+            return denied
+        org_id = get_tenant(request).organization_id
+        try:
+            patch = validate_config(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        with tenant_atomic():
+            current = (
+                Organization.objects.select_for_update().filter(pk=org_id)
+                .values_list('department_defaults', flat=True).first()
+            )
+            bump_config_version(org_id, department_defaults=merge_config(current, patch))
+        return Response(department_map(org_id).defaults)
+
+# 11. Staff Search (typeahead)
+class StaffSearchView(AdminAccessMixin, APIView):
+    """
+    GET /api/staff/search/?q=jo sm&limit=20
+    Members whose name, email, designation or department has a word starting
+    with each query word. Answered from the search term index (core/search.py).
+    The full roster takes the same ?q= alongside its other filters.
+    """
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not self.check_admin_access(request):
+            return Response({"error": "Access Denied: Admins only."}, status=403)
+
+        org_id = get_tenant(request).organization_id
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "Limit must be a number"}, status=400)
+        if org_id is None or not search_words(query) or limit < 1:
+            return Response({"results": []})
+
+        profile_ids = typeahead_profile_ids(org_id, query, limit)
+        rows = {
+            row[0]: row for row in UserProfile.objects.filter(id__in=profile_ids).values_list(
+                'id', 'user_id', 'user__first_name', 'user__last_name', 'user__email',
+                'role', 'designation', 'department_id',
+            )
+        }
+        departments = department_map(org_id)
+        return Response({"results": [
+            {
+                "id": user_id,
+                "name": f"{first_name} {last_name}".strip() or email.split('@')[0],
+                "email": email,
+                "role_code": role,
+                "designation": designation,
+                "department": departments.name(department_id),
+            }
+            # In the index's order (alphabetical by matched word)
+            for _, user_id, first_name, last_name, email, role, designation, department_id in (
+                rows[pid] for pid in profile_ids if pid in rows
+            )
+        ]})
+
+# 12. Roster Export (audits)
+class StaffExportView(AdminAccessMixin, APIView):
+    """
+    GET /api/staff/export/?type=csv|xlsx plus the roster filters
+    (?role=, ?status=, ?department=, ?q=). Streamed: rows are written as
+    they are read, so memory use doesn't depend on the organization's size.
+    """
+    authentication_classes = CLAIMS_AUTHENTICATION
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not self.check_admin_access(request):
+            return Response({"error": "Access Denied: Admins only."}, status=403)
+
+        org_id = get_tenant(request).organization_id
+        if not org_id:
+            return Response({"error": "You are not part of an organization!"}, status=400)
+
+        # Not ?format=: DRF reserves that for picking a renderer
+        export_type = request.query_params.get('type', 'csv').lower()
+        if export_type not in EXPORT_FORMATS:
+            return Response({"error": f"Type must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+        try:
+            members = apply_staff_filters(UserProfile.objects.filter(organization_id=org_id), request.query_params, org_id)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        stream, content_type, extension = EXPORT_FORMATS[export_type]
+        response = StreamingHttpResponse(stream(roster_rows(members, org_id)), content_type=content_type)
+        filename = f"staff-{org_id}-{timezone.now():%Y%m%d-%H%M}.{extension}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # Let nginx pass chunks through instead of buffering the whole file
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+# 13. Metrics (Prometheus scrape target)
+class MetricsView(APIView):
+    """
+    GET /api/metrics/: this worker's request metrics in Prometheus text format
+    (see core/instrumentation.py). Authorized by the METRICS_TOKEN bearer
+    token, not a user JWT; without METRICS_TOKEN the endpoint doesn't exist.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if not token:
+            raise Http404
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return Response({"error": "Invalid metrics token"}, status=401)
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -84,6 +84,8 @@ export const AuthProvider = ({ children }) => {
     }
   };
 
+  // Load the current user once per page load. Route changes reuse it:
+  // the access token's claims and the server-side cache keep it current.
   useEffect(() => {
     const checkLoggedIn = async () => {
       //authentication check
@@ -103,22 +105,22 @@ export const AuthProvider = ({ children }) => {
         }
       };
 
-      //Delay Logic
-      if (loading) {
-        //INITIAL LOAD (Spinner Active)
-        await Promise.all([
-          performAuthCheck(),
-          new Promise((resolve) => setTimeout(resolve, 1000)), //1 Sec Delay
-        ]);
-
-        // Only hide spinner after 1 seconds have passed
-        setLoading(false);
-      } else {
-        await performAuthCheck();
-      }
+      //INITIAL LOAD (Spinner Active)
+      await Promise.all([
+        performAuthCheck(),
+        new Promise((resolve) => setTimeout(resolve, 1000)), //1 Sec Delay
+      ]);
+
+      // Only hide spinner after 1 seconds have passed
+      setLoading(false);
     };
 
     checkLoggedIn();
+  }, []);
+
+  // Keep the setup/login redirects working on navigation without refetching
+  useEffect(() => {
+    if (!loading) handleRedirect(user);
   }, [location.pathname]);
 
   const handleAuthResponse = (res) => {
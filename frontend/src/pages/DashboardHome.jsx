@@ -1,5 +1,6 @@
 /* eslint-disable no-unused-vars */
-import React from "react";
+import React, { useEffect, useState } from "react";
+import axios from "axios";
 import { motion } from "framer-motion";
 import { TrendingUp, Users, FileText, CreditCard } from "lucide-react";
 import "./DashboardHome.css";
@@ -24,14 +25,37 @@ const StatCard = ({ title, value, subtext, icon: Icon, color, delay }) => (
 );
 
 const DashboardHome = () => {
+  // Headcounts from /api/org/stats/ (served from counters, not the roster)
+  const [stats, setStats] = useState(null);
+
+  useEffect(() => {
+    const fetchStats = async () => {
+      try {
+        const token = localStorage.getItem("access_token");
+        const res = await axios.get(
+          `${import.meta.env.VITE_API_URL}/api/org/stats/`,
+          { headers: { Authorization: `Bearer ${token}` } }
+        );
+        setStats(res.data);
+      } catch (err) {
+        console.error("Failed to fetch organization stats", err);
+      }
+    };
+    fetchStats();
+  }, []);
+
   return (
     <div className="dashboard-home">
       {/* Animated Stats Grid */}
       <div className="stats-grid">
         <StatCard
           title="Total Students"
-          value="12,450"
-          subtext="+5% from last month"
+          value={stats ? stats.by_role.STUDENT.toLocaleString() : "—"}
+          subtext={
+            stats
+              ? `${stats.total.toLocaleString()} members, ${stats.by_status.invited.toLocaleString()} invited`
+              : "Loading..."
+          }
           icon={Users}
           color="#4338ca"
           delay={0.1}
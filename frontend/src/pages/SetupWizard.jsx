@@ -36,6 +36,8 @@ const SetupWizard = () => {
   const [showSuggestions, setShowSuggestions] = useState(false);
   const [isSearching, setIsSearching] = useState(false);
   const dropdownRef = useRef(null);
+  const searchTimer = useRef(null);
+  const latestQuery = useRef("");
 
   const [formData, setFormData] = useState({
     orgName: "",
@@ -87,40 +89,64 @@ const SetupWizard = () => {
     return () => document.removeEventListener("mousedown", handleClickOutside);
   }, []);
 
-  const handleAddressChange = async (e) => {
-    const value = e.target.value;
+  useEffect(() => () => clearTimeout(searchTimer.current), []);
 
-    setFormData({ ...formData, orgAddress: value });
+  // Suggestions come from our own /api/locations/search/ (an in-memory
+  // gazetteer), asked once the user pauses typing.
+  const searchLocations = async (query) => {
+    setIsSearching(true);
 
-    if (value.length > 2) {
-      setIsSearching(true);
+    try {
+      const token = localStorage.getItem("access_token");
 
-      try {
-        // Using OpenStreetMap Nominatim API
+      const res = await axios.get(
+        `${import.meta.env.VITE_API_URL}/api/locations/search/`,
+        {
+          params: { q: query, limit: 5 },
+          headers: { Authorization: `Bearer ${token}` },
+        }
+      );
 
-        const res = await axios.get(
-          `https://nominatim.openstreetmap.org/search?format=json&q=${value}&addressdetails=1&limit=5`
-        );
+      // A slower answer to an older query must not replace a newer one
+      if (latestQuery.current !== query) return;
 
-        setSuggestions(res.data);
+      setSuggestions(res.data.results);
 
-        setShowSuggestions(true);
-      } catch (error) {
-        console.error("Error fetching locations", error);
-      } finally {
-        setIsSearching(false);
-      }
+      setShowSuggestions(true);
+    } catch (error) {
+      console.error("Error fetching locations", error);
+    } finally {
+      if (latestQuery.current === query) setIsSearching(false);
+    }
+  };
+
+  const handleAddressChange = (e) => {
+    const value = e.target.value;
+
+    setFormData({ ...formData, orgAddress: value });
+
+    clearTimeout(searchTimer.current);
+    latestQuery.current = value.trim();
+
+    if (latestQuery.current.length >= 2) {
+      searchTimer.current = setTimeout(
+        () => searchLocations(latestQuery.current),
+        250
+      );
     } else {
       setSuggestions([]);
 
       setShowSuggestions(false);
+
+      setIsSearching(false);
     }
   };
 
   const selectLocation = (item) => {
-    const address = item.display_name.split(",").slice(0, 3).join(",");
+    clearTimeout(searchTimer.current);
+    latestQuery.current = "";
 
-    setFormData({ ...formData, orgAddress: address });
+    setFormData({ ...formData, orgAddress: item.label });
     setShowSuggestions(false);
   };
 
@@ -243,7 +269,7 @@ const SetupWizard = () => {
                     value={formData.orgAddress}
                     onChange={handleAddressChange}
                     onFocus={() =>
-                      formData.orgAddress.length > 2 && setShowSuggestions(true)
+                      formData.orgAddress.length >= 2 && setShowSuggestions(true)
                     }
                   />
 
@@ -258,14 +284,12 @@ const SetupWizard = () => {
                   <ul className="location-dropdown">
                     {suggestions.map((item) => (
                       <li
-                        key={item.place_id}
+                        key={item.id}
                         onClick={() => selectLocation(item)}
                       >
-                        <strong>
-                          {item.name || item.address.city || item.address.town}
-                        </strong>
+                        <strong>{item.name}</strong>
 
-                        <span>{item.display_name}</span>
+                        <span>{item.label}</span>
                       </li>
                     ))}
                   </ul>
@@ -1,5 +1,5 @@
 /* eslint-disable */
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import axios from "axios";
 import {
   Plus,
@@ -9,6 +9,9 @@ import {
   X,
   AlertTriangle,
   Check,
+  Ban,
+  Search,
+  Download,
 } from "lucide-react";
 import { useNavigate } from "react-router-dom";
 import "./StaffManagement.css";
@@ -16,6 +19,9 @@ import "./StaffManagement.css";
 const StaffManagement = () => {
   const [members, setMembers] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextPage, setNextPage] = useState(null); // Cursor URL for the next page
+  const [syncCursor, setSyncCursor] = useState(null); // For /api/staff/changes/
+  const [search, setSearch] = useState(""); // Server-side ?q= search
 
   // Modals & UI State
   const [showAddModal, setShowAddModal] = useState(false);
@@ -31,6 +37,7 @@ const StaffManagement = () => {
 
   const navigate = useNavigate();
 
+  // Keys must match PERMISSIONS in backend/core/permissions.py
   const FEATURE_FLAGS = [
     { key: "can_manage_fees", label: "Fees" },
     { key: "can_upload_data", label: "Uploads" },
@@ -43,16 +50,25 @@ const StaffManagement = () => {
     setTimeout(() => setToast({ show: false, message: "", type: "" }), 3000);
   };
 
-  const fetchMembers = async () => {
+  // Pass the `next` URL from a previous page to append, or nothing to reload
+  const fetchMembers = async (pageUrl = null) => {
     try {
       const token = localStorage.getItem("access_token");
       const res = await axios.get(
-        `${import.meta.env.VITE_API_URL}/api/staff/`,
+        pageUrl || `${import.meta.env.VITE_API_URL}/api/staff/`,
         {
+          // The `next` URL already carries the query
+          params: !pageUrl && search.trim() ? { q: search.trim() } : undefined,
           headers: { Authorization: `Bearer ${token}` },
         }
       );
-      setMembers(res.data);
+      setMembers((prev) => {
+        if (!pageUrl) return res.data.results;
+        // A synced change may already have added some of these rows
+        const seen = new Set(prev.map((m) => m.id));
+        return [...prev, ...res.data.results.filter((m) => !seen.has(m.id))];
+      });
+      setNextPage(res.data.next);
     } catch (err) {
       if (err.response && err.response.status === 403) {
         navigate("/");
@@ -64,10 +80,87 @@ const StaffManagement = () => {
     }
   };
 
-  useEffect(() => {
+  // Full load. The sync cursor is taken first so nothing changed mid-load is missed.
+  const loadRoster = async () => {
+    try {
+      const token = localStorage.getItem("access_token");
+      const res = await axios.get(
+        `${import.meta.env.VITE_API_URL}/api/staff/changes/`,
+        { headers: { Authorization: `Bearer ${token}` } }
+      );
+      setSyncCursor(res.data.cursor);
+    } catch (err) {
+      setSyncCursor(null);
+    }
     fetchMembers();
+  };
+
+  // After an edit, pull only what changed instead of the whole roster
+  const syncChanges = async () => {
+    // Changes aren't filtered by the search, so re-run it instead
+    if (search.trim()) return fetchMembers();
+    if (!syncCursor) return loadRoster();
+    try {
+      const token = localStorage.getItem("access_token");
+      const res = await axios.get(
+        `${import.meta.env.VITE_API_URL}/api/staff/changes/`,
+        {
+          params: { since: syncCursor },
+          headers: { Authorization: `Bearer ${token}` },
+        }
+      );
+      if (res.data.reset) return loadRoster();
+
+      setSyncCursor(res.data.cursor);
+      setMembers((prev) => {
+        const byId = new Map(prev.map((m) => [m.id, m]));
+        res.data.deleted.forEach((id) => byId.delete(id));
+        res.data.updated.forEach((m) => byId.set(m.id, m));
+        return Array.from(byId.values());
+      });
+    } catch (err) {
+      loadRoster();
+    }
+  };
+
+  useEffect(() => {
+    loadRoster();
   }, []);
 
+  // Search as you type, once the user pauses (the initial load is loadRoster's)
+  const searchMounted = useRef(false);
+  useEffect(() => {
+    if (!searchMounted.current) {
+      searchMounted.current = true;
+      return;
+    }
+    const timer = setTimeout(() => fetchMembers(), 250);
+    return () => clearTimeout(timer);
+  }, [search]);
+
+  // Export the (searched) roster; the server streams it
+  const exportRoster = async (type) => {
+    try {
+      const token = localStorage.getItem("access_token");
+      const res = await axios.get(
+        `${import.meta.env.VITE_API_URL}/api/staff/export/`,
+        {
+          params: search.trim() ? { type, q: search.trim() } : { type },
+          headers: { Authorization: `Bearer ${token}` },
+          responseType: "blob",
+        }
+      );
+      const url = URL.createObjectURL(res.data);
+      const link = document.createElement("a");
+      link.href = url;
+      link.download = `staff.${type}`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (err) {
+      showToast("Export failed", "error");
+    }
+  };
+
   // 1. DELETE LOGIC
   const confirmDelete = async () => {
     if (!deleteTarget) return;
@@ -80,7 +173,7 @@ const StaffManagement = () => {
         }
       );
       showToast("User removed successfully", "success");
-      fetchMembers();
+      syncChanges();
     } catch (err) {
       showToast(err.response?.data?.error || "Delete failed", "error");
     } finally {
@@ -113,7 +206,7 @@ const StaffManagement = () => {
       );
     } catch (err) {
       showToast("Failed to save permission", "error");
-      fetchMembers();
+      syncChanges();
     }
   };
 
@@ -138,7 +231,7 @@ const StaffManagement = () => {
       showToast(`Invitation sent to ${newUser.email}!`, "success");
       setShowAddModal(false);
       setNewUser({ email: "", role: "STAFF" });
-      fetchMembers();
+      syncChanges();
     } catch (error) {
       showToast(error.response?.data?.error || "Failed to add user", "error");
     }
@@ -165,9 +258,23 @@ const StaffManagement = () => {
           <h1>Team & Permissions</h1>
           <p>Manage access and features for your staff.</p>
         </div>
-        <button className="add-btn" onClick={() => setShowAddModal(true)}>
-          <Plus size={18} /> Add Member
-        </button>
+        <div className="header-actions">
+          <div className="search-box">
+            <Search size={16} />
+            <input
+              type="search"
+              placeholder="Search name, email, department..."
+              value={search}
+              onChange={(e) => setSearch(e.target.value)}
+            />
+          </div>
+          <button className="export-btn" onClick={() => exportRoster("xlsx")}>
+            <Download size={18} /> Export
+          </button>
+          <button className="add-btn" onClick={() => setShowAddModal(true)}>
+            <Plus size={18} /> Add Member
+          </button>
+        </div>
       </div>
 
       <div className="glass-panel table-container">
@@ -208,6 +315,10 @@ const StaffManagement = () => {
                       <span className="status-badge active">
                         <CheckCircle size={12} /> Active
                       </span>
+                    ) : m.status === "Deactivated" ? (
+                      <span className="status-badge deactivated">
+                        <Ban size={12} /> Deactivated
+                      </span>
                     ) : (
                       <span className="status-badge invited">
                         <Clock size={12} /> Invited
@@ -254,6 +365,11 @@ const StaffManagement = () => {
             </tbody>
           </table>
         )}
+        {!loading && nextPage && (
+          <button className="load-more-btn" onClick={() => fetchMembers(nextPage)}>
+            Load more
+          </button>
+        )}
       </div>
 
       {/* --- ADD USER MODAL --- */}